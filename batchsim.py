@@ -0,0 +1,183 @@
+# coding: UTF-8
+"""多数の対局をまとめて進めるシミュレータ (NumPy を使う)
+
+N 局の盤面を手番側・相手側のビットボードの配列 (uint64, 形は (N,)) で持ち、
+全局を1手ずつ同時に進める。合法手・反転の計算と手の選択は配列の演算で行うので、
+1局ずつ Game を進めるより桁違いに速い。大量のプレイアウトや、CPU のレベル同士の
+勝率を調べるのに使う。
+
+手の選び方は strategies.py の random / random_2 / random_3 (Othello.random_hit_1/2/3) と同じ方針と、
+評価表の値で重みをつけた乱数 (weighted) から選べる。
+
+    python batchsim.py --games 100000 --black random_3 --white random
+"""
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+from bitboard import CORNERS, DIRECTIONS, INIT_BLACK, INIT_WHITE
+from rules import EVAL_TABLE
+from selfplay import format_summary, summarize
+from strategies import CORNER_NEIGHBORS
+
+# 手の選び方 (weighted は評価表の値で重みをつけた乱数)
+POLICIES = ("random", "random_2", "random_3", "weighted")
+# weighted の重み exp(評価表の値 / 温度) の温度
+TEMPERATURE = 10.0
+
+_DIRECTIONS = [(np.uint64(shift), np.uint64(mask)) for shift, mask in DIRECTIONS]
+_ONE = np.uint64(1)
+_CORNERS = np.uint64(CORNERS)
+_NOT_CORNER_NEIGHBORS = np.uint64(~sum(1 << sq for sq in CORNER_NEIGHBORS) & 0xFFFFFFFFFFFFFFFF)
+_EVAL = np.array(EVAL_TABLE, dtype=np.float64)
+_WEIGHTS = np.exp(_EVAL / TEMPERATURE)
+
+
+def legal_moves(p, o):
+    """bitboard.legal_moves の配列版 (p, o は uint64 の配列)"""
+    moves = np.zeros_like(p)
+    for shift, mask in _DIRECTIONS:
+        w = o & mask
+        # 左シフト方向
+        t = w & (p << shift)
+        for _ in range(5):
+            t |= w & (t << shift)
+        moves |= t << shift
+        # 右シフト方向
+        t = w & (p >> shift)
+        for _ in range(5):
+            t |= w & (t >> shift)
+        moves |= t >> shift
+    return moves & ~(p | o)
+
+
+def flips(p, o, x):
+    """bitboard.flips の配列版 (x は打つマスのビットの配列)"""
+    flipped = np.zeros_like(p)
+    for shift, mask in _DIRECTIONS:
+        w = o & mask
+        # 左シフト方向: x から続く相手の駒の先に自分の駒があれば裏返る
+        t = w & (x << shift)
+        for _ in range(5):
+            t |= w & (t << shift)
+        flipped |= np.where((t << shift) & p, t, 0)
+        # 右シフト方向
+        t = w & (x >> shift)
+        for _ in range(5):
+            t |= w & (t >> shift)
+        flipped |= np.where((t >> shift) & p, t, 0)
+    return flipped
+
+
+def to_bits(b):
+    """ビットボードの配列を (N, 64) の bool の配列 (列がマス番号) にする"""
+    return np.unpackbits(b.astype("<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder="little").astype(bool)
+
+
+def bit_count(b):
+    """ビットボードの配列の各要素の立っているビットの数"""
+    return to_bits(b).sum(axis=1)
+
+
+def _pick(bits, weights, rng):
+    """各行の立っているマスから weights の重みで1つ選び、マス番号の配列を返す"""
+    cumulative = np.cumsum(np.where(bits, weights, 0.0), axis=1)
+    threshold = rng.random(len(bits)) * cumulative[:, -1]
+    return np.minimum((cumulative <= threshold[:, None]).sum(axis=1), 63)
+
+
+def choose_moves(moves, policy, rng):
+    """合法手の配列 moves から policy の方針で打つマス番号の配列を返す (合法手がない行は使わない)"""
+    if policy == "random":
+        return _pick(to_bits(moves), 1.0, rng)
+    if policy == "random_2":
+        # 角を取れるなら最優先 (マス番号の小さい角)、角の隣は避けてランダム
+        corners = moves & _CORNERS
+        preferred = moves & _NOT_CORNER_NEIGHBORS
+        preferred = np.where(preferred != 0, preferred, moves)
+        chosen = _pick(to_bits(preferred), 1.0, rng)
+        return np.where(corners != 0, np.argmax(to_bits(corners), axis=1), chosen)
+    if policy == "random_3":
+        # 評価表の値が最も高い手 (同じ値ならマス番号の小さい手、角は評価表でも最大)
+        return np.argmax(np.where(to_bits(moves), _EVAL, -np.inf), axis=1)
+    if policy == "weighted":
+        return _pick(to_bits(moves), _WEIGHTS, rng)
+    raise ValueError(f"不明な方針です: {policy}")
+
+
+def simulate(p, o, black_to_move, black="random", white="random", seed=None):
+    """手番側 p、相手側 o の局面の配列から全局を終局まで打つ
+
+    black_to_move は各局の手番が黒かどうかの bool の配列。
+    black / white は黒・白の手の選び方 (POLICIES のいずれか)。
+    (黒の駒数, 白の駒数, 手数) の配列を返す (手数にパスは含めない)。
+    """
+    for policy in (black, white):
+        if policy not in POLICIES:
+            raise ValueError(f"不明な方針です: {policy}")
+    rng = np.random.default_rng(seed)
+    p = np.array(p, dtype=np.uint64)
+    o = np.array(o, dtype=np.uint64)
+    black_to_move = np.array(black_to_move, dtype=bool)
+    n = len(p)
+    black_discs = np.zeros(n, dtype=np.int64)
+    white_discs = np.zeros(n, dtype=np.int64)
+    plies = np.zeros(n, dtype=np.int64)
+    # 対局中の局の番号
+    active = np.arange(n)
+    while len(active):
+        moves = legal_moves(p, o)
+        # 打てない局: 相手も打てなければ終局、打てればパス
+        stuck = moves == 0
+        if stuck.any():
+            finished = stuck & (legal_moves(o, p) == 0)
+            if finished.any():
+                own, opp = bit_count(p[finished]), bit_count(o[finished])
+                black_first = black_to_move[finished]
+                black_discs[active[finished]] = np.where(black_first, own, opp)
+                white_discs[active[finished]] = np.where(black_first, opp, own)
+            passed = stuck & ~finished
+            p[passed], o[passed] = o[passed], p[passed]
+            black_to_move[passed] = ~black_to_move[passed]
+            keep = ~finished
+            active, p, o, black_to_move = active[keep], p[keep], o[keep], black_to_move[keep]
+            moves = np.where(stuck[keep], legal_moves(p, o), moves[keep])
+            if not len(active):
+                break
+
+        sq = np.empty(len(active), dtype=np.int64)
+        for policy, side in ((black, black_to_move), (white, ~black_to_move)):
+            if side.any():
+                sq[side] = choose_moves(moves[side], policy, rng)
+        x = _ONE << sq.astype(np.uint64)
+        f = flips(p, o, x)
+        p, o = o & ~f, p | f | x
+        black_to_move = ~black_to_move
+        plies[active] += 1
+    return black_discs, white_discs, plies
+
+
+def play_games(count, black="random", white="random", seed=None):
+    """初期局面から count 局を打ち、(黒の駒数, 白の駒数, 手数) の配列を返す"""
+    p = np.full(count, INIT_BLACK, dtype=np.uint64)
+    o = np.full(count, INIT_WHITE, dtype=np.uint64)
+    return simulate(p, o, np.ones(count, dtype=bool), black, white, seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多数の対局をまとめて進める")
+    parser.add_argument("--games", type=int, default=10000, help="対局数")
+    parser.add_argument("--black", choices=POLICIES, default="random", help="黒(先手)の手の選び方")
+    parser.add_argument("--white", choices=POLICIES, default="random", help="白(後手)の手の選び方")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    start = perf_counter()
+    results = zip(*(a.tolist() for a in play_games(args.games, args.black, args.white, args.seed)))
+    summary = summarize(list(results), perf_counter() - start, args.black, args.white, 1)
+    print(format_summary(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+# coding: UTF-8
+"""よく通る処理のマイクロベンチマーク (GUI なし)
+
+着手生成・反転・終局判定・ランダムな対局 (NumPy があれば batchsim でまとめて打つ場合も)・
+リプレイの読み込み・CPU の各レベルの手の選び方について、決まった乱数の種で作った局面で 1秒あたりの処理数を計測する。
+結果は JSON で保存でき、保存した結果 (基準) と比べて閾値より遅くなった項目があれば
+終了コード 1 で終わる。
+
+    python bench.py --save bench_baseline.json      # 基準を保存する
+    python bench.py --compare bench_baseline.json   # 基準と比べる (20% 以上遅くなったら失敗)
+    python bench.py --importtime                    # othello の import に時間のかかるモジュールを表示する
+"""
+import argparse
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+from time import perf_counter
+
+from bitboard import flips, iter_bits, legal_moves
+from mcts import MctsSearch
+from record import iter_text_log, move_lines
+from replay import ReplayTimeline
+from rules import Game, Position
+from search import AlphaBetaSearch
+from strategies import CPU_LEVELS, CpuPlayer, choose_random
+from ttable import TranspositionTable
+
+# 局面を作るための対局数と、計測の繰り返し回数
+POSITION_GAMES = 20
+REPEAT = 5
+# 基準より遅くなったと判定する割合
+THRESHOLD = 0.2
+# alphabeta の計測で読む深さ (時間で打ち切ると結果が揺れるので深さで止める)
+ALPHABETA_DEPTH = 3
+# mcts の計測で1手あたりに行うプレイアウト数
+MCTS_PLAYOUTS = 50
+# batch_playout で一度に打つ対局数
+BATCH_GAMES = 2000
+# 起動時間の計測で実行するコード (GUI のモジュールと、コマンドの引数の解析用の argparse を
+# 読み込んでいないことも確認する)
+STARTUP_CODE = ("import sys, othello; "
+                "assert not {'tkinter', 'PIL', 'argparse'} & set(sys.modules), sorted({'tkinter', 'PIL', 'argparse'} & set(sys.modules))")
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def random_games(count, seed=0):
+    """乱数の種を固定したランダムな対局の着手の列を返す"""
+    rng = random.Random(seed)
+    games = []
+    for _ in range(count):
+        moves = []
+        position = Position()
+        while True:
+            legal = list(iter_bits(position.legal_moves()))
+            if not legal:
+                position = position.passed()
+                legal = list(iter_bits(position.legal_moves()))
+                if not legal:
+                    break
+            sq = choose_random(legal, rng)
+            moves.append(sq)
+            position, _ = position.play(sq)
+        games.append(moves)
+    return games
+
+
+class BenchData:
+    """計測に使う局面などをまとめて作っておく"""
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.games = random_games(POSITION_GAMES, seed)
+        # 手番側から見た (p, o, 合法手のリスト)
+        self.positions = []
+        for moves in self.games:
+            position = Position()
+            for sq in moves:
+                if not position.legal_moves():
+                    position = position.passed()
+                p, o = position.own_and_opponent()
+                self.positions.append((p, o, list(iter_bits(position.legal_moves()))))
+                position, _ = position.play(sq)
+        self.logs = ["\n".join(move_lines(moves)) + "\n" for moves in self.games]
+
+
+def bench_legal_moves(data):
+    for p, o, _ in data.positions:
+        legal_moves(p, o)
+    return len(data.positions)
+
+
+def bench_flips(data):
+    count = 0
+    for p, o, moves in data.positions:
+        for sq in moves:
+            flips(p, o, sq)
+        count += len(moves)
+    return count
+
+
+def bench_finish_game(data):
+    game = Game()
+    for p, o, _ in data.positions:
+        game.set_position(p, o, "first")
+        game.legal_moves()
+        game.finish_game()
+    return len(data.positions)
+
+
+def bench_playout(data):
+    """GUI と同じ Game の処理でランダムな対局を最後まで打つ"""
+    rng = random.Random(data.seed)
+    count = 50
+    for _ in range(count):
+        game = Game()
+        game.turn = "first"
+        while True:
+            moves = game.move_list()
+            if not moves:
+                if game.pass_count >= 1:
+                    break
+                game.pass_turn()
+                continue
+            game.play(choose_random(moves, rng))
+    return count
+
+
+def bench_batch_playout(data):
+    """batchsim でランダムな対局をまとめて最後まで打つ (playout と比べる)"""
+    from batchsim import play_games
+    play_games(BATCH_GAMES, seed=data.seed)
+    return BATCH_GAMES
+
+
+def bench_replay_parse(data):
+    """ログファイルの読み込みとリプレイのタイムライン作成 (Othello.start_replay と同じ処理)"""
+    for log in data.logs:
+        ReplayTimeline([sq for _, sq in iter_text_log(io.StringIO(log))])
+    return len(data.logs)
+
+
+def _bench_cpu(level):
+    def bench(data):
+        searcher = None
+        if level == "alphabeta":
+            searcher = AlphaBetaSearch(float("inf"), ALPHABETA_DEPTH, tt=TranspositionTable(4))
+        elif level == "mcts":
+            searcher = MctsSearch(None, MCTS_PLAYOUTS, seed=data.seed)
+        player = CpuPlayer(level, random.Random(data.seed), searcher=searcher)
+        positions = data.positions[::10] if searcher else data.positions
+        for p, o, moves in positions:
+            if moves:
+                if level == "alphabeta":
+                    searcher.tt.clear()
+                elif level == "mcts":
+                    searcher.clear()
+                player.choose(p, o, moves)
+        return len(positions)
+    bench.__doc__ = f"CPU ({level}) が手を選ぶ"
+    return bench
+
+
+def bench_startup(data):
+    """新しいインタプリタで othello を import する (GUI を使わないツールの起動時間)"""
+    subprocess.run([sys.executable, "-c", STARTUP_CODE], cwd=_HERE, check=True)
+    return 1
+
+
+def import_times(limit=10):
+    """python -X importtime で othello を import し、時間のかかったモジュールを (累計 µs, 名前) で返す"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import othello"], cwd=_HERE,
+                            check=True, capture_output=True, text=True)
+    times = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            times.append((int(parts[1]), parts[2].rstrip()))
+    return sorted(times, reverse=True)[:limit]
+
+
+# (名前, 計測する関数)。関数は1回分の処理をして処理数を返す
+BENCHMARKS = [
+    ("legal_moves", bench_legal_moves),
+    ("flips", bench_flips),
+    ("finish_game", bench_finish_game),
+    ("playout", bench_playout),
+] + ([("batch_playout", bench_batch_playout)] if importlib.util.find_spec("numpy") else []) + [
+    ("replay_parse", bench_replay_parse),
+] + [(f"cpu_{level}", _bench_cpu(level)) for level in CPU_LEVELS] + [
+    ("startup", bench_startup),
+]
+
+
+def run_benchmarks(names=None, repeat=REPEAT, seed=0):
+    """ベンチマークを実行し、{名前: 1秒あたりの処理数} を返す (繰り返しのうち最も速い回)"""
+    data = BenchData(seed)
+    results = {}
+    for name, func in BENCHMARKS:
+        if names and name not in names:
+            continue
+        func(data) # 1回目はキャッシュなどが温まっていないので計測しない
+        best = None
+        for _ in range(repeat):
+            start = perf_counter()
+            ops = func(data)
+            elapsed = perf_counter() - start
+            if best is None or elapsed < best[1]:
+                best = (ops, elapsed)
+        results[name] = best[0] / best[1]
+    return results
+
+
+def save_baseline(path, results):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"python": platform.python_version(), "results": results}, f, ensure_ascii=False, indent=2)
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """基準と比べて (名前, 基準, 今回, 比, 遅くなったか) のリストを返す"""
+    rows = []
+    for name, value in results.items():
+        base = baseline.get(name)
+        ratio = value / base if base else None
+        rows.append((name, base, value, ratio, ratio is not None and ratio < 1 - threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="マイクロベンチマーク")
+    parser.add_argument("--only", nargs="*", choices=[name for name, _ in BENCHMARKS], help="計測する項目")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="繰り返し回数 (最も速い回を使う)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", metavar="JSON", help="結果を基準として保存するファイル")
+    parser.add_argument("--compare", metavar="JSON", help="比べる基準のファイル")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="遅くなったと判定する割合")
+    parser.add_argument("--importtime", action="store_true", help="import に時間のかかるモジュールを表示して終わる")
+    args = parser.parse_args(argv)
+
+    if args.importtime:
+        print(f"{'累計(µs)':>10}  モジュール")
+        for us, name in import_times():
+            print(f"{us:>10}  {name}")
+        return 0
+
+    results = run_benchmarks(args.only, args.repeat, args.seed)
+    regressed = False
+    if args.compare:
+        print(f"{'項目':<16} {'基準(/秒)':>12} {'今回(/秒)':>12} {'比':>6}")
+        for name, base, value, ratio, slow in compare(results, load_baseline(args.compare), args.threshold):
+            base_text = f"{base:>12.0f}" if base else f"{'-':>12}"
+            ratio_text = f"{ratio:>6.2f}" if ratio else f"{'-':>6}"
+            print(f"{name:<16} {base_text} {value:>12.0f} {ratio_text}{'  遅くなりました' if slow else ''}")
+            regressed |= slow
+    else:
+        print(f"{'項目':<16} {'今回(/秒)':>12}")
+        for name, value in results.items():
+            print(f"{name:<16} {value:>12.0f}")
+    if args.save:
+        save_baseline(args.save, results)
+        print(f"{args.save} に保存しました")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
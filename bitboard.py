@@ -0,0 +1,149 @@
+# coding: UTF-8
+"""ビットボードによる着手生成・反転計算
+
+盤面は黒・白それぞれ64bitの整数で表す。
+マス番号は sq = y * 8 + x (tag "x_y" と対応) とする。
+"""
+import random
+
+# 64bit 全マス
+FULL = 0xFFFFFFFFFFFFFFFF
+# 左右端の列を除いたマスク(横・斜め方向の折り返し防止)
+H_MASK = 0x7E7E7E7E7E7E7E7E
+
+# シフト量と、その方向で相手の駒として扱うマスク
+DIRECTIONS = (
+    (1, H_MASK),  # 横
+    (8, FULL),    # 縦
+    (7, H_MASK),  # 斜め (右上-左下)
+    (9, H_MASK),  # 斜め (左上-右下)
+)
+
+# 初期配置 (3_3, 4_4 が黒、4_3, 3_4 が白)
+INIT_BLACK = (1 << 27) | (1 << 36)
+INIT_WHITE = (1 << 28) | (1 << 35)
+
+# 角のマス
+CORNERS = (1 << 0) | (1 << 7) | (1 << 56) | (1 << 63)
+
+
+def popcount(b):
+    """立っているビットの数を返す"""
+    return b.bit_count()
+
+
+def tag_to_sq(tag):
+    """"x_y" 形式のタグをマス番号に変換する"""
+    x, y = map(int, tag.split("_"))
+    return y * 8 + x
+
+
+def sq_to_tag(sq):
+    """マス番号を "x_y" 形式のタグに変換する"""
+    return f"{sq & 7}_{sq >> 3}"
+
+
+def iter_bits(b):
+    """立っているビットのマス番号を小さい順に返す"""
+    while b:
+        low = b & -b
+        yield low.bit_length() - 1
+        b ^= low
+
+
+def legal_moves(p, o):
+    """手番側 p、相手側 o のときの合法手をビットボードで返す"""
+    moves = 0
+    for shift, mask in DIRECTIONS:
+        w = o & mask
+        # 左シフト方向
+        t = w & (p << shift)
+        t |= w & (t << shift)
+        t |= w & (t << shift)
+        t |= w & (t << shift)
+        t |= w & (t << shift)
+        t |= w & (t << shift)
+        moves |= t << shift
+        # 右シフト方向
+        t = w & (p >> shift)
+        t |= w & (t >> shift)
+        t |= w & (t >> shift)
+        t |= w & (t >> shift)
+        t |= w & (t >> shift)
+        t |= w & (t >> shift)
+        moves |= t >> shift
+    return moves & ~(p | o) & FULL
+
+
+def flips(p, o, sq):
+    """マス sq に打ったときに裏返る相手の駒をビットボードで返す"""
+    x = 1 << sq
+    flipped = 0
+    for shift, mask in DIRECTIONS:
+        w = o & mask
+        # 左シフト方向
+        line = 0
+        cur = x << shift
+        while cur & w:
+            line |= cur
+            cur <<= shift
+        if cur & p:
+            flipped |= line
+        # 右シフト方向
+        line = 0
+        cur = x >> shift
+        while cur & w:
+            line |= cur
+            cur >>= shift
+        if cur & p:
+            flipped |= line
+    return flipped
+
+
+# --- Zobrist ハッシュ ---
+# 手番側から見た盤面 (手番側 p, 相手側 o) のハッシュ値を求める。
+# 定跡ファイルなどに保存するので乱数の種は変更しないこと。
+_zobrist_rng = random.Random(0x0E11E110)
+ZOBRIST_OWN = tuple(_zobrist_rng.getrandbits(64) for _ in range(64))
+ZOBRIST_OPP = tuple(_zobrist_rng.getrandbits(64) for _ in range(64))
+# 駒が裏返ったときに XOR する値
+ZOBRIST_FLIP = tuple(a ^ b for a, b in zip(ZOBRIST_OWN, ZOBRIST_OPP))
+
+
+def _byte_tables(keys):
+    """1バイト(8マス)分の駒の並びに対する XOR 値の表を作る"""
+    tables = []
+    for i in range(8):
+        table = [0] * 256
+        for bits in range(1, 256):
+            low = bits & -bits
+            table[bits] = table[bits ^ low] ^ keys[i * 8 + low.bit_length() - 1]
+        tables.append(tuple(table))
+    return tuple(tables)
+
+
+_OWN_BYTES = _byte_tables(ZOBRIST_OWN)
+_OPP_BYTES = _byte_tables(ZOBRIST_OPP)
+_FLIP_BYTES = _byte_tables(ZOBRIST_FLIP)
+
+
+def _xor_keys(t, b):
+    return (t[0][b & 255] ^ t[1][b >> 8 & 255] ^ t[2][b >> 16 & 255] ^ t[3][b >> 24 & 255]
+            ^ t[4][b >> 32 & 255] ^ t[5][b >> 40 & 255] ^ t[6][b >> 48 & 255] ^ t[7][b >> 56])
+
+
+def zobrist(p, o):
+    """手番側 p、相手側 o の局面のハッシュ値を返す"""
+    return _xor_keys(_OWN_BYTES, p) ^ _xor_keys(_OPP_BYTES, o)
+
+
+def zobrist_flip(f):
+    """ビットボード f の駒が裏返ったときに XOR する値を返す"""
+    return _xor_keys(_FLIP_BYTES, f)
+
+
+def zobrist_after(h, h_rev, sq, f):
+    """局面のハッシュ値 h と手番を入れ替えたハッシュ値 h_rev から、
+    マス sq に打って f が裏返った後の (h, h_rev) を求める (手番も交代する)"""
+    fx = zobrist_flip(f)
+    return h_rev ^ fx ^ ZOBRIST_OPP[sq], h ^ fx ^ ZOBRIST_OWN[sq]
@@ -0,0 +1,190 @@
+# coding: UTF-8
+"""定跡 (オープニングブック)
+
+局面のハッシュ値 (bitboard.zobrist) で昇順に並べた固定長レコードを
+バイナリファイルに保存し、mmap で開いて二分探索で引く。
+読み込み時の解析は不要で、ファイルが大きくてもすぐに使える。
+
+ファイル形式 (リトルエンディアン)
+  ヘッダ 16バイト: マジック "OTHBOOK1", レコード数 uint32, 予約 uint32
+  レコード 16バイト: ハッシュ値 uint64, 手 int8, 予約 1バイト,
+                     評価値 int16 (手番側から見た平均石差 x100), 対局数 uint32
+
+    python book.py --games 2000 --output othello_book.bin   # 自己対戦から作る
+    python book.py --logs othello_log_*.txt --output othello_book.bin
+    python book.py --records games.othr --output othello_book.bin   # 棋譜アーカイブから作る
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+
+from bitboard import popcount, zobrist
+from record import iter_records, read_text_log
+from rules import iter_positions
+from strategies import CPU_LEVELS
+
+MAGIC = b"OTHBOOK1"
+HEADER = struct.Struct("<8sII")
+RECORD = struct.Struct("<QbxhI")
+
+# 定跡に登録する手数の上限
+MAX_PLY = 20
+# 定跡に登録するのに必要な対局数
+MIN_COUNT = 2
+
+
+class OpeningBook:
+    """mmap で開いた定跡ファイル"""
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # 空のファイル
+            self._file.close()
+            raise ValueError(f"定跡ファイルが空です: {path}")
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise ValueError(f"定跡ファイルの形式が正しくありません: {path}")
+        magic, self.size, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or HEADER.size + self.size * RECORD.size > len(self._map):
+            self.close()
+            raise ValueError(f"定跡ファイルの形式が正しくありません: {path}")
+        # --- 統計情報 ---
+        self.hits = 0
+        self.probes = 0
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def lookup(self, p, o):
+        """手番側 p、相手側 o の局面の定跡手を (手, 評価値, 対局数) で返す。なければ None"""
+        self.probes += 1
+        key = zobrist(p, o)
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key = RECORD.unpack_from(self._map, HEADER.size + mid * RECORD.size)[0]
+            if mid_key < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.size:
+            entry_key, move, score, count = RECORD.unpack_from(self._map, HEADER.size + lo * RECORD.size)
+            if entry_key == key:
+                self.hits += 1
+                return move, score / 100, count
+        return None
+
+    def stats_text(self):
+        """統計情報を整形して文字列として返す"""
+        return f" 定跡: {self.size} 局面, ヒット {self.hits}/{self.probes}"
+
+
+class BookBuilder:
+    """対局の棋譜を集計して定跡ファイルを作る"""
+    def __init__(self, max_ply=MAX_PLY):
+        self.max_ply = max_ply
+        # ハッシュ値 -> {手: [対局数, 手番側から見た石差の合計]}
+        self.stats = {}
+        self.games = 0
+
+    def add_game(self, moves):
+        """1局分の着手の列 (マス番号) を追加する"""
+        history = []
+        position = None
+        for ply, (position, sq) in enumerate(iter_positions(moves)):
+            if ply < self.max_ply:
+                p, o = position.own_and_opponent()
+                history.append((zobrist(p, o), sq, position.turn))
+        if position is None:
+            return
+        final, _ = position.play(moves[-1])
+        black_diff = popcount(final.black) - popcount(final.white)
+        for key, sq, turn in history:
+            entry = self.stats.setdefault(key, {}).setdefault(sq, [0, 0])
+            entry[0] += 1
+            entry[1] += black_diff if turn == "first" else -black_diff
+        self.games += 1
+
+    def records(self, min_count=MIN_COUNT):
+        """局面ごとに平均石差が最も大きい手を選び、ハッシュ値順のレコードを返す"""
+        records = []
+        for key, moves in self.stats.items():
+            candidates = [(total / count, count, sq) for sq, (count, total) in moves.items() if count >= min_count]
+            if candidates:
+                mean, count, sq = max(candidates)
+                records.append((key, sq, round(mean * 100), count))
+        records.sort()
+        return records
+
+    def write(self, path, min_count=MIN_COUNT):
+        """定跡ファイルを書き出し、レコード数を返す"""
+        records = self.records(min_count)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(records), 0))
+            for record in records:
+                f.write(RECORD.pack(*record))
+        os.replace(tmp_path, path)
+        return len(records)
+
+
+class _Opening:
+    """序盤だけ別の CPU に打たせる"""
+    def __init__(self, opener, player, plies):
+        self.opener = opener
+        self.player = player
+        self.plies = plies
+
+    def choose(self, p, o, moves):
+        if popcount(p | o) - 4 < self.plies:
+            return self.opener.choose(p, o, moves)
+        return self.player.choose(p, o, moves)
+
+
+def selfplay_games(games, level, random_plies, seed=0):
+    """序盤 random_plies 手をランダムに打ち、以降は level の CPU で打った棋譜を返す"""
+    # 自己対戦 (multiprocessing など) は定跡を作るときだけ読み込む
+    from selfplay import make_player, play_game
+
+    player = make_player(level)
+    opener = make_player("random")
+    for i in range(games):
+        rng = random.Random(seed + i)
+        player.rng = opener.rng = rng
+        moves = []
+        play_game(_Opening(opener, player, random_plies), _Opening(opener, player, random_plies), moves)
+        yield moves
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="定跡ファイルを作る")
+    parser.add_argument("--games", type=int, default=0, help="自己対戦する対局数")
+    parser.add_argument("--level", choices=CPU_LEVELS, default="random_3", help="自己対戦の CPU のレベル")
+    parser.add_argument("--random-plies", type=int, default=8, help="自己対戦で序盤にランダムに打つ手数")
+    parser.add_argument("--logs", nargs="*", default=[], help="取り込むログファイル (.txt)")
+    parser.add_argument("--records", nargs="*", default=[], help="取り込む棋譜アーカイブ (.othr)")
+    parser.add_argument("--max-ply", type=int, default=MAX_PLY, help="定跡に登録する手数の上限")
+    parser.add_argument("--min-count", type=int, default=MIN_COUNT, help="登録に必要な対局数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="othello_book.bin")
+    args = parser.parse_args(argv)
+
+    builder = BookBuilder(args.max_ply)
+    for path in args.logs:
+        builder.add_game(read_text_log(path))
+    for path in args.records:
+        for record in iter_records(path):
+            builder.add_game(list(record.moves))
+    for moves in selfplay_games(args.games, args.level, args.random_plies, args.seed):
+        builder.add_game(moves)
+    count = builder.write(args.output, args.min_count)
+    print(f"{builder.games} 局から {count} 局面を {args.output} に保存しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# coding: UTF-8
+"""終盤の完全読み
+
+残りの空きマスが少なくなったら、最終的な石差が最大になる手を読み切る。
+評価値は手番側から見た石差 (自分の駒数 - 相手の駒数)。
+
+    python endgame.py            # 完全読みの速度を計測する
+"""
+import random
+from time import perf_counter
+
+from bitboard import (FULL, INIT_BLACK, INIT_WHITE, flips, iter_bits,
+                      legal_moves, popcount)
+from search import CHECK_INTERVAL, SearchResult, SearchTimeout
+
+# 着手後の相手の着手可能数が少ない手から読む (fastest-first) 空きマス数の下限
+FASTEST_FIRST_EMPTIES = 5
+# 確定石による枝刈りを試す α の下限 (α が小さいうちは刈れないので計算しない)
+STABILITY_THRESHOLD = 0
+
+# 盤面を4分割した領域 (偶数理論による並べ替え用)
+QUADRANTS = (0x000000000F0F0F0F, 0x00000000F0F0F0F0, 0x0F0F0F0F00000000, 0xF0F0F0F000000000)
+
+# 端の列・行
+COL_0 = 0x0101010101010101
+COL_7 = 0x8080808080808080
+ROW_0 = 0x00000000000000FF
+ROW_7 = 0xFF00000000000000
+EDGE = COL_0 | COL_7 | ROW_0 | ROW_7
+
+
+def _line_masks():
+    """横・縦・2方向の斜めの各ラインのマスク"""
+    rows = [ROW_0 << (8 * y) for y in range(8)]
+    cols = [COL_0 << x for x in range(8)]
+    diag9 = []  # 左上-右下 (x - y が一定)
+    diag7 = []  # 右上-左下 (x + y が一定)
+    for k in range(-7, 8):
+        diag9.append(sum(1 << (y * 8 + x) for y in range(8) for x in range(8) if x - y == k))
+    for k in range(15):
+        diag7.append(sum(1 << (y * 8 + x) for y in range(8) for x in range(8) if x + y == k))
+    return rows, cols, diag7, diag9
+
+
+_ROWS, _COLS, _DIAG7, _DIAG9 = _line_masks()
+
+
+def _full_lines(filled, lines):
+    """すべて埋まっているラインのマスを返す"""
+    full = 0
+    for mask in lines:
+        if filled & mask == mask:
+            full |= mask
+    return full
+
+
+def stable_discs(p, o):
+    """p の確定石 (今後裏返ることのない駒) を返す
+
+    4方向のラインそれぞれについて、ラインが埋まっているか、
+    どちらか一方の隣が盤外か p の確定石なら、その駒は確定石とする。
+    """
+    filled = p | o
+    full_h = _full_lines(filled, _ROWS) | COL_0 | COL_7
+    full_v = _full_lines(filled, _COLS) | ROW_0 | ROW_7
+    full_7 = _full_lines(filled, _DIAG7) | EDGE
+    full_9 = _full_lines(filled, _DIAG9) | EDGE
+
+    stable = 0
+    while True:
+        h = full_h | (stable << 1 & ~COL_0) | (stable >> 1 & ~COL_7)
+        v = full_v | (stable << 8) | (stable >> 8)
+        d7 = full_7 | (stable << 7 & ~COL_7) | (stable >> 7 & ~COL_0)
+        d9 = full_9 | (stable << 9 & ~COL_0) | (stable >> 9 & ~COL_7)
+        new_stable = p & h & v & d7 & d9 & FULL
+        if new_stable == stable:
+            return stable
+        stable = new_stable
+
+
+class EndgameSolver:
+    """αβ探索による終盤の完全読み"""
+    def __init__(self):
+        self.nodes = 0
+        self.deadline = None
+
+    def solve(self, p, o, deadline=None):
+        """手番側 p の最善手と最終石差を SearchResult で返す
+
+        deadline (perf_counter の時刻) を過ぎたら SearchTimeout を送出する。
+        """
+        start = perf_counter()
+        self.nodes = 0
+        self.deadline = deadline
+        empties = 64 - popcount(p | o)
+
+        moves = self._ordered_moves(p, o, legal_moves(p, o), empties)
+        if not moves:
+            return SearchResult(None, 0, 0, 0, 0.0, exact=True)
+
+        best_move, alpha = moves[0], -65
+        for sq in moves:
+            f = flips(p, o, sq)
+            score = -self._solve(o & ~f, p | f | (1 << sq), -65, -alpha, False)
+            if score > alpha:
+                best_move, alpha = sq, score
+        return SearchResult(best_move, alpha, empties, self.nodes, perf_counter() - start, exact=True)
+
+    def _ordered_moves(self, p, o, moves, empties):
+        if empties > FASTEST_FIRST_EMPTIES:
+            # fastest-first: 相手の着手可能数が少ない手から
+            keyed = []
+            for sq in iter_bits(moves):
+                f = flips(p, o, sq)
+                keyed.append((popcount(legal_moves(o & ~f, p | f | (1 << sq))), sq))
+            keyed.sort()
+            return [sq for _, sq in keyed]
+
+        # 偶数理論: 空きマスが奇数個の領域の手から
+        empty = ~(p | o) & FULL
+        odd = 0
+        for quadrant in QUADRANTS:
+            if popcount(empty & quadrant) & 1:
+                odd |= quadrant
+        return list(iter_bits(moves & odd)) + list(iter_bits(moves & ~odd))
+
+    def _solve(self, p, o, alpha, beta, passed):
+        self.nodes += 1
+        if self.deadline is not None and not self.nodes % CHECK_INTERVAL and perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        empty = ~(p | o) & FULL
+        empties = popcount(empty)
+        if empties == 0:
+            return 2 * popcount(p) - 64
+        if empties == 1:
+            return self._solve_last(p, o, empty)
+
+        # 確定石による枝刈り: 相手の確定石の分だけ石差の上限が下がる
+        if alpha >= STABILITY_THRESHOLD and 2 * popcount(o) >= 64 - alpha:
+            upper = 64 - 2 * popcount(stable_discs(o, p))
+            if upper <= alpha:
+                return upper
+
+        moves = legal_moves(p, o)
+        if not moves:
+            if passed: # 両者とも打てないので終局
+                return popcount(p) - popcount(o)
+            return -self._solve(o, p, -beta, -alpha, True)
+
+        best = -65
+        for sq in self._ordered_moves(p, o, moves, empties):
+            f = flips(p, o, sq)
+            score = -self._solve(o & ~f, p | f | (1 << sq), -beta, -alpha, False)
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+    def _solve_last(self, p, o, empty):
+        """空きマスが1つのときの石差"""
+        sq = empty.bit_length() - 1
+        f = flips(p, o, sq)
+        if f:
+            n = popcount(p) + popcount(f) + 1
+            return 2 * n - 64
+        f = flips(o, p, sq)
+        if f:
+            n = popcount(o) + popcount(f) + 1
+            return 64 - 2 * n
+        # どちらも打てずに終局
+        return popcount(p) - popcount(o)
+
+
+def benchmark_positions(empties, count, seed=0):
+    """ランダムに打ち進めて空きマスが empties 個になった局面を count 個作る"""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        p, o = INIT_BLACK, INIT_WHITE
+        passed = False
+        while 64 - popcount(p | o) > empties:
+            moves = list(iter_bits(legal_moves(p, o)))
+            if not moves:
+                if passed:
+                    break
+                p, o, passed = o, p, True
+                continue
+            sq = rng.choice(moves)
+            f = flips(p, o, sq)
+            p, o, passed = o & ~f, p | f | (1 << sq), False
+        if 64 - popcount(p | o) == empties and legal_moves(p, o):
+            positions.append((p, o))
+    return positions
+
+
+def run_benchmark(empties_list, count, seed=0):
+    """空きマス数ごとに完全読みの時間と速度を表示する"""
+    solver = EndgameSolver()
+    print(f"{'空き':>4} {'局面':>4} {'ノード数':>12} {'時間(秒)':>10} {'nps':>10}")
+    for empties in empties_list:
+        nodes = 0
+        elapsed = 0.0
+        for p, o in benchmark_positions(empties, count, seed):
+            result = solver.solve(p, o)
+            nodes += result.nodes
+            elapsed += result.elapsed
+        nps = int(nodes / elapsed) if elapsed > 0 else 0
+        print(f"{empties:>4} {count:>4} {nodes:>12} {elapsed:>10.3f} {nps:>10}")
+
+
+if __name__ == "__main__":
+    # argparse は othello の起動時に読み込まないように、コマンドとして使うときだけ読み込む
+    import argparse
+
+    parser = argparse.ArgumentParser(description="終盤の完全読みの速度を計測する")
+    parser.add_argument("--empties", type=int, nargs="+", default=[8, 10, 12, 14])
+    parser.add_argument("--count", type=int, default=5, help="空きマス数ごとの局面数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run_benchmark(args.empties, args.count, args.seed)
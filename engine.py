@@ -0,0 +1,258 @@
+# coding: UTF-8
+"""テキストのエンジンプロトコル (NBoard 互換、tkinter に依存しない)
+
+標準入力から1行ずつコマンドを読み、探索するCPU (alphabeta) の結果を標準出力に返す。
+探索の置換表と定跡はプロセスの間ずっと使い回すので、手ごとに起動の時間がかからず、
+前の手で読んだ結果も次の手で使える。「go」で手を返した後は、次のコマンドが届くまで
+相手の手番の局面を読んでおく (ポンダー)。
+
+    python othello.py --engine
+
+コマンド (NBoard のプロトコル 2 と、いくつかの拡張):
+    nboard 2                 -> set myname Othello
+    set game <GGF>           局面を設定する (BO[...] の盤面と B[..] W[..] の着手)
+    set depth N              読む深さの上限
+    set time SEC             1手あたりの持ち時間 (拡張)
+    set ponder on|off        ポンダーするかどうか (拡張)
+    move F5[/評価値/時間]     手番側が打つ (パスは PA)
+    go [SEC]                 -> === F5/評価値/時間 と nodestats ノード数 時間
+    hint N                   -> 上位 N 手を search F5 評価値 0 深さ で返し、最後に status
+    ping N                   -> pong N
+    quit                     終了する
+評価値は手番側から見た石差。マスは列 A〜H (x)、行 1〜8 (y + 1) で表す。
+"""
+import argparse
+import os
+import re
+import sys
+import threading
+from time import perf_counter
+
+from bitboard import INIT_BLACK, INIT_WHITE
+from endgame import EndgameSolver
+from rules import Position
+from search import DISC_SCORE, AlphaBetaSearch
+from ttable import TranspositionTable
+
+ENGINE_NAME = "Othello"
+# ポンダーの持ち時間の上限 (秒)。普通は次のコマンドが届いたところで打ち切る
+PONDER_TIME_LIMIT = 600.0
+# パスの表記
+PASS = "PA"
+
+
+def move_to_text(sq):
+    """マス番号を "F5" 形式にする (None はパス)"""
+    if sq is None:
+        return PASS
+    return f"{'ABCDEFGH'[sq & 7]}{(sq >> 3) + 1}"
+
+
+def parse_move(text):
+    """"F5" 形式 ("/評価値/時間" が続いてもよい) をマス番号にする (パスは None)"""
+    text = text.split("/")[0].strip().upper()
+    if text in (PASS, "PASS"):
+        return None
+    if len(text) != 2 or text[0] not in "ABCDEFGH" or text[1] not in "12345678":
+        raise ValueError(f"手の表記が正しくありません: {text}")
+    return (int(text[1]) - 1) * 8 + "ABCDEFGH".index(text[0])
+
+
+def parse_ggf(text):
+    """GGF の棋譜から、最後の局面 (rules.Position) を返す"""
+    position = Position(INIT_BLACK, INIT_WHITE, "first")
+    board = re.search(r"BO\[8\s+([^\]]*)\]", text)
+    if board:
+        cells = board.group(1).replace(" ", "")
+        if len(cells) != 65:
+            raise ValueError("GGF の盤面 (BO) が正しくありません")
+        black = sum(1 << sq for sq, c in enumerate(cells[:64]) if c == "*")
+        white = sum(1 << sq for sq, c in enumerate(cells[:64]) if c in "Oo")
+        position = Position(black, white, "first" if cells[64] == "*" else "second")
+    for color, move in re.findall(r"(?<![A-Z])([BW])\[([^\]]*)\]", text):
+        position = play_move(position, parse_move(move), "first" if color == "B" else "second")
+    return position
+
+
+def play_move(position, sq, turn=None):
+    """position で sq (None はパス) を打った後の局面を返す (turn を指定すると手番を確かめる)"""
+    if turn is not None and turn != position.turn:
+        # 相手が打てないのに手番側の手が続く棋譜は、パスを省いたものとして扱う
+        position = position.passed()
+    if sq is None:
+        return position.passed()
+    if not position.legal_moves() >> sq & 1:
+        raise ValueError(f"{move_to_text(sq)} には打てません")
+    return position.play(sq)[0]
+
+
+def format_score(score, exact):
+    """探索の評価値を手番側から見た石差の文字列にする"""
+    if exact:
+        return f"{score:.0f}"
+    return f"{round(score / DISC_SCORE, 3) or 0.0:.3f}" # -0.000 と表示しない
+
+
+class Engine:
+    """プロトコルのコマンドを処理する (探索・置換表・定跡はコマンドをまたいで使い回す)"""
+    def __init__(self, searcher, book=None, time_limit=1.0, ponder=True, output=sys.stdout):
+        self.searcher = searcher
+        self.book = book
+        self.time_limit = time_limit
+        self.ponder = ponder
+        self.output = output
+        self.position = Position(INIT_BLACK, INIT_WHITE, "first")
+        self._ponder_thread = None
+
+    def send(self, line):
+        self.output.write(line + "\n")
+        self.output.flush()
+
+    # --- ポンダー ---
+    def start_ponder(self, position):
+        """position を別スレッドで読み、置換表を温めておく"""
+        if not self.ponder or not position.legal_moves():
+            return
+        p, o = position.own_and_opponent()
+
+        def run():
+            self.searcher.time_limit = PONDER_TIME_LIMIT
+            self.searcher.search(p, o)
+        self._ponder_thread = threading.Thread(target=run, daemon=True)
+        self._ponder_thread.start()
+
+    def stop_ponder(self):
+        """ポンダーを打ち切って、スレッドが終わるまで待つ"""
+        thread = self._ponder_thread
+        if thread is None:
+            return
+        # スレッドが探索を始める前に stop() しても打ち切られないので、終わるまで繰り返す
+        while thread.is_alive():
+            self.searcher.stop()
+            thread.join(0.01)
+        self._ponder_thread = None
+
+    # --- 思考 ---
+    def book_move(self):
+        """定跡手を (手, 評価値, 対局数) で返す。なければ None"""
+        if self.book is None:
+            return None
+        entry = self.book.lookup(*self.position.own_and_opponent())
+        if entry and self.position.legal_moves() >> entry[0] & 1:
+            return entry
+        return None
+
+    def search(self, count=1, time_limit=None):
+        self.searcher.time_limit = time_limit if time_limit is not None else self.time_limit
+        return self.searcher.search(*self.position.own_and_opponent(), count=count)
+
+    # --- コマンド ---
+    def handle(self, line):
+        """1行のコマンドを処理する。終了するときは False を返す"""
+        self.stop_ponder()
+        words = line.split()
+        if not words:
+            return True
+        command, args = words[0], words[1:]
+        if command == "quit":
+            return False
+        handler = getattr(self, f"cmd_{command}", None)
+        if handler is None:
+            self.send(f"status 不明なコマンドです: {command}")
+            return True
+        try:
+            handler(args, line)
+        except (ValueError, IndexError) as e:
+            self.send(f"status エラー: {e}")
+        return True
+
+    def cmd_nboard(self, args, line):
+        self.send(f"set myname {ENGINE_NAME}")
+
+    def cmd_ping(self, args, line):
+        self.send(f"pong {args[0] if args else 0}")
+
+    def cmd_set(self, args, line):
+        name = args[0]
+        if name == "game":
+            self.position = parse_ggf(line.split(None, 2)[2])
+        elif name == "depth":
+            self.searcher.max_depth = max(1, int(args[1]))
+        elif name == "time":
+            self.time_limit = float(args[1])
+        elif name == "ponder":
+            self.ponder = args[1] == "on"
+        # contempt などの設定は使わない
+
+    def cmd_move(self, args, line):
+        self.position = play_move(self.position, parse_move(args[0]))
+
+    def cmd_go(self, args, line):
+        start = perf_counter()
+        if not self.position.legal_moves():
+            self.send(f"=== {PASS}")
+            self.start_ponder(self.position.passed())
+            return
+        entry = self.book_move()
+        if entry:
+            sq, score, nodes = entry[0], f"{entry[1]:.2f}", 0
+        else:
+            result = self.search(time_limit=float(args[0]) if args else None)
+            sq, score, nodes = result.move, format_score(result.score, result.exact), result.nodes
+        elapsed = perf_counter() - start
+        self.send(f"=== {move_to_text(sq)}/{score}/{elapsed:.2f}")
+        self.send(f"nodestats {nodes} {elapsed:.2f}")
+        self.start_ponder(self.position.play(sq)[0])
+
+    def cmd_hint(self, args, line):
+        count = int(args[0]) if args else 1
+        if self.position.legal_moves():
+            entry = self.book_move()
+            if entry:
+                self.send(f"book {move_to_text(entry[0])} {entry[1]:.2f} 0 {entry[2]}")
+            result = self.search(count)
+            depth = "100%" if result.exact else str(result.depth)
+            for sq, score in result.lines:
+                self.send(f"search {move_to_text(sq)} {format_score(score, result.exact)} 0 {depth}")
+        self.send("status")
+
+    def cmd_learn(self, args, line):
+        self.send("learned")
+
+    def cmd_analyze(self, args, line):
+        pass # 対局全体の解析には対応しない
+
+    def run(self, lines):
+        """lines (標準入力など) のコマンドを順に処理する"""
+        for line in lines:
+            if not self.handle(line.strip()):
+                break
+        self.stop_ponder()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="テキストのエンジンプロトコル (NBoard 互換)")
+    parser.add_argument("--engine", action="store_true", help="(othello.py から起動したときの目印)")
+    parser.add_argument("--time", type=float, default=1.0, help="1手あたりの持ち時間 (秒)")
+    parser.add_argument("--tt-mb", type=int, default=64, help="置換表のメモリ上限 (MB)")
+    parser.add_argument("--endgame-empties", type=int, default=12, help="完全読みに切り替える空きマス数")
+    parser.add_argument("--book", default="othello_book.bin", help="定跡ファイル (なければ使わない)")
+    parser.add_argument("--weights", default="othello_weights.bin", help="パターン評価の重み (なければ評価表)")
+    parser.add_argument("--no-ponder", action="store_true", help="相手の手番に読まない")
+    args = parser.parse_args(argv)
+
+    evaluator = None
+    if os.path.exists(args.weights):
+        from pattern import PatternEvaluator
+        evaluator = PatternEvaluator.load(args.weights)
+    searcher = AlphaBetaSearch(args.time, tt=TranspositionTable(args.tt_mb), endgame=EndgameSolver(),
+                               endgame_empties=args.endgame_empties, evaluator=evaluator)
+    book = None
+    if os.path.exists(args.book):
+        from book import OpeningBook
+        book = OpeningBook(args.book)
+    Engine(searcher, book, args.time, not args.no_ponder).run(sys.stdin)
+
+
+if __name__ == "__main__":
+    main()
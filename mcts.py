@@ -0,0 +1,254 @@
+# coding: UTF-8
+"""モンテカルロ木探索 (MCTS) の CPU (tkinter に依存しない)
+
+木の中は UCT (または評価表を事前確率にした PUCT) で手を選び、葉からは
+完全乱数 (Othello.random_hit_1 と同じ方針) で終局まで打つプレイアウトを行う。
+プレイアウトはビットボードの整数だけで進めるので、1手ごとにリストなどを作らない。
+前の手で作った木は、次の局面 (自分の手と相手の手の後) の部分木を根にして使い回す。
+強さはプレイアウト数か持ち時間で決める。
+
+    python mcts.py --playouts 2000 --count 5   # プレイアウト/秒を計測する
+"""
+import argparse
+import math
+import random
+from time import perf_counter
+
+from bitboard import flips, iter_bits, legal_moves
+from rules import EVAL_TABLE
+
+# パスを表す手
+PASS = 64
+# 何回のプレイアウトごとに時間切れを確認するか
+CHECK_INTERVAL = 16
+
+
+def playout(p, o, rand):
+    """手番側 p、相手側 o の局面から完全乱数で終局まで打ち、手番側から見た石差を返す"""
+    sign = 1
+    passed = False
+    while True:
+        moves = legal_moves(p, o)
+        if not moves:
+            if passed:
+                break
+            passed = True
+            p, o = o, p
+            sign = -sign
+            continue
+        passed = False
+        # 合法手の k 番目のビットを選ぶ
+        for _ in range(int(rand() * moves.bit_count())):
+            moves &= moves - 1
+        b = moves & -moves
+        f = flips(p, o, b.bit_length() - 1)
+        p, o = o & ~f, p | f | b
+        sign = -sign
+    return (p.bit_count() - o.bit_count()) * sign
+
+
+class _Node:
+    """木の節点 (手番側 p、相手側 o の局面)
+
+    wins はこの局面に打ち進めた側 (手番側の相手) から見た勝ち数 (引き分けは 0.5)。
+    """
+    __slots__ = ("p", "o", "moves", "priors", "children", "visits", "wins")
+
+    def __init__(self, p, o):
+        self.p = p
+        self.o = o
+        self.moves = None # 展開した手のリスト (終局なら空)
+        self.priors = None
+        self.children = None
+        self.visits = 0
+        self.wins = 0.0
+
+    def expand(self):
+        moves = list(iter_bits(legal_moves(self.p, self.o)))
+        if not moves and legal_moves(self.o, self.p):
+            moves = [PASS]
+        # 事前確率: 評価表の値の softmax (PUCT 用、UCT では未訪問の手を選ぶ順にだけ使う)
+        weights = [math.exp(EVAL_TABLE[sq] / 20) if sq != PASS else 1.0 for sq in moves]
+        total = sum(weights)
+        order = sorted(range(len(moves)), key=lambda i: -weights[i])
+        self.moves = [moves[i] for i in order]
+        self.priors = [weights[i] / total for i in order]
+        self.children = [None] * len(moves)
+
+    def child(self, i):
+        node = self.children[i]
+        if node is None:
+            sq = self.moves[i]
+            if sq == PASS:
+                node = _Node(self.o, self.p)
+            else:
+                f = flips(self.p, self.o, sq)
+                node = _Node(self.o & ~f, self.p | f | (1 << sq))
+            self.children[i] = node
+        return node
+
+
+class MctsResult:
+    """MCTS の結果 (最善手、プレイアウト数、最善手の勝率、経過時間、使い回した訪問数)"""
+    def __init__(self, move, playouts, win_rate, elapsed, reused=0):
+        self.move = move
+        self.playouts = playouts
+        self.win_rate = win_rate
+        self.elapsed = elapsed
+        self.reused = reused
+
+    @property
+    def playouts_per_sec(self):
+        """1秒あたりのプレイアウト数"""
+        if self.elapsed <= 0:
+            return 0
+        return int(self.playouts / self.elapsed)
+
+    def __str__(self):
+        return (f"MCTS: {self.playouts} プレイアウト (再利用 {self.reused}), "
+                f"勝率 {self.win_rate * 100:.1f}%, {self.playouts_per_sec} プレイアウト/秒")
+
+
+class MctsSearch:
+    """モンテカルロ木探索
+
+    playouts を指定するとその回数で、省略すると time_limit 秒で打ち切る (両方なら早い方)。
+    policy は "uct" か "puct"。
+    """
+    def __init__(self, time_limit=1.0, playouts=None, policy="uct", exploration=None, seed=None):
+        if policy not in ("uct", "puct"):
+            raise ValueError(f"不明な方針です: {policy}")
+        self.time_limit = time_limit
+        self.playouts = playouts
+        self.policy = policy
+        self.exploration = exploration if exploration is not None else (1.4 if policy == "uct" else 2.0)
+        self.rng = random.Random(seed)
+        self.root = None
+        self.stopped = False
+
+    def clear(self):
+        """木を捨てる (新しい対局を始めるとき)"""
+        self.root = None
+
+    def stop(self):
+        """探索を打ち切る (別スレッドから呼ぶ)"""
+        self.stopped = True
+
+    def _find_root(self, p, o):
+        """前回の木から局面 (p, o) の節点を探す (2手先まで)"""
+        root = self.root
+        if root is None:
+            return None
+        if root.p == p and root.o == o:
+            return root
+        for child in root.children or ():
+            if child is None:
+                continue
+            if child.p == p and child.o == o:
+                return child
+            for grandchild in child.children or ():
+                if grandchild is not None and grandchild.p == p and grandchild.o == o:
+                    return grandchild
+        return None
+
+    def _select(self, node):
+        """子の番号を UCT / PUCT で選ぶ"""
+        children = node.children
+        c = self.exploration
+        best = 0
+        best_value = -1.0
+        if self.policy == "uct":
+            log_n = math.log(node.visits)
+            for i, child in enumerate(children):
+                if child is None or child.visits == 0:
+                    return i # 未訪問の手は事前確率の高い順に試す
+                value = child.wins / child.visits + c * math.sqrt(log_n / child.visits)
+                if value > best_value:
+                    best, best_value = i, value
+        else:
+            sqrt_n = math.sqrt(node.visits)
+            # 未訪問の手は親の勝率 (自分から見た値) で見積もる
+            fpu = 1.0 - node.wins / node.visits
+            for i, child in enumerate(children):
+                if child is None or child.visits == 0:
+                    q, n = fpu, 0
+                else:
+                    q, n = child.wins / child.visits, child.visits
+                value = q + c * node.priors[i] * sqrt_n / (1 + n)
+                if value > best_value:
+                    best, best_value = i, value
+        return best
+
+    def search(self, p, o):
+        """手番側 p、相手側 o の局面で最善手を探して MctsResult を返す"""
+        start = perf_counter()
+        self.stopped = False
+        deadline = start + self.time_limit if self.time_limit is not None else float("inf")
+        limit = self.playouts if self.playouts is not None else float("inf")
+        rand = self.rng.random
+
+        root = self._find_root(p, o) or _Node(p, o)
+        self.root = root
+        reused = root.visits
+        if root.moves is None:
+            root.expand()
+        if len(root.moves) == 1:
+            return MctsResult(root.moves[0], 0, 0.5, perf_counter() - start, reused)
+
+        count = 0
+        while count < limit:
+            if count % CHECK_INTERVAL == 0 and (self.stopped or perf_counter() >= deadline) and count:
+                break
+            # 選択と展開
+            node = root
+            path = [root]
+            while node.moves and node.visits:
+                node = node.child(self._select(node))
+                path.append(node)
+                if node.moves is None and node.visits:
+                    node.expand()
+            # プレイアウト (手番側から見た勝ち 1、引き分け 0.5、負け 0)
+            if node.moves is None or node.moves:
+                diff = playout(node.p, node.o, rand)
+            else:
+                diff = node.p.bit_count() - node.o.bit_count() # 終局
+            result = 1.0 if diff > 0 else 0.0 if diff < 0 else 0.5
+            # 逆伝播 (各節点の勝ち数はその局面に打ち進めた側から見た値)
+            for n in reversed(path):
+                n.visits += 1
+                n.wins += 1.0 - result
+                result = 1.0 - result
+            count += 1
+
+        # 最も多く訪問した手を選ぶ
+        best = max(range(len(root.moves)),
+                   key=lambda i: root.children[i].visits if root.children[i] is not None else -1)
+        child = root.children[best]
+        win_rate = child.wins / child.visits if child is not None and child.visits else 0.5
+        return MctsResult(root.moves[best], count, win_rate, perf_counter() - start, reused)
+
+
+def run_benchmark(playouts, count, empties, seed=0, policy="uct"):
+    """決まった局面でプレイアウト/秒を計測する"""
+    from endgame import benchmark_positions
+
+    total = 0
+    elapsed = 0.0
+    for p, o in benchmark_positions(empties, count, seed):
+        searcher = MctsSearch(None, playouts, policy, seed=seed)
+        result = searcher.search(p, o)
+        total += result.playouts
+        elapsed += result.elapsed
+        print(result)
+    print(f"合計 {total} プレイアウト, {elapsed:.2f}秒, {int(total / elapsed) if elapsed else 0} プレイアウト/秒")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MCTS のプレイアウト速度を計測する")
+    parser.add_argument("--playouts", type=int, default=2000, help="1局面あたりのプレイアウト数")
+    parser.add_argument("--count", type=int, default=5, help="局面数")
+    parser.add_argument("--empties", type=int, default=50, help="局面の空きマス数")
+    parser.add_argument("--policy", choices=("uct", "puct"), default="uct")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run_benchmark(args.playouts, args.count, args.empties, args.seed, args.policy)
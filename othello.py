@@ -1,40 +1,129 @@
 # coding: UTF-8
-import tkinter
-from tkinter import filedialog, messagebox
-from copy import deepcopy
-import re
-from PIL import Image, ImageTk
-import random
+import os
+import sys
 from datetime import datetime
-from time import sleep
-
-# ループのインターバル時間
+from time import perf_counter, perf_counter_ns
+from bitboard import iter_bits, popcount, sq_to_tag, tag_to_sq
+from profiler import Profiler, percentile
+from record import GameRecord, RecordWriter, format_move_line, iter_text_log, last_record, move_lines
+from replay import ReplayTimeline
+from rules import Game
+from endgame import EndgameSolver
+from search import AlphaBetaSearch
+from strategies import CPU_LEVELS, choose_best_eval, choose_corner_first, choose_random
+from ttable import TranspositionTable
+from worker import CpuWorker
+
+# GUI と画像のモジュールは GUI を起動するときに load_gui() で読み込む
+# (ルールや自己対戦だけを使うときは tkinter・Pillow がなくても動く)
+tkinter = filedialog = messagebox = None
+Image = ImageTk = None
+
+
+def load_gui():
+    """tkinter と Pillow を読み込む (Pillow がなければ駒は図形で描く)"""
+    global tkinter, filedialog, messagebox, Image, ImageTk
+    if tkinter is not None:
+        return
+    import tkinter as tk
+    from tkinter import filedialog as fd, messagebox as mb
+    tkinter, filedialog, messagebox = tk, fd, mb
+    try:
+        from PIL import Image, ImageTk
+    except ImportError:
+        Image = ImageTk = None
+
+# ループのインターバル時間 (CPUの思考が終わったかを確認する間隔, ms)
 REFRESH = 30
+# 探索するCPUの1手あたりの持ち時間 (秒)
+SEARCH_TIME_LIMIT = 1.0
+# モンテカルロ木探索のCPUの1手あたりの持ち時間 (秒)
+MCTS_TIME_LIMIT = 2.0
+# 探索するCPUのプロセス数 (2 以上なら parallel.ParallelSearch で並列に探索する。
+# 起動時に --search-workers N で変更できる)
+SEARCH_WORKERS = 1
+# 探索用の置換表のメモリ上限 (MB)
+TT_SIZE_MB = 64
+# 完全読みに切り替える空きマス数と、完全読みの持ち時間 (秒)
+ENDGAME_EMPTIES = 12
+ENDGAME_TIME_LIMIT = 5.0
+# CPUが手を打つまでの見た目上の待ち時間 (ms)。0 なら思考が終わりしだい打つ
+# (起動時に --cpu-delay MS で変更できる)
+CPU_MOVE_DELAY = 500
+# 定跡ファイル (book.py で作る。なければ定跡を使わない)
+BOOK_FILE = "othello_book.bin"
+# パターン評価の重みファイル (train.py で作る。なければ評価表で評価する)
+WEIGHTS_FILE = "othello_weights.bin"
+# 対局ごとの処理時間の集計を追記する JSONL ファイル (None なら保存しない。
+# 起動時に --profile FILE で指定できる)
+PROFILE_FILE = None
+
+# セルのサイズごとの縮小済みのコマ画像 (黒, 白)。再びゲームをするときも読み直さない
+_piece_images = {}
 
 
 # --- オセロゲーム本体 ---
 class Othello:
     def __init__(self):
+        # 盤面の状態をBoardクラスで一元管理する (初期化は Board 生成時に行われる)
         self.board = Board()
-        # 盤面の初期化処理をBoardクラスに移動
-        self.board.init_board_setup()
-        # 盤面の状態をBoardクラスで一元管理する
-        # self.board.coord_to_piece は init_board_setup で初期化される
+        # 着手生成・反転・思考・描画の処理時間 (手番ごと)
+        self.profiler = Profiler()
+        self.board.profiler = self.profiler
         self.game_mode = None
         self.is_replay_mode = False
 
         self.view = TkView(self, self.board) # self.view.setup_and_run() でゲーム開始
+        # 手番が替わったら次のプレイヤーを呼び出す
+        self.board.add_listener(self.on_board_event)
 
         # プレイヤー先攻・後攻の辞書を定義する
         self.view.players = {}
         # ランダムプレーヤーのインスタンスを生成
-        self.random = RandomPlayer(self.view)
+        self.random = RandomPlayer()
+        # 探索するCPU用
+        evaluator = None
+        if os.path.exists(WEIGHTS_FILE):
+            from pattern import PatternEvaluator
+            try:
+                evaluator = PatternEvaluator.load(WEIGHTS_FILE)
+            except ValueError as e:
+                print(e)
+        if SEARCH_WORKERS > 1:
+            from parallel import ParallelSearch
+            self.searcher = ParallelSearch(SEARCH_TIME_LIMIT, SEARCH_WORKERS, TT_SIZE_MB,
+                                           endgame=EndgameSolver(), endgame_empties=ENDGAME_EMPTIES,
+                                           endgame_time_limit=ENDGAME_TIME_LIMIT, evaluator=evaluator)
+        else:
+            self.searcher = AlphaBetaSearch(SEARCH_TIME_LIMIT, tt=TranspositionTable(TT_SIZE_MB),
+                                            endgame=EndgameSolver(), endgame_empties=ENDGAME_EMPTIES,
+                                            endgame_time_limit=ENDGAME_TIME_LIMIT, evaluator=evaluator)
+        # モンテカルロ木探索のCPU用 (最初に使うときに作る。木は対局中の手番をまたいで使い回す)
+        self.mcts = None
+        # CPUの思考は別スレッドで行う (取り消すと探索も打ち切る)
+        self.worker = CpuWorker(on_cancel=self.stop_thinking)
+        # 探索するCPU用の定跡
+        self.book = None
+        if os.path.exists(BOOK_FILE):
+            from book import OpeningBook
+            try:
+                self.book = OpeningBook(BOOK_FILE)
+            except ValueError as e:
+                print(e)
 
     def update_game_state(self):
         """ゲームモードが選択された後に呼ばれる初期設定"""
         if self.board.finish_flag:
             if not self.board.result_write_flag:
-                self.board.get_result(self.view)
+                self.board.get_result()
+                # 統計情報をログウィジェットに表示
+                self.view.show_stats(self.board.get_stats_text(self.searcher.tt, self.book))
+                if PROFILE_FILE:
+                    black_count, white_count = self.board.result_count
+                    self.profiler.write_jsonl(PROFILE_FILE, black=self.view.players.get("first"),
+                                              white=self.view.players.get("second"),
+                                              black_count=black_count, white_count=white_count,
+                                              plies=self.board.count)
             self.view.alert_finish(self.board)
             return
         
@@ -49,9 +138,8 @@ class Othello:
             self.search_avalable_cell()
 
             # 打てる手がない場合のパス処理
-            if not self.board.search_hit_list_coord:
-                self.board.pass_count += 1
-                if self.board.pass_count >= 2:
+            if not self.board.search_hit_list:
+                if self.board.pass_count >= 1: # 相手も直前にパスしている
                     self.board.finish_flag = True
                     print("手詰り")
                     self.update_game_state()  # 状態更新を呼び出す
@@ -69,37 +157,63 @@ class Othello:
     def start_game_setup(self):
         """ゲーム開始時のセットアップ"""
         self.board.turn = "first"
-        self.board.turn_start_time = datetime.now() # 最初のターンの開始時間を記録
+        self.board.turn_start_time = perf_counter() # 最初のターンの開始時間を記録
+        self.profiler.clear()
         self.update_game_state()
+        self.schedule_turn()
         
     def handle_pass(self):
         """パスの処理"""
-        self.board.change_turn()
+        self.board.pass_turn()
         self.update_game_state()
 
+    def on_board_event(self, event, *args):
+        """Boardからのイベントを受け取り、手番が替わったら次のプレイヤーを予約する"""
+        if event == "turn":
+            self.schedule_turn()
+
+    def schedule_turn(self):
+        """手番のプレイヤーの処理を予約する
+
+        予約した処理は現在のイベント処理 (update_game_state によるパス・終局の判定) が
+        終わってから、CPU_MOVE_DELAY ms 後に実行される。
+        """
+        if self.view.cpu_turn_job_id:
+            self.view.window.after_cancel(self.view.cpu_turn_job_id)
+        self.view.cpu_turn_job_id = self.view.window.after(CPU_MOVE_DELAY, self.handle_cpu_turn)
+
     def handle_cpu_turn(self):
-        """CPUのターン処理"""
+        """CPUのターン処理 (ヒトのターンならクリックを待つので何もしない)"""
+        self.view.cpu_turn_job_id = None
+        if self.is_replay_mode or self.board.finish_flag or self.board.hit:
+            return
         player_type = self.view.players.get(self.board.turn)
-        if player_type in ["random", "random_2", "random_3"]:
-            self.board.hit = True # CPUの思考中にループが再実行されるのを防ぐ
-            
-            # 思考中に見えるように少し遅延させる
-            delay_ms = 1500
-            if player_type == "random":
-                self.view.cpu_turn_job_id = self.view.window.after(delay_ms, self.random_hit_1)
-            elif player_type == "random_2":
-                self.view.cpu_turn_job_id = self.view.window.after(delay_ms, self.random_hit_2)
-            elif player_type == "random_3":
-                self.view.cpu_turn_job_id = self.view.window.after(delay_ms, self.random_hit_3)
+        if player_type not in CPU_LEVELS:
+            return
+        if not self.board.search_hit_list:
+            # 打てる手がなければパス (パスのボタンも消す)
+            self.view.execute_pass(self.handle_pass)
+            return
+
+        self.board.hit = True # CPUの思考中に二重に呼ばれるのを防ぐ
+        if player_type == "random":
+            self.random_hit_1()
+        elif player_type == "random_2":
+            self.random_hit_2()
+        elif player_type == "random_3":
+            self.random_hit_3()
+        elif player_type == "alphabeta":
+            self.alphabeta_hit()
+        elif player_type == "mcts":
+            self.mcts_hit()
     
-    def human_hit(self, coord):
+    def human_hit(self, sq):
         """人間のプレイヤーがマスをクリックしたときの処理"""
         if self.board.hit: # すでに処理中の場合は何もしない
             return
 
         # 駒が置けるマスか確認
-        self.board.check_avalable_hit(coord, self.view)
-        if self.board.avalable_hit:
+        if self.board.is_legal(sq):
             self.board.hit = True # 処理開始のフラグ
             
             #  UI更新
@@ -108,19 +222,10 @@ class Othello:
             if self.view.alert_flag:
                 self.view.delete_alert()
 
-            # ゲームロジック
-            self.board.dohit(coord)
+            # ゲームロジック (着手後に手番も交代する)
+            self.board.dohit(sq)
             log_entry = self.board.play_log[-1]
             self.view.update_log_display(log_entry)
-            self.board.reverse_piece(coord, self.view)
-            
-            if self.board.turn == "first":
-                self.view.draw_piece_black(coord)
-            elif self.board.turn == "second":
-                self.view.draw_piece_white(coord)
-            
-            self.board.pass_count = 0
-            self.board.change_turn()
             
             # 次の状態を更新
             self.update_game_state()
@@ -132,7 +237,7 @@ class Othello:
         self.is_replay_mode = True
         file_path = filedialog.askopenfilename(
             title="リプレイするログファイルを選択",
-            filetypes=[("テキストファイル", "*.txt")]
+            filetypes=[("テキストファイル", "*.txt"), ("棋譜アーカイブ (最後の対局)", "*.othr")]
         )
         
         if not file_path:
@@ -145,19 +250,22 @@ class Othello:
         self.view.create_replay_controls()
         # 盤面を初期状態に戻す
         self.board.init_board_setup()
-        self.view.redraw_board()
 
         self.view.replay_log_lines = []
         self.view.replay_move_tags = []
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                for line in f:
-                    # 正規表現で 'X_Y' 形式のタグを安全に抽出
-                    match = re.search(r'が (\d{1,2}_\d{1,2}) に配置', line)
-                    if match:
-                        # 着手情報がある行のみをログとタグリストに追加
-                        self.view.replay_log_lines.append(line.strip())
-                        self.view.replay_move_tags.append(match.group(1))
+            if file_path.endswith(".othr"):
+                # 棋譜アーカイブは最後の対局を再生する (ログの行は着手から作る)
+                record = last_record(file_path)
+                moves = list(record.moves) if record else []
+                self.view.replay_log_lines = move_lines(moves)
+                self.view.replay_move_tags = [sq_to_tag(sq) for sq in moves]
+            else:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    # 着手情報がある行のみをログとタグリストに追加
+                    for line, sq in iter_text_log(f):
+                        self.view.replay_log_lines.append(line)
+                        self.view.replay_move_tags.append(sq_to_tag(sq))
         except Exception as e:
             messagebox.showerror("エラー", f"ログファイルの読み込みに失敗しました: {e}")
             self.view.restart_game()
@@ -168,49 +276,42 @@ class Othello:
             self.view.restart_game()
             return
 
+        # 各手の反転とチェックポイントを先に作っておく (パスもここで補う)
+        try:
+            timeline = ReplayTimeline(tag_to_sq(tag) for tag in self.view.replay_move_tags)
+        except ValueError as e:
+            messagebox.showerror("エラー", f"棋譜が正しくありません: {e}")
+            self.view.restart_game()
+            return
+
         self.view.display_replay_log()
         self.view.log_text.config(state=tkinter.DISABLED) # ログを編集不可に
-        self.view.start_replay_moves(self.view.replay_move_tags)
+        self.view.start_replay_moves(timeline)
 
     # --- 打てるマス検索 ---
     def search_avalable_cell(self):
-        # 初期化
-        self.board.search_hit_list_coord = []
-        self.board.search_hit_list_tag = []
         self.board.search_flag = True
 
-        # 打てる手を保存したリストを生成(可視化用)
-        self.random.search_hit(self.board)
-        for tag in self.board.search_hit_list_tag:
-            coord = self.view.tag_to_coord[tag]
-            if self.board.coord_to_piece[coord] == 0:
-                if coord not in self.board.search_hit_list_coord:
-                    self.board.search_hit_list_coord.append(coord)
+        # 打てる手のリストを取得(可視化用)
+        # 合法手は局面ごとに1回だけ計算され、CPUの手の選択と共有される
+        with self.profiler.span(self.board.turn, "movegen"):
+            self.random.search_hit(self.board)
                     
         # 可視化
-        for cell in self.board.search_hit_list_coord:
-            self.view.draw_avalable_cell(cell)
+        for sq in self.board.search_hit_list:
+            self.view.draw_avalable_cell(sq)
                         
     # --- 打てるマス検索(コンピューター用) ---
     def random_avalable_cell(self):
-        # 初期化
-        self.board.random_hit_list_coord = []
-        self.board.random_hit_list_tag = []
-
-        # 打てる手を保存したリストを生成
+        # 打てる手のリストを取得 (可視化用と同じリストを使い回す)
         self.random.random_hit(self.board)
-        for tag in self.board.random_hit_list_tag:
-            coord = self.view.tag_to_coord[tag]
-            if self.board.coord_to_piece[coord] == 0:
-                if coord not in self.board.random_hit_list_coord:
-                    self.board.random_hit_list_coord.append(coord)
                     
     # --- コンピューター用(共通処理) ---
-    def cpu_hit_base(self, strategy_func):
+    def cpu_hit_base(self, strategy_func, report_func=None, use_book=False, span="eval"):
         self.view.alert_message_random()    
         self.random_avalable_cell()
 
-        hit_count = len(self.board.random_hit_list_coord)
+        hit_count = len(self.board.random_hit_list)
 
         if hit_count == 0:
             # パス処理はupdate_game_stateに任せる
@@ -218,97 +319,147 @@ class Othello:
             self.update_game_state()
             return
 
-        self.board.pass_count = 0
-        coord = strategy_func(hit_count)
-        self.common_hit(coord)
+        # 定跡にある局面なら探索せずに定跡手を打つ
+        book_entry = self.book_lookup() if use_book else None
+        if book_entry:
+            self.finish_cpu_hit(book_entry[0], lambda: self.view.show_search_info(
+                f"定跡: 平均石差 {book_entry[1]:+.1f}, {book_entry[2]} 局"))
+            return
+
+        # 思考は別スレッドで行い、結果はキュー経由でメインループで受け取る
+        self.worker.start(self.timed_strategy, strategy_func, hit_count, self.board.turn, span)
+        self.view.think_job_id = self.view.window.after(1, self.poll_cpu_hit, report_func)
+
+    def timed_strategy(self, strategy_func, hit_count, turn, span):
+        """思考用のスレッドで手を選び、かかった時間を記録する"""
+        start = perf_counter_ns()
+        try:
+            return strategy_func(hit_count)
+        finally:
+            self.profiler.add(turn, span, perf_counter_ns() - start)
+
+    def poll_cpu_hit(self, report_func=None):
+        """CPUの思考が終わっていれば手を打つ (まだなら REFRESH ms 後にもう一度確認する)"""
+        self.view.think_job_id = None
+        done, sq = self.worker.poll()
+        if not done:
+            self.view.think_job_id = self.view.window.after(REFRESH, self.poll_cpu_hit, report_func)
+            return
+        self.finish_cpu_hit(sq, report_func)
+
+    def finish_cpu_hit(self, sq, report_func=None):
+        """CPUの選んだ手を打つ"""
+        self.common_hit(sq)
+        if report_func:
+            report_func()
         self.update_game_state()
 
+    def reset(self):
+        """ウィンドウや探索用の置換表などはそのままで、モード選択の前の状態に戻す"""
+        self.cancel_cpu_hit()
+        self.is_replay_mode = False
+        self.game_mode = None
+        self.view.reset()
+        self.board.new_game()
+        self.profiler.clear()
+        self.searcher.tt.clear()
+        if self.mcts is not None:
+            self.mcts.clear()
+        if self.book is not None:
+            self.book.hits = self.book.probes = 0
+
+    def stop_thinking(self):
+        """思考中の探索を打ち切る (取り消したときに思考用のスレッドから早く抜けるため)"""
+        self.searcher.stop()
+        if self.mcts is not None:
+            self.mcts.stop()
+
+    def close(self):
+        """思考を取り消し、並列探索のプロセスなどを解放する"""
+        self.cancel_cpu_hit()
+        if hasattr(self.searcher, "close"):
+            self.searcher.close()
+
+    def cancel_cpu_hit(self):
+        """CPUの思考を取り消す (モード選択に戻る・終了するとき)"""
+        self.worker.cancel()
+        if self.view.think_job_id:
+            self.view.window.after_cancel(self.view.think_job_id)
+            self.view.think_job_id = None
+
+    def book_lookup(self):
+        """現在の局面の定跡手を (手, 平均石差, 対局数) で返す。なければ None"""
+        if self.book is None:
+            return None
+        p, o = self.board.own_and_opponent()
+        entry = self.book.lookup(p, o)
+        if entry and entry[0] in self.board.random_hit_list:
+            return entry
+        return None
+
     # --- コンピューター用(完全乱数) ---
     def random_hit_1(self):
         def strategy(hit_count):
-            if hit_count == 1:
-                idx = 0
-            else:
-                idx = random.randint(0, hit_count - 1)
-            return self.board.random_hit_list_coord[idx]
+            return choose_random(self.board.random_hit_list)
         self.cpu_hit_base(strategy)
 
     # --- コンピューター用(少し強い) ---
     def random_hit_2(self):
-       
         def strategy(hit_count):
-            temp_hit_list = list(self.board.random_hit_list_coord)
-            
-            # 角を取れるなら最優先
-            for coord in temp_hit_list:
-                tag = self.view.coord_to_tag[coord]
-                if tag in ["0_0", "0_7", "7_0", "7_7"]:
-                    return coord
-
-            # 角の隣は避ける
-            avoid_list = []
-            for x in range(0, 8, 7):
-                for y in range(0, 8, 7):
-                    for dx in range(-1, 2, 1):
-                        for dy in range(-1, 2, 1):
-                            if dx == 0 and dy == 0: continue
-                            avoid_tag = f"{x+dx}_{y+dy}"
-                            if self.view.tag_to_coord.get(avoid_tag):
-                                avoid_list.append(self.view.tag_to_coord[avoid_tag])
-            
-            preferred_list = [c for c in temp_hit_list if c not in avoid_list]
-
-            if not preferred_list: # 避けた結果、手が無くなったら元のリストから選ぶ
-                preferred_list = temp_hit_list
-
-            return random.choice(preferred_list)
+            return choose_corner_first(self.board.random_hit_list)
         self.cpu_hit_base(strategy) 
     
     # --- コンピューター用(強い) ---
     def random_hit_3(self):
         def strategy(hit_count):
-            temp_hit_list = list(self.board.random_hit_list_coord)
-
-            # 角を取れるなら最優先
-            for coord in temp_hit_list:
-                tag = self.view.coord_to_tag[coord]
-                if tag in ["0_0", "0_7", "7_0", "7_7"]:
-                    return coord
-
-            # 評価値が最も高い手を選ぶ
-            max_eval_coord = None
-            max_eval_score = -float('inf')
-            for coord in temp_hit_list:
-                tag = self.view.coord_to_tag[coord]
-                eval_value = self.board.tag_to_evalvalue[tag]
-                if eval_value > max_eval_score:
-                    max_eval_score = eval_value
-                    max_eval_coord = coord
-            return max_eval_coord
+            return choose_best_eval(self.board.random_hit_list)
         self.cpu_hit_base(strategy)
+
+    # --- コンピューター用(αβ探索) ---
+    def alphabeta_hit(self):
+        result = None
+
+        def strategy(hit_count):
+            nonlocal result
+            p, o = self.board.own_and_opponent()
+            result = self.searcher.search(p, o)
+            return result.move
+
+        # 読んだ深さと探索速度をログに表示
+        def report():
+            self.view.show_search_info(str(result))
+        self.cpu_hit_base(strategy, report, use_book=True, span="search")
+
+    # --- コンピューター用(モンテカルロ木探索) ---
+    def mcts_hit(self):
+        if self.mcts is None:
+            from mcts import MctsSearch
+            self.mcts = MctsSearch(MCTS_TIME_LIMIT)
+        result = None
+
+        def strategy(hit_count):
+            nonlocal result
+            p, o = self.board.own_and_opponent()
+            result = self.mcts.search(p, o)
+            return result.move
+
+        # プレイアウト数と速度をログに表示
+        def report():
+            self.view.show_search_info(str(result))
+        self.cpu_hit_base(strategy, report, span="search")
         
     # --- random_hit共通処理 ---
-    def common_hit(self, coord, from_replay=False):
+    def common_hit(self, sq):
         # UI更新
         self.view.clear_avalable_cells()
         # アラートがあればを削除
         if self.view.alert_flag:
             self.view.delete_alert()
 
-        # ゲームロジック (リプレイ中はログ追加をスキップ)
-        self.board.dohit(coord)
-        if not from_replay:
-            log_entry = self.board.play_log[-1]
-            self.view.update_log_display(log_entry)
-        self.board.reverse_piece(coord, self.view)
-
-        if self.board.turn == "first":
-            self.view.draw_piece_black(coord)
-        elif self.board.turn == "second":
-            self.view.draw_piece_white(coord)
-        
-        # ターン変更
-        self.board.change_turn()
+        # ゲームロジック (着手後に手番も交代する)
+        self.board.dohit(sq)
+        log_entry = self.board.play_log[-1]
+        self.view.update_log_display(log_entry)
 
         
 # --- オセロ盤面作成 ---
@@ -328,7 +479,9 @@ class TkView:
         self.restart_flag = False
         self.restart_flag_alert = False
         self.human_pass_button = None # 人間用パスボタンのウィジェットを保持
-        self.replay_board_history = [] # リプレイ用の盤面状態履歴
+        self.replay_timeline = None # リプレイ用の棋譜のタイムライン (replay.ReplayTimeline)
+        self.replay_scale = None # リプレイの手数を選ぶスライダー
+        self.replay_scale_value = None # スライダーに最後に設定した手数
         
         # 画像を保持するためのインスタンス変数
         self.black_piece_img = None
@@ -338,40 +491,35 @@ class TkView:
         self.is_replay_paused = False # リプレイが一時停止中かどうかのフラグ
         self.pause_button = None
         self.replay_controls = [] # リプレイ用のUI要素を保持するリスト
-        self.update_loop_id = None # afterのジョブIDを保持
         self.cpu_turn_job_id = None # CPU思考処理のafterジョブID
+        self.think_job_id = None # CPUの思考結果の確認のafterジョブID
         self.replay_log_lines = [] # リプレイ用のログ行を保持
         self.replay_job_id = None # リプレイ再生のafterジョブID
-        self.avalable_cell_tags = []
+        self.avalable_cells = [] # 置けるマスの印を表示中のマス番号
+
+        # 盤面の変化を購読して描画する
+        self.board.add_listener(self.on_board_event)
 
     def setup_and_run(self):
         """ウィンドウの初期化とメインループの開始"""
         self.init_window()
         self.choice_attack()
-        self.update_loop() # 定期実行ループを開始
         self.window.mainloop()
 
-    def update_loop(self):
-        """定期的にゲームの状態をチェックし、CPUのターンなどを処理する"""
-        if self.board.turn != "wait" and not self.board.hit:
-            player_type = self.players.get(self.board.turn)
-            if player_type != "human":
-                self.othello.handle_cpu_turn()
-        
-        self.update_loop_id = self.window.after(500, self.update_loop)
-
     def load_images(self): # 画像(コマ)の読み込み
-        """コマの画像を読み込み、リサイズしてPhotoImageオブジェクトを作成する"""
-        try:
-            # 画像ファイルを開き、セルのサイズに合わせてリサイズ
-            black_img = Image.open("black.png").resize((self.CELL_SIZE, self.CELL_SIZE), Image.Resampling.LANCZOS)
-            white_img = Image.open("white.png").resize((self.CELL_SIZE, self.CELL_SIZE), Image.Resampling.LANCZOS)
-            self.black_piece_img = ImageTk.PhotoImage(black_img)
-            self.white_piece_img = ImageTk.PhotoImage(white_img)
-        except FileNotFoundError:
-            messagebox.showinfo("情報", "コマの画像ファイル (black.png, white.png) が見つかりませんでした。\nデフォルトの描画でゲームを開始します。")
-            self.black_piece_img = None
-            self.white_piece_img = None
+        """コマの画像を読み込み、リサイズしてPhotoImageオブジェクトを作成する (セルのサイズごとに1回だけ)"""
+        if self.CELL_SIZE not in _piece_images and Image is None:
+            _piece_images[self.CELL_SIZE] = (None, None) # Pillow がない
+        if self.CELL_SIZE not in _piece_images:
+            try:
+                # 画像ファイルを開き、セルのサイズに合わせてリサイズ
+                black_img = Image.open("black.png").resize((self.CELL_SIZE, self.CELL_SIZE), Image.Resampling.LANCZOS)
+                white_img = Image.open("white.png").resize((self.CELL_SIZE, self.CELL_SIZE), Image.Resampling.LANCZOS)
+                _piece_images[self.CELL_SIZE] = (ImageTk.PhotoImage(black_img), ImageTk.PhotoImage(white_img))
+            except FileNotFoundError:
+                messagebox.showinfo("情報", "コマの画像ファイル (black.png, white.png) が見つかりませんでした。\nデフォルトの描画でゲームを開始します。")
+                _piece_images[self.CELL_SIZE] = (None, None)
+        self.black_piece_img, self.white_piece_img = _piece_images[self.CELL_SIZE]
 
     def init_window(self):
         # ログ表示用ウィジェット
@@ -411,6 +559,15 @@ class TkView:
         self.tag_to_coord = {}
         # 座標がキー、tagがバリューの辞書定義
         self.coord_to_tag = {}
+        # マス番号がインデックス、座標がバリューのリスト
+        self.sq_to_coord = [None] * 64
+        # マス番号がインデックスの、駒と置けるマスの印のキャンバス項目
+        # (最初に一度だけ作り、以降は表示を切り替えるだけ)
+        self.piece_items = [None] * 64
+        self.hint_items = [None] * 64
+        # キャンバスに表示中の黒・白の駒 (ビットボード)
+        self.drawn_black = 0
+        self.drawn_white = 0
         # クリックされたtag保存変数
         self.clicked_tag = "null"
 
@@ -437,22 +594,15 @@ class TkView:
                 self.canvas.create_rectangle(*coord, fill="green", tags=tag)
 
                 # リスト、辞書に情報を追加
+                sq = tag_to_sq(tag)
                 self.cells_tag.append(tag)
                 self.tag_to_coord[tag] = coord
                 self.coord_to_tag[coord] = tag
+                self.sq_to_coord[sq] = coord
+                self.create_cell_items(sq, coord, tag)
 
                 # Boardから初期駒の状態を取得して描画
-                piece = self.board.coord_to_piece.get(coord)
-                if piece == 1:
-                    self.draw_piece_black(coord)
-                elif piece == 2:
-                    self.draw_piece_white(coord)
-                # 0の場合は何もしない
-
-                # 以下のコードはBoardクラスで管理するため不要
-                # if (j, i) in [(3, 3), (4, 4)]:
-                # elif (j, i) in [(3, 4), (4, 3)]:
-                # else: self.coord_to_piece[coord] = 0
+                self.draw_piece(sq, self.board.piece_at(sq))
 
                 # tagのｙ座標成分に+1
                 j += 1
@@ -486,15 +636,15 @@ class TkView:
 
     def on_escape_key(self, event=None):
         """Escキーが押されたときにウィンドウを閉じる"""
+        self.othello.close()
         self.window.destroy()
 
     def handle_click(self, event):
         if self.players.get(self.board.turn) == "human":
             self.on_cell_click(event)
             if self.clicked_tag != "null":
-                coord = self.tag_to_coord.get(self.clicked_tag)
-                if coord:
-                    self.othello.human_hit(coord)
+                if self.clicked_tag in self.tag_to_coord:
+                    self.othello.human_hit(tag_to_sq(self.clicked_tag))
                 self.clicked_tag = "null"
 
     def on_cell_click(self, event):
@@ -509,14 +659,26 @@ class TkView:
         self.clicked_tag = "null"
     
     def redraw_board(self):
-        """現在の board.coord_to_piece に基づいて盤面全体を再描画する"""
-        self.canvas.delete("all") # 一旦すべて消去
-        self.init_board_display() # 盤の格子などを再描画
-        for coord, piece in self.board.coord_to_piece.items():
-            if piece == 1:
-                self.draw_piece_black(coord)
-            elif piece == 2:
-                self.draw_piece_white(coord)
+        """現在の盤面と表示が異なるマスだけを描き直す"""
+        self.clear_avalable_cells()
+        changed = (self.board.black ^ self.drawn_black) | (self.board.white ^ self.drawn_white)
+        for sq in iter_bits(changed):
+            self.draw_piece(sq, self.board.piece_at(sq))
+
+    def on_board_event(self, event, *args):
+        """Boardからのイベントを受け取り、盤面の描画に反映する"""
+        if not hasattr(self, "canvas"):
+            return # ウィンドウ作成前
+        if event == "move":
+            turn, sq, flipped = args
+            piece = self.board.turn_to_piece[turn]
+            with self.othello.profiler.span(turn, "render"):
+                self.draw_piece(sq, piece)
+                for r_sq in iter_bits(flipped):
+                    self.draw_piece(r_sq, piece)
+        elif event == "reset":
+            with self.othello.profiler.span(self.board.turn, "render"):
+                self.redraw_board()
                     
     # --- ゲームモードの選択 ---
     def choice_attack(self):
@@ -577,6 +739,7 @@ class TkView:
         for widget in self.replay_controls:
             widget.destroy()
         self.replay_controls.clear()
+        self.replay_scale = None
 
     # mode_1クリック時(human vs human)
     def mode_1_clicked(self):
@@ -614,45 +777,59 @@ class TkView:
             self.toggle_replay_pause()
 
         if self.replay_index > 0:
-            self.replay_index -= 1
-            prev_board_state = self.replay_board_history[self.replay_index]
-            # 盤面状態を復元
-            self.board.coord_to_piece = prev_board_state.copy()
-            
-            # ターンを正しく戻す
-            if self.replay_index % 2 == 0:
-                self.board.turn = "first"
-            else:
-                self.board.turn = "second"
-
-            self.redraw_board()
+            self.show_replay_ply(self.replay_index - 1)
             self.update_turn_display()
             self.highlight_log_line()
-        
-    def start_replay_moves(self, move_tags):
-        self.replay_move_tags = move_tags
-        self.replay_index = 0
+
+    # スライダーで手数を選ぶ
+    def on_replay_scale(self, value):
+        ply = int(float(value))
+        if ply == self.replay_scale_value:
+            return # show_replay_ply でスライダーを動かしたとき
+        if not self.is_replay_paused:
+            self.toggle_replay_pause()
+        self.show_replay_ply(ply)
+        self.highlight_log_line()
+
+    def show_replay_ply(self, ply):
+        """リプレイの盤面を ply 手目まで打った局面にする (再描画はイベント経由で行われる)"""
+        self.replay_index = ply
+        position = self.replay_timeline.position(ply)
+        self.board.restore(position)
+        self.board.count = ply
+        if self.replay_scale is not None:
+            self.replay_scale_value = ply
+            self.replay_scale.set(ply)
+            if ply == len(self.replay_timeline):
+                label = f"{ply}手目 (最終手)"
+            else:
+                label = f"{ply}手目 (次は{'黒' if position.turn == 'first' else '白'})"
+            self.replay_scale.config(label=label)
+
+    def create_replay_scale(self, plies):
+        """リプレイの手数を選ぶスライダーを作る"""
+        self.replay_scale = tkinter.Scale(self.info_frame, from_=0, to=plies, orient=tkinter.HORIZONTAL,
+                                          length=140, showvalue=False, bg='#008080', highlightthickness=0,
+                                          command=self.on_replay_scale)
+        self.replay_scale.place(x=440, y=5)
+        self.replay_controls.append(self.replay_scale)
+
+    def start_replay_moves(self, timeline):
+        self.replay_timeline = timeline
         self.board.play_log.clear() # リプレイ開始時にログをクリア
-        self.board.turn = "first"
-        self.replay_board_history.clear()
         self.is_replay_paused = False
-        self.replay_board_history.append(self.board.coord_to_piece.copy()) # 初期盤面を保存
+        self.create_replay_scale(len(timeline))
+        self.show_replay_ply(0) # 初期盤面
         self.replay_move()
     
     def replay_move(self, manual_step=False):
         if self.is_replay_paused and not manual_step:
             return
 
-        if self.replay_index < len(self.replay_move_tags):
+        if self.replay_index < len(self.replay_timeline):
             self.highlight_log_line()
+            self.show_replay_ply(self.replay_index + 1)
 
-            tag = self.replay_move_tags[self.replay_index]
-            coord = self.tag_to_coord.get(tag)
-            if coord:
-                self.othello.common_hit(coord, from_replay=True)
-                self.replay_index += 1
-                self.replay_board_history.append(deepcopy(self.board.coord_to_piece))
-                
             if not manual_step:
                 self.replay_job_id = self.window.after(self.replay_speed, self.replay_move)
         else:
@@ -730,6 +907,12 @@ class TkView:
         self.before_computer_3 = tkinter.Button(self.info_frame, text='さらに強いのかなぁ…', bg='#008080', fg='#000000', width=20,
                                                 command=lambda: self.before_computer_clicked(2))
         self.before_computer_3.place(x=380, y=30)
+        self.before_computer_4 = tkinter.Button(self.info_frame, text='先読みするよ！', bg='#008080', fg='#000000', width=20,
+                                                command=lambda: self.before_computer_clicked(3))
+        self.before_computer_4.place(x=560, y=30)
+        self.before_computer_5 = tkinter.Button(self.info_frame, text='モンテカルロ', bg='#008080', fg='#000000', width=20,
+                                                command=lambda: self.before_computer_clicked(4))
+        self.before_computer_5.place(x=20, y=60)
 
     # モード選択ボタン削除
     def mode_destory(self):
@@ -773,14 +956,22 @@ class TkView:
         self.before_computer_3 = tkinter.Button(self.info_frame, text='さらに強いのかなぁ…', bg='#008080', fg='#000000', width=20,
                                                 command=lambda: self.before_computer_clicked_human(2))
         self.before_computer_3.place(x=380, y=30)
+        self.before_computer_4 = tkinter.Button(self.info_frame, text='先読みするよ！', bg='#008080', fg='#000000', width=20,
+                                                command=lambda: self.before_computer_clicked_human(3))
+        self.before_computer_4.place(x=560, y=30)
+        self.before_computer_5 = tkinter.Button(self.info_frame, text='モンテカルロ', bg='#008080', fg='#000000', width=20,
+                                                command=lambda: self.before_computer_clicked_human(4))
+        self.before_computer_5.place(x=20, y=60)
 
     # 後攻ボタンクリック時(human vs random)
     def before_computer_clicked_human(self, id_num):
         
-        self.players["first"] = ["random", "random_2", "random_3"][id_num]
+        self.players["first"] = ["random", "random_2", "random_3", "alphabeta", "mcts"][id_num]
         self.before_computer_1.destroy()
         self.before_computer_2.destroy()
         self.before_computer_3.destroy()
+        self.before_computer_4.destroy()
+        self.before_computer_5.destroy()
         self.describe.destroy()
 
         # コンピューターの選択(先攻) tkinterのcommandの特質より関数をネストして使用
@@ -797,9 +988,17 @@ class TkView:
         elif id_num == 2:
             self.players["first"] = "random_3"
 
+        elif id_num == 3:
+            self.players["first"] = "alphabeta"
+
+        elif id_num == 4:
+            self.players["first"] = "mcts"
+
         self.before_computer_1.destroy()
         self.before_computer_2.destroy()
         self.before_computer_3.destroy()
+        self.before_computer_4.destroy()
+        self.before_computer_5.destroy()
         self.after_computer()
 
     def after_computer(self):
@@ -818,6 +1017,12 @@ class TkView:
         self.after_computer_3 = tkinter.Button(self.info_frame, text='さらに強いのかなぁ…', bg='#008080', fg='#000000', width=20,
                                                command=lambda: self.after_computer_clicked(2))
         self.after_computer_3.place(x=380, y=30)
+        self.after_computer_4 = tkinter.Button(self.info_frame, text='先読みするよ！', bg='#008080', fg='#000000', width=20,
+                                               command=lambda: self.after_computer_clicked(3))
+        self.after_computer_4.place(x=560, y=30)
+        self.after_computer_5 = tkinter.Button(self.info_frame, text='モンテカルロ', bg='#008080', fg='#000000', width=20,
+                                               command=lambda: self.after_computer_clicked(4))
+        self.after_computer_5.place(x=20, y=60)
 
     # コンピューターの選択(後攻)
     def after_computer_clicked(self, id_num):
@@ -830,36 +1035,58 @@ class TkView:
         elif id_num == 2:
             self.players["second"] = "random_3"
 
+        elif id_num == 3:
+            self.players["second"] = "alphabeta"
+
+        elif id_num == 4:
+            self.players["second"] = "mcts"
+
         self.after_computer_1.destroy()
         self.after_computer_2.destroy()
         self.after_computer_3.destroy()
+        self.after_computer_4.destroy()
+        self.after_computer_5.destroy()
         self.describe.destroy()
         self.othello.start_game_setup()
 
-    # 駒が打たれた時の駒の点描(先攻の場合)
-    def draw_piece_black(self, coord):
-        self._draw_piece(coord, self.black_piece_img, "black")
-
-    # 駒が打たれた時の駒の点描(先攻の場合)
-    def draw_piece_white(self, coord):
-        self._draw_piece(coord, self.white_piece_img, "white")
-        
-    def _draw_piece(self, coord, img, color):
-        cell_tag = self.coord_to_tag[coord]
-        piece_tag = cell_tag + "_piece"
-        self.canvas.delete(piece_tag)
-
-        if img:
+    # マス番号と駒(1:黒 2:白)を指定して点描
+    def create_cell_items(self, sq, coord, cell_tag):
+        """マスの駒と置けるマスの印のキャンバス項目を、非表示の状態で作る"""
+        if self.black_piece_img:
             x = coord[0] + self.CELL_SIZE / 2
             y = coord[1] + self.CELL_SIZE / 2
-            self.canvas.create_image(x, y, image=img, tags=(cell_tag, piece_tag))
+            self.piece_items[sq] = self.canvas.create_image(x, y, image=self.black_piece_img, state=tkinter.HIDDEN,
+                                                            tags=(cell_tag, cell_tag + "_piece"))
         else:
             # 画像がない場合は円を描画
             offset = 5 # 円を少し小さくするためのオフセット
-            self.canvas.create_oval(coord[0] + offset, coord[1] + offset, coord[2] - offset, coord[3] - offset, fill=color, outline=color, tags=(cell_tag, piece_tag))
+            self.piece_items[sq] = self.canvas.create_oval(coord[0] + offset, coord[1] + offset, coord[2] - offset, coord[3] - offset,
+                                                           state=tkinter.HIDDEN, tags=(cell_tag, cell_tag + "_piece"))
+        self.hint_items[sq] = self.canvas.create_oval(*coord, width=2, state=tkinter.HIDDEN,
+                                                      tags=(cell_tag, cell_tag + "_arc"))
+
+    def draw_piece(self, sq, piece):
+        """マス sq の駒を piece (0: なし, 1: 黒, 2: 白) の表示にする (表示が同じなら何もしない)"""
+        bit = 1 << sq
+        black = bit if piece == 1 else 0
+        white = bit if piece == 2 else 0
+        if self.drawn_black & bit == black and self.drawn_white & bit == white:
+            return
+        self.drawn_black = self.drawn_black & ~bit | black
+        self.drawn_white = self.drawn_white & ~bit | white
+
+        item = self.piece_items[sq]
+        if piece == 0:
+            self.canvas.itemconfigure(item, state=tkinter.HIDDEN)
+        elif self.black_piece_img:
+            img = self.black_piece_img if piece == 1 else self.white_piece_img
+            self.canvas.itemconfigure(item, image=img, state=tkinter.NORMAL)
+        else:
+            color = "black" if piece == 1 else "white"
+            self.canvas.itemconfigure(item, fill=color, outline=color, state=tkinter.NORMAL)
 
     # 置けるマスの可視化
-    def draw_avalable_cell(self, coord):
+    def draw_avalable_cell(self, sq):
         # ターンに応じて円の色を決定
         player_type = self.players.get(self.board.turn)
         color = "yellow"  # デフォルトの色（CPU対戦など）
@@ -869,10 +1096,8 @@ class TkView:
             elif self.board.turn == "second":
                 color = "skyblue2"  # 後攻（白）のターンはスカイブルー
 
-        tag = self.coord_to_tag[coord]
-        tag = tag + "_arc"
-        self.canvas.create_oval(*coord, outline=color, width=2, tags=tag)
-        self.avalable_cell_tags.append(tag)
+        self.canvas.itemconfigure(self.hint_items[sq], outline=color, state=tkinter.NORMAL)
+        self.avalable_cells.append(sq)
 
     def show_return_to_menu_button(self):
         """モード選択に戻るボタンを表示する"""
@@ -882,20 +1107,11 @@ class TkView:
         self.return_button.place(x=350, y=30)
         self.replay_controls.append(self.return_button)
 
-    def init_board_display(self):
-        """盤面の格子線などを描画する"""
-        self.canvas.create_rectangle(0, 0, self.WINDOW_SIZE, self.WINDOW_SIZE, fill="green")
-        for i in range(8):
-            for j in range(8):
-                tag = f"{i}_{j}"
-                coord = self.tag_to_coord[tag]
-                self.canvas.create_rectangle(*coord, fill="green", tags=tag)
-        
     # 可視化削除メソッド
     def clear_avalable_cells(self):
-        for tag in self.avalable_cell_tags:
-            self.canvas.delete(tag)
-        self.avalable_cell_tags.clear()
+        for sq in self.avalable_cells:
+            self.canvas.itemconfigure(self.hint_items[sq], state=tkinter.HIDDEN)
+        self.avalable_cells.clear()
 
     # 置けない所がクリックされた場合(human plyaer)
     def alert_message_human(self):
@@ -973,7 +1189,7 @@ class TkView:
 
     # ゲーム終了アラート
     def alert_finish(self, board):        
-        if hasattr(self, "player_info"): self.player_info.destroy()
+        if self.player_info is not None: self.player_info.destroy()
         black_count, white_count = board.result_count        
         self.alert = tkinter.Label(self.info_frame, text='ゲーム終了', bg='#008080', fg='#000000', width=40)
         if not self.restart_flag_alert:
@@ -989,30 +1205,60 @@ class TkView:
     
     # 再びゲームをする
     def restart_game(self):
-        # afterで予約されたupdate_loopをキャンセルする
-        if hasattr(self, 'update_loop_id'):
-            self.window.after_cancel(self.update_loop_id)
-        # CPUの思考処理がスケジュールされていればキャンセルする
-        if hasattr(self, 'cpu_turn_job_id') and self.cpu_turn_job_id:
-            self.window.after_cancel(self.cpu_turn_job_id)
-        # リプレイ再生処理がスケジュールされていればキャンセルする
-        if hasattr(self, 'replay_job_id') and self.replay_job_id:
-            self.window.after_cancel(self.replay_job_id)
-
+        """ウィンドウと盤面のキャンバス項目を使い回して、モード選択から始め直す"""
         self.restart_flag = True
+        self.othello.reset()
+        self.choice_attack()
+
+    def reset(self):
+        """予約した処理を取り消し、情報表示のウィジェットとログを消して初期状態に戻す"""
+        # CPUの思考処理・リプレイ再生処理がスケジュールされていればキャンセルする
+        for job_id in (self.cpu_turn_job_id, self.replay_job_id):
+            if job_id:
+                self.window.after_cancel(job_id)
+        self.cpu_turn_job_id = None
+        self.replay_job_id = None
+
+        # モード選択・アラート・リプレイ操作などのウィジェットをすべて削除
+        for widget in self.info_frame.winfo_children():
+            widget.destroy()
+        self.players.clear()
+        self.set_flag = False
+        self.alert_flag = False
+        self.restart_flag_alert = False
+        self.human_pass_button = None
+        self.player_info = None
+        self.pause_button = None
+        self.replay_controls.clear()
+        self.replay_timeline = None
+        self.replay_scale = None
+        self.replay_scale_value = None
+        self.replay_log_lines = []
+        self.is_replay_paused = False
+        self.clear_avalable_cells()
+
         self.log_text.config(state=tkinter.NORMAL) # ログを編集可能に戻す
-        self.window.destroy()
-        self.othello.is_replay_mode = False
-        play_othello()
+        self.log_text.delete("1.0", tkinter.END)
 
     # ログ表示を更新する
     def update_log_display(self, log_entry):
-        turn_count, turn, coord = log_entry
-        tag = self.coord_to_tag[coord]
-        
-        self.log_text.insert(tkinter.END, f"{turn_count}: ")
-        self.log_text.insert(tkinter.END, "黒(先)" if turn == "first" else "白(後)", "black_player" if turn == "first" else "white_player")        
-        self.log_text.insert(tkinter.END, f"が {tag} に配置\n")
+        turn_count, turn, sq = log_entry
+        line = format_move_line(turn_count, turn, sq)
+        prefix, player, rest = line.partition("黒(先)" if turn == "first" else "白(後)")
+
+        self.log_text.insert(tkinter.END, prefix)
+        self.log_text.insert(tkinter.END, player, "black_player" if turn == "first" else "white_player")
+        self.log_text.insert(tkinter.END, rest + "\n")
+        self.log_text.see(tkinter.END)
+
+    # 探索の情報をログに表示する
+    def show_search_info(self, info_text):
+        self.log_text.insert(tkinter.END, f"  ({info_text})\n")
+        self.log_text.see(tkinter.END)
+
+    # 統計情報をログに表示する
+    def show_stats(self, stats_text):
+        self.log_text.insert(tkinter.END, "\n" + stats_text)
         self.log_text.see(tkinter.END)
 
     def update_turn_display(self):
@@ -1033,6 +1279,10 @@ class TkView:
             text = f'Turn of CPU(little strong): {turn_str}'
         elif player_type == "random_3":
             text = f'Turn of CPU(strong): {turn_str}'
+        elif player_type == "alphabeta":
+            text = f'Turn of CPU(search): {turn_str}'
+        elif player_type == "mcts":
+            text = f'Turn of CPU(MCTS): {turn_str}'
         
         if text:
             self.player_info = tkinter.Label(self.info_frame, text=text, bg='#008080', fg='#000000', width=30)
@@ -1044,12 +1294,19 @@ class TkView:
         # ファイル保存ダイアログを開く
         file_path = filedialog.asksaveasfilename(
             title="ログを保存",
-            filetypes=[("テキストファイル", "*.txt")],
+            filetypes=[("テキストファイル", "*.txt"), ("棋譜アーカイブ (追記)", "*.othr")],
             defaultextension="txt",
             initialfile=f"othello_log_{datetime.now():%Y%m%d_%H%M%S}.txt"
         )
 
-        if file_path:
+        if file_path and file_path.endswith(".othr"):
+            # 棋譜アーカイブには着手だけを1局分追記する
+            try:
+                with RecordWriter(file_path) as writer:
+                    writer.write(self.board.game_record(self.players))
+            except Exception as e:
+                messagebox.showerror("エラー", f"棋譜の保存に失敗しました: {e}")
+        elif file_path:
             try:
                 with open(file_path, "w", encoding="utf-8") as f:
                     f.write("--- Othello Play Log ---\n")
@@ -1088,513 +1345,152 @@ class HumanPlayer(Player):
 # --- コンピューターのプレイヤー ---
 class RandomPlayer:
     """コンピューターの手や、人間が打てる場所を探す役割を担うクラス"""
-    def __init__(self, view):
-        self.view = view
-
     def random_hit(self, board):
-        """コンピュータが打てるすべての空きマスをチェックし、打てる場合はboardのリストに追加する"""
-        for x in range(8):
-            for y in range(8):
-                tag = f"{x}_{y}"
-                coord = self.view.tag_to_coord[tag]
-                if board.coord_to_piece[coord] == 0:
-                    board.check_random_hit(coord, self.view)
+        """コンピュータが打てるすべての空きマスをboardのリストに設定する"""
+        board.random_hit_list = board.move_list()
 
     # ひっくり返せる手を保存
     def search_hit(self, board):  
-        """人間プレイヤーのために、打てるすべての空きマスをチェックし、打てる場合はboardのリストに追加する（可視化用）"""
-        for x in range(8):
-            for y in range(8):
-                tag = f"{x}_{y}"
-                coord = self.view.tag_to_coord[tag]
-                if board.coord_to_piece[coord] == 0:
-                    board.check_search_hit(coord, self.view)
+        """人間プレイヤーのために、打てるすべての空きマスをboardのリストに設定する（可視化用）"""
+        board.search_hit_list = board.move_list()
 
 
 # --- 盤面情報,ゲーム情報管理クラス ---
-class Board: 
+class Board(Game):
+    """GUI で遊ぶゲームの盤面情報,ゲーム情報 (ルール本体は rules.Game)"""
+    __slots__ = ("hit", "random_hit_list", "search_hit_list", "result_count", "search_flag",
+                 "result_write_flag", "turn_start_time", "turn_times", "max_reversals", "profiler")
+
     def __init__(self):
-        # ターン管理変数(first:先攻, second:後攻 wait:ゲーム前)
-        self.turn = "wait"
-        # ターン数カウント変数
-        self.count = 0
-        # プレイログ
-        self.play_log = []
         # 手を打ったかの変数
         self.hit = False
-        # 置けるマスか判断
-        self.avalable_hit = False
-        # ひっくり返す時の終点を保存する辞書定義
-        self.reverse_dic = {}
-
-        # 先攻：1 後攻:2の辞書定義
-        self.turn_to_piece = {}
-        self.turn_to_piece["first"] = 1
-        self.turn_to_piece["second"] = 2
-
-        # ランダムに打つ時の打てる手リスト
-        self.random_hit_list_tag = []
-        self.random_hit_list_coord = []
-
-        # 可視化用に打つ時の打てる手リスト
-        self.search_hit_list_tag = []
-        self.search_hit_list_coord = []
-
-        # お互い打つ手がなくなった時にゲーム終了する
-        self.pass_count = 0 # 連続パス回数
-        # ゲームを終了フラグ
-        self.finish_flag = False
+
+        # ランダムに打つ時の打てる手リスト (マス番号)
+        self.random_hit_list = []
+
+        # 可視化用に打つ時の打てる手リスト (マス番号)
+        self.search_hit_list = []
+
         # ゲーム結果格納リスト
         self.result_count = []
-        # 再びゲーム開始ボタンフラグ
-        self.restart_flag = False
         # 可視化しているか確認フラグ
         self.search_flag = False
         # 結果書き込み済みフラグ
         self.result_write_flag = False
-        # 評価表の辞書
-        self.tag_to_evalvalue = {}
         # --- 統計情報 ---
         self.turn_start_time = None # 手番開始時刻
         self.turn_times = {"first": [], "second": []} # 手番ごとの思考時間
         self.max_reversals = {"first": 0, "second": 0} # 最大反転数
+        self.profiler = Profiler() # 処理時間の計測 (Othello が共有のものに差し替える)
 
-        self.tag_to_evalvalue["0_0"] = 30
-        self.tag_to_evalvalue["0_1"] = -12
-        self.tag_to_evalvalue["0_2"] = 0
-        self.tag_to_evalvalue["0_3"] = -1
-        self.tag_to_evalvalue["0_4"] = -1
-        self.tag_to_evalvalue["0_5"] = 0
-        self.tag_to_evalvalue["0_6"] = -12
-        self.tag_to_evalvalue["0_7"] = 30
-        self.tag_to_evalvalue["1_0"] = -12
-        self.tag_to_evalvalue["1_1"] = -15
-        self.tag_to_evalvalue["1_2"] = -3
-        self.tag_to_evalvalue["1_3"] = -3
-        self.tag_to_evalvalue["1_4"] = -3
-        self.tag_to_evalvalue["1_5"] = -3
-        self.tag_to_evalvalue["1_6"] = -15
-        self.tag_to_evalvalue["1_7"] = -12
-        self.tag_to_evalvalue["2_0"] = 0
-        self.tag_to_evalvalue["2_1"] = -3
-        self.tag_to_evalvalue["2_2"] = 0
-        self.tag_to_evalvalue["2_3"] = -1
-        self.tag_to_evalvalue["2_4"] = -1
-        self.tag_to_evalvalue["2_5"] = 0
-        self.tag_to_evalvalue["2_6"] = -3
-        self.tag_to_evalvalue["2_7"] = 0
-        self.tag_to_evalvalue["3_0"] = -1
-        self.tag_to_evalvalue["3_1"] = -3
-        self.tag_to_evalvalue["3_2"] = -1
-        self.tag_to_evalvalue["3_3"] = -1
-        self.tag_to_evalvalue["3_4"] = -1
-        self.tag_to_evalvalue["3_5"] = -1
-        self.tag_to_evalvalue["3_6"] = -3
-        self.tag_to_evalvalue["3_7"] = -1
-        self.tag_to_evalvalue["4_0"] = -1
-        self.tag_to_evalvalue["4_1"] = -3
-        self.tag_to_evalvalue["4_2"] = -1
-        self.tag_to_evalvalue["4_3"] = -1
-        self.tag_to_evalvalue["4_4"] = -1
-        self.tag_to_evalvalue["4_5"] = -1
-        self.tag_to_evalvalue["4_6"] = -3
-        self.tag_to_evalvalue["4_7"] = -1
-        self.tag_to_evalvalue["5_0"] = 0
-        self.tag_to_evalvalue["5_1"] = -3
-        self.tag_to_evalvalue["5_2"] = 0
-        self.tag_to_evalvalue["5_3"] = -1
-        self.tag_to_evalvalue["5_4"] = -1
-        self.tag_to_evalvalue["5_5"] = 0
-        self.tag_to_evalvalue["5_6"] = -3
-        self.tag_to_evalvalue["5_7"] = 0
-        self.tag_to_evalvalue["6_0"] = -12
-        self.tag_to_evalvalue["6_1"] = -15
-        self.tag_to_evalvalue["6_2"] = -3
-        self.tag_to_evalvalue["6_3"] = -3
-        self.tag_to_evalvalue["6_4"] = -3
-        self.tag_to_evalvalue["6_5"] = -3
-        self.tag_to_evalvalue["6_6"] = -15
-        self.tag_to_evalvalue["6_7"] = -12
-        self.tag_to_evalvalue["7_0"] = 30
-        self.tag_to_evalvalue["7_1"] = -12
-        self.tag_to_evalvalue["7_2"] = 0
-        self.tag_to_evalvalue["7_3"] = -1
-        self.tag_to_evalvalue["7_4"] = -1
-        self.tag_to_evalvalue["7_5"] = 0
-        self.tag_to_evalvalue["7_6"] = -12
-        self.tag_to_evalvalue["7_7"] = 30
-        
-    def init_board_setup(self):
-        """盤面の座標と駒の初期配置を生成する"""
-        self.coord_to_piece = {}
-        BOARD_OFFSET = 15
-        CELL_SIZE = 70
-        WINDOW_SIZE = 590
-        i = 0
-        for h in range(BOARD_OFFSET, WINDOW_SIZE - BOARD_OFFSET, CELL_SIZE):
-            j = 0
-            for v in range(BOARD_OFFSET, WINDOW_SIZE - BOARD_OFFSET, CELL_SIZE):
-                coord = (h, v, h + CELL_SIZE, v + CELL_SIZE)
-
-                # 初期駒の設置
-                if (j == 3 and i == 3) or (j == 4 and i == 4):
-                    self.coord_to_piece[coord] = 1 # 黒
-                elif (j == 3 and i == 4) or (j == 4 and i == 3):
-                    self.coord_to_piece[coord] = 2 # 白
-                else:
-                    self.coord_to_piece[coord] = 0 # 駒なし
-                j += 1
-            i += 1   
-        
-        # コマが置けるかどうかの判断
-    def check_avalable_hit(self, coord, view):
-        # 初期化
-        x = 0
-        y = 0
-        
-        # コマが置いてあるかどうか
-        self.avalable_hit = False
-        if self.coord_to_piece.get(coord) == 0:
-            tag = view.coord_to_tag[coord]
-            x, y = map(int, tag.split("_"))
-       
-        # 置けるマスか判断
-        self.check_piece_around(int(x), int(y), view, check_only=True)
-
-    # コマが置けるかどうかの判断
-    def check_random_hit(self, coord, view):
-        # 初期化
-        x = 0
-        y = 0
-        # コマが置いてあるかどうか
-        # (1)コマが置いていない場合
-        if self.coord_to_piece.get(coord) == 0:
-            tag = view.coord_to_tag[coord]
-            x, y = map(int, tag.split("_"))
-            self.check_piece_around(int(x), int(y), view, check_only=False)
-
-    # 可視化用メソッド
-    def check_search_hit(self, coord, view):
-        # 初期化
-        x = 0
-        y = 0
-        # コマが置いてあるかどうか
-        if self.coord_to_piece.get(coord) == 0:
-            tag = view.coord_to_tag[coord]
-            x, y = map(int, tag.split("_"))
-            # 置けるマスか判断
-            self.check_search_around(int(x), int(y), view)
-
-    # 周辺に自分の駒があるか確認するメソッド(選択マスの8方向)
-    def check_search_around(self, x, y, view):
-
-        # 打ったプレーヤーの駒の色確認
-        if self.turn == "first":
-            # 黒色の場合
-            my_color_num = 1
-        elif self.turn == "second":
-            # 白色の場合
-            my_color_num = 2
-        
-        if not my_color_num: return
-        for dx, dy in [(i, j) for i in range(-1, 2) for j in range(-1, 2) if not (i == 0 and j == 0)]:
-            nx, ny = x + dx, y + dy
-            if not (0 <= nx <= 7 and 0 <= ny <= 7): continue
-            
-            next_tag = f"{nx}_{ny}"
-            next_coord = view.tag_to_coord[next_tag]
-            piece_color_num = self.coord_to_piece[next_coord]
-
-            if piece_color_num == my_color_num or piece_color_num == 0: continue
+        super().__init__()
 
-            if self.find_own_piece_in_direction(nx, ny, dx, dy, view):
-                current_tag = f"{x}_{y}"
-                if current_tag not in self.search_hit_list_tag:
-                    self.search_hit_list_tag.append(current_tag)
-        
-    # 置ける可能性のあるマスの方向で検索
-    def check_search_around_2(self, x, y, dx, dy, view):
-        # 打ったプレーヤーの駒の色確認
-        if self.turn == "first":
-            # 黒色の場合
-            my_color_num = 1
-        elif self.turn == "second":
-            # 白色の場合
-            my_color_num = 2
-        
-            # 調べるマス取得
-        if x + dx != -1 and x + dx != 8 and y + dy != -1 and y + dy != 8:
-
-            maked_tag = str(x + dx) + "_" + str(y + dy)
-            # 取得マスの状態確認
-            piece_color_num = self.coord_to_piece[view.tag_to_coord[maked_tag]]
-
-            # 調べるマスに駒がないマス、もしくは自分の駒がある時は置けない
-            if piece_color_num == 0:
-                pass
-
-            # 調べたマスが自分の駒だったら
-            elif piece_color_num == my_color_num:
-                return True
-
-            # 調べるマスに相手の駒がある場合
-            elif piece_color_num != my_color_num:
-                return self.check_search_around_2(x + dx, y + dy, dx, dy, view)
-
-    def find_own_piece_in_direction(self, x, y, dx, dy, view):
-        my_color_num = self.turn_to_piece.get(self.turn)
-        cx, cy = x, y
-        while 0 <= cx <= 7 and 0 <= cy <= 7:
-            cx, cy = cx + dx, cy + dy
-            if not (0 <= cx <= 7 and 0 <= cy <= 7): return False
-            
-            tag = f"{cx}_{cy}"
-            coord = view.tag_to_coord[tag]
-            piece_color = self.coord_to_piece[coord]
-            
-            if piece_color == 0: return False
-            if piece_color == my_color_num: return True
-        return False
-
-    # 周辺に自分の駒があるか確認するメソッド(選択マスの8方向)
-    def check_piece_around(self, x, y, view, check_only):
-
-        # 打ったプレーヤーの駒の色確認
-        if self.turn == "first":
-            # 黒色の場合
-            my_color_num = 1
-        elif self.turn == "second":
-            # 白色の場合
-            my_color_num = 2
-        
-        if not my_color_num: return
-        for dx, dy in [(i, j) for i in range(-1, 2) for j in range(-1, 2) if not (i == 0 and j == 0)]:
-            nx, ny = x + dx, y + dy
-            if not (0 <= nx <= 7 and 0 <= ny <= 7): continue
-            
-            next_tag = f"{nx}_{ny}"
-            next_coord = view.tag_to_coord[next_tag]
-            piece_color_num = self.coord_to_piece[next_coord]
-
-            if piece_color_num == my_color_num or piece_color_num == 0: continue
-
-            if self.find_own_piece_in_direction(nx, ny, dx, dy, view):
-                if check_only:
-                    self.avalable_hit = True
-                    return
-                        
-                else:
-                    current_tag = f"{x}_{y}"
-                    if current_tag not in self.random_hit_list_tag:
-                        self.random_hit_list_tag.append(current_tag)
-
-    # 置ける可能性のあるマスの方向で検索
-    def check_piece_around_2(self, x, y, dx, dy, view):
-        # 打ったプレーヤーの駒の色確認
-        if self.turn == "first":
-            # 黒色の場合
-            my_color_num = 1
-        elif self.turn == "second":
-            # 白色の場合
-            my_color_num = 2
-        
-            # 調べるマス取得
-        if x + dx != -1 and x + dx != 8 and y + dy != -1 and y + dy != 8:
-
-            maked_tag = str(x + dx) + "_" + str(y + dy)
-            # 取得マスの状態確認
-            piece_color_num = self.coord_to_piece[view.tag_to_coord[maked_tag]]
-
-            # 調べるマスに駒がないマス、もしくは自分の駒がある時は置けない
-            if piece_color_num == 0:
-                pass
-
-            # 調べたマスが自分の駒だったら
-            elif piece_color_num == my_color_num:
-                self.avalable_hit = True
-                return True
-
-            # 調べるマスに相手の駒がある場合
-            elif piece_color_num != my_color_num:
-                return self.check_piece_around_2(x + dx, y + dy, dx, dy, view)
-
-    def dohit(self, coord):
+    def dohit(self, sq):
 
         # 思考時間を計算して記録
         if self.turn_start_time:
-            elapsed_time = (datetime.now() - self.turn_start_time).total_seconds()
+            elapsed_time = perf_counter() - self.turn_start_time
             if self.turn in self.turn_times:
                 self.turn_times[self.turn].append(elapsed_time)
 
-        # ターン数をインクリメント
-        self.count += 1
-
-        # 先攻が打ったら
-        if self.turn == "first":
-            self.coord_to_piece[coord] = 1
-
-        # 後攻が打ったら
-        else:
-            self.coord_to_piece[coord] = 2
-        
-        # ログを記録
-        self.play_log.append((self.count, self.turn, coord))
-
-    # --- 反転させるメソッド ---
-    def reverse_piece(self, coord, view):
-        tag = view.coord_to_tag[coord]
-        x, y = map(int, tag.split("_"))
-        self.reverse_dic.clear()
-        
-        my_color_num = self.turn_to_piece.get(self.turn)
-        for dx, dy in [(i, j) for i in range(-1, 2) for j in range(-1, 2) if not (i == 0 and j == 0)]:
-            reversed_count_in_line = 0
-            nx, ny = x + dx, y + dy
-            to_reverse = []
-            while 0 <= nx <= 7 and 0 <= ny <= 7:
-                current_tag = f"{nx}_{ny}"
-                current_coord = view.tag_to_coord[current_tag]
-                piece_color = self.coord_to_piece[current_coord]
-                if piece_color == 0:
-                    break
-                if piece_color == my_color_num:
-                    for r_coord in to_reverse:
-                        self.coord_to_piece[r_coord] = my_color_num
-                        if my_color_num == 1: view.draw_piece_black(r_coord)
-                        else: view.draw_piece_white(r_coord)
-                    reversed_count_in_line = len(to_reverse)
-                    break
-                to_reverse.append(current_coord)
-                nx, ny = nx + dx, ny + dy
-            
-            # この手での最大反転数を更新
-            if reversed_count_in_line > 0 and self.turn in self.max_reversals:
-                self.max_reversals[self.turn] = max(self.max_reversals[self.turn], reversed_count_in_line)
-        
-    # --- ひっくり返す駒があるか確認するメソッド(選択マスの8方向) ---
-    def reverse_piece_around(self, x, y, view):
-        # 打ったプレーヤーの駒の色確認
-        if self.turn == "first":
-            # 黒色の場合
-            my_color_num = 1
-        elif self.turn == "second":
-            # 白色の場合
-            my_color_num = 2
-        
-        # 周辺8方向の座標で検索
-        for dx in range(-1, 2, 1):
-            for dy in range(-1, 2, 1):
-                # 存在しないマスをはじく
-                if x + dx != -1 and x + dx != 8 and y + dy != -1 and y + dy != 8:
-                    # dx = 0 and dy = 0をはじく
-                    if not (dx == 0 and dy == 0):
-
-                        maked_tag = str(x + dx) + "_" + str(y + dy)
-
-                        # 周辺のマスの状態を確認する
-                        # 調べるマスの状態取得
-                        piece_color_num = self.coord_to_piece[view.tag_to_coord[maked_tag]]
-
-                        # 調べるマスに相手の駒がある場合
-                        if piece_color_num != my_color_num and piece_color_num != 0:
-                            self.reverse_piece_around_2(x + dx, y + dy, dx, dy, view)
-                else:
-                    pass
-
-    # --- ひっくり返すマスの方向で終点を検索 ---
-    def reverse_piece_around_2(self, x, y, dx, dy, view):
-        # 打ったプレーヤーの駒の色確認
-        if self.turn == "first":
-            # 黒色の場合
-            my_color_num = 1
-        elif self.turn == "second":
-            # 白色の場合
-            my_color_num = 2
-        
-        # 調べるマス取得
-        if x + dx != -1 and x + dx != 8 and y + dy != -1 and y + dy != 8:
-
-            maked_tag = str(x + dx) + "_" + str(y + dy)
-            # 取得マスの状態確認
-            piece_color_num = self.coord_to_piece[view.tag_to_coord[maked_tag]]
+        # 着手と反転 (描画はイベントを購読したビューが行う)
+        turn = self.turn
+        with self.profiler.span(turn, "flip"):
+            flipped = self.play(sq)
 
-            # 調べたマスが自分の駒だったら
-            if piece_color_num == my_color_num:
-                # ひっくり返す終点を保存する辞書にタグと方向を追加
-                dx_dy = str(dx) + "_" + str(dy)
-                self.reverse_dic[maked_tag] = dx_dy
+        # この手での最大反転数を更新
+        if turn in self.max_reversals:
+            self.max_reversals[turn] = max(self.max_reversals[turn], popcount(flipped))
 
-            # 調べるマスに相手の駒がある場合
-            elif piece_color_num != my_color_num and piece_color_num != 0:
-                return self.reverse_piece_around_2(x + dx, y + dy, dx, dy, view)
+    def new_game(self):
+        """盤面と統計情報を初期化し、ゲーム前 (モード選択) の状態に戻す"""
+        self.hit = False
+        self.random_hit_list = []
+        self.search_hit_list = []
+        self.result_count = []
+        self.search_flag = False
+        self.result_write_flag = False
+        self.turn_start_time = None
+        self.turn_times = {"first": [], "second": []}
+        self.max_reversals = {"first": 0, "second": 0}
+        self.turn = "wait"
+        self.init_board_setup()
 
     # --- ターン変更メソッド ---
     def change_turn(self):
-        # 先攻から後攻へターン変更
-        if self.turn == "first":
-            self.turn = "second"
-        # 後攻から先攻にターン変更
-        elif self.turn == "second":
-            self.turn = "first"
+        super().change_turn()
         # 手を打ったかどうかフラグ初期化
         self.hit = False
         # 次のターンの開始時刻を記録
-        self.turn_start_time = datetime.now()
-        # 置けるマスがあるかどうかフラグ初期化
-        self.avalable_hit = False
-        # 終点保存辞書初期化
-        self.reverse_dic = {}
+        self.turn_start_time = perf_counter()
         # 可視化メソッド用フラグ
         self.search_flag = False
 
-    # --- ゲーム終了判断メソッド ---
-    def finish_game(self):
-        if self.pass_count >= 2:
-            self.finish_flag = True
-            return
-        if all(p != 0 for p in self.coord_to_piece.values()):
-            self.finish_flag = True
-            return
-        
     # --- ゲーム結果取得メソッド ---
-    def get_result(self, view):
-        # 駒のカウント変数
-        black_count = sum(1 for p in self.coord_to_piece.values() if p == 1)
-        white_count = sum(1 for p in self.coord_to_piece.values() if p == 2)
-
-        # 統計情報をログウィジェットに表示
-        stats_text = self.get_stats_text()
-        view.log_text.insert(tkinter.END, "\n" + stats_text)
-        view.log_text.see(tkinter.END)
-
-        self.result_count = [black_count, white_count]
+    def get_result(self):
+        # 駒のカウント
+        self.result_count = list(self.counts())
         self.result_write_flag = True
 
+    def game_record(self, players):
+        """これまでの着手を棋譜アーカイブ用の GameRecord にする (players は手番 -> プレイヤーの種類)"""
+        black_count, white_count = self.counts()
+        moves = bytes(sq for _, _, sq in self.play_log)
+        return GameRecord(players.get("first", "unknown"), players.get("second", "unknown"),
+                          black_count, white_count, moves)
 
-    def get_stats_text(self):
-        """統計情報を整形して文字列として返す"""
+    def get_stats_text(self, tt=None, book=None):
+        """統計情報を整形して文字列として返す (置換表 tt、定跡 book の統計も加える)"""
         stats = ["--- 統計情報 ---"]
 
         for turn, player_name in [("first", "先手(黒)"), ("second", "後手(白)")] :
             times = self.turn_times.get(turn)
             if times:
                 avg_time = sum(times) / len(times)
+                times = sorted(times)
                 stats.append(f"[{player_name}]")
                 stats.append(f" 平均時間: {avg_time:.2f}秒")
+                stats.append(f" p50/p95/p99/最大: {percentile(times, 50):.2f} / {percentile(times, 95):.2f}"
+                             f" / {percentile(times, 99):.2f} / {times[-1]:.2f}秒")
             else:
                 stats.append(f"[{player_name}]")
                 stats.append(f" 平均時間: N/A")
             
             max_rev = self.max_reversals.get(turn, 0)
             stats.append(f" 最大反転数: {max_rev}個")
+
+        # 探索するCPUが対局した場合のみ表示
+        if tt is not None and tt.hits + tt.misses or book is not None and book.probes:
+            stats.append("[探索]")
+            if tt is not None and tt.hits + tt.misses:
+                stats.append(tt.stats_text())
+            if book is not None and book.probes:
+                stats.append(book.stats_text())
         return "\n".join(stats)
               
 # オセロをプレイ
 def play_othello(): 
+    load_gui()
     # オセロクラスのインスタンスを生成
     game = Othello()
     game.view.setup_and_run()
+    game.close()
 
 
 if __name__ == "__main__":
-    play_othello()
+    if "--selfplay" in sys.argv[1:]:
+        # GUI を使わない自己対戦
+        from selfplay import main
+        main(sys.argv[1:])
+    elif "--engine" in sys.argv[1:]:
+        # 標準入出力のエンジンプロトコル (NBoard 互換)
+        from engine import main
+        main(sys.argv[1:])
+    else:
+        if "--cpu-delay" in sys.argv[1:]:
+            CPU_MOVE_DELAY = int(sys.argv[sys.argv.index("--cpu-delay") + 1])
+        if "--search-workers" in sys.argv[1:]:
+            SEARCH_WORKERS = int(sys.argv[sys.argv.index("--search-workers") + 1])
+        if "--profile" in sys.argv[1:]:
+            PROFILE_FILE = sys.argv[sys.argv.index("--profile") + 1]
+        play_othello()
@@ -0,0 +1,153 @@
+# coding: UTF-8
+"""複数プロセスによる並列探索 (Lazy SMP)
+
+メインの探索 (呼び出したプロセス) と同じ局面を、ヘルパーのプロセスも同時に探索する。
+置換表は multiprocessing.shared_memory で全プロセスが共有し、ヘルパーが
+先に読んだ結果をメインの探索が置換表から再利用することで速くなる。
+ヘルパーは根の手の順番と読む深さをずらして、メインとは別の部分木から読む。
+手を決めるのはメインの探索で、終わったらヘルパーも打ち切る。
+
+    python parallel.py --workers 1 2 4 8 --depth 6   # 並列化による速度向上を計測する
+"""
+import argparse
+from multiprocessing import Pool, shared_memory
+from time import perf_counter
+
+from endgame import benchmark_positions
+from search import AlphaBetaSearch, SearchResult
+from ttable import SharedTranspositionTable
+
+# ヘルパープロセスの探索 (_init_helper で作る)
+_helper = None
+
+
+class _HelperSearch(AlphaBetaSearch):
+    """ヘルパープロセスの探索 (共有メモリの停止フラグが立ったら打ち切る)"""
+    def __init__(self, stop_flag, helper_id, *args, **kwargs):
+        self._stop_flag = stop_flag
+        self._deadline = 0.0
+        self.helper_id = helper_id
+        super().__init__(*args, **kwargs)
+
+    @property
+    def deadline(self):
+        return 0.0 if self._stop_flag[0] else self._deadline
+
+    @deadline.setter
+    def deadline(self, value):
+        self._deadline = value
+
+    def _search_root(self, p, o, h, h_rev, ev, moves, depth, count=1):
+        # 奇数番のヘルパーは1手深く読み、根の手は番号の分だけずらした順に読む
+        k = self.helper_id % len(moves)
+        return super()._search_root(p, o, h, h_rev, ev, moves[k:] + moves[:k], depth + (self.helper_id & 1),
+                                    count)
+
+
+def _init_helper(tt_name, tt_mb, stop_name, time_limit, max_depth, evaluator):
+    global _helper
+    tt = SharedTranspositionTable(tt_mb, name=tt_name)
+    stop = shared_memory.SharedMemory(name=stop_name)
+    _helper = (tt, stop, time_limit, max_depth, evaluator)
+
+
+def _helper_search(p, o, helper_id, count=1):
+    """ヘルパープロセスで探索し、ノード数を返す"""
+    tt, stop, time_limit, max_depth, evaluator = _helper
+    searcher = _HelperSearch(stop.buf, helper_id, time_limit, max_depth, tt=tt, evaluator=evaluator)
+    searcher.search(p, o, count)
+    return searcher.nodes
+
+
+class ParallelSearch:
+    """Lazy SMP による並列探索 (AlphaBetaSearch と同じように使える)
+
+    workers はメインを含めたプロセス数。1 なら並列化せずに探索する。
+    完全読みはメインのプロセスだけで行う。使い終わったら close() を呼ぶ。
+    """
+    def __init__(self, time_limit=1.0, workers=2, tt_mb=64, max_depth=60,
+                 endgame=None, endgame_empties=12, endgame_time_limit=5.0, evaluator=None):
+        self.workers = workers
+        self.tt = SharedTranspositionTable(tt_mb)
+        self.main = AlphaBetaSearch(time_limit, max_depth, tt=self.tt, endgame=endgame,
+                                    endgame_empties=endgame_empties, endgame_time_limit=endgame_time_limit,
+                                    evaluator=evaluator)
+        self.stop_flag = shared_memory.SharedMemory(create=True, size=1)
+        self.pool = None
+        if workers > 1:
+            self.pool = Pool(workers - 1, initializer=_init_helper,
+                             initargs=(self.tt.name, tt_mb, self.stop_flag.name, time_limit, max_depth, evaluator))
+
+    @property
+    def time_limit(self):
+        return self.main.time_limit
+
+    def search(self, p, o, count=1):
+        """手番側 p、相手側 o の局面で最善手を探索して SearchResult を返す (ノード数は全プロセスの合計)
+
+        count は AlphaBetaSearch.search と同じ (上位 count 手の評価値を SearchResult.lines に入れる)。
+        """
+        main = self.main
+        empties = 64 - (p | o).bit_count()
+        if self.pool is None or main.endgame is not None and empties <= main.endgame_empties:
+            return main.search(p, o, count)
+
+        self.stop_flag.buf[0] = 0
+        pending = [self.pool.apply_async(_helper_search, (p, o, i, count)) for i in range(1, self.workers)]
+        try:
+            result = main.search(p, o, count)
+        finally:
+            self.stop_flag.buf[0] = 1
+            helper_nodes = sum(r.get() for r in pending)
+        return SearchResult(result.move, result.score, result.depth, result.nodes + helper_nodes,
+                            result.elapsed, result.exact, result.lines)
+
+    def stop(self):
+        """探索を打ち切る (別スレッドから呼ぶ)"""
+        self.stop_flag.buf[0] = 1
+        self.main.stop()
+
+    def close(self):
+        """ヘルパープロセスと共有メモリを解放する (2回目以降は何もしない)"""
+        if self.stop_flag is None:
+            return
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        self.tt.close()
+        self.stop_flag.close()
+        self.stop_flag.unlink()
+        self.stop_flag = None
+
+
+def run_benchmark(workers_list, depth, empties, count, seed=0, tt_mb=64):
+    """決まった局面を決まった深さまで読む時間を、プロセス数ごとに表示する"""
+    positions = benchmark_positions(empties, count, seed)
+    print(f"{'プロセス':>6} {'時間(秒)':>10} {'速度向上':>8} {'ノード数':>12} {'nps':>10}")
+    base = None
+    for workers in workers_list:
+        searcher = ParallelSearch(float("inf"), workers, tt_mb, max_depth=depth)
+        try:
+            nodes = 0
+            start = perf_counter()
+            for p, o in positions:
+                searcher.tt.clear()
+                nodes += searcher.search(p, o).nodes
+            elapsed = perf_counter() - start
+        finally:
+            searcher.close()
+        base = base or elapsed
+        print(f"{workers:>6} {elapsed:>10.3f} {base / elapsed:>8.2f} {nodes:>12} {int(nodes / elapsed):>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="並列探索の速度向上を計測する")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--depth", type=int, default=6, help="読む深さ")
+    parser.add_argument("--empties", type=int, default=40, help="局面の空きマス数")
+    parser.add_argument("--count", type=int, default=5, help="局面数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tt-mb", type=int, default=64, help="置換表のメモリ上限 (MB)")
+    args = parser.parse_args()
+    run_benchmark(args.workers, args.depth, args.empties, args.count, args.seed, args.tt_mb)
@@ -0,0 +1,279 @@
+# coding: UTF-8
+"""パターンによる評価関数
+
+辺・角・斜め・角の2x5 などのマスの組 (パターン) について、駒の並びを
+3進数の番号 (0: 空き, 1: 手番側, 2: 相手) にして、学習済みの表を引いて合計する。
+反転すると自分自身に重なる形 (辺や斜めなど) では、反転した並びの番号にも
+同じ値を使う (canonical_table) ので、対称な局面の評価値は等しくなる。
+表は序盤から終盤までの段階 (駒数) ごとに持つ。
+探索中は着手のたびに変わったマスの分だけ番号を更新するので、
+局面ごとに盤面全体を読み直す必要はない。
+
+表はバイナリの重みファイルから読み込む (train.py で作る)。
+
+重みファイルの形式 (リトルエンディアン)
+  ヘッダ 12バイト: マジック "OTHPAT01", 段階数 uint8, パターン数 uint8, 予約 uint16
+  段階ごと・パターンごとに 3**マス数 個の int16 (評価値。石差1個が search.DISC_SCORE)
+
+    python pattern.py --weights othello_weights.bin   # 評価値の確認と探索速度の比較
+"""
+import struct
+import sys
+from array import array
+from functools import lru_cache
+from operator import getitem
+from time import perf_counter
+
+from bitboard import popcount
+
+MAGIC = b"OTHPAT01"
+HEADER = struct.Struct("<8sBBH")
+
+# パターンの基本形 (x, y)。対称な形 (回転・反転) もすべて使う
+PATTERNS = (
+    ("edge_2x", tuple((x, 0) for x in range(8)) + ((1, 1), (6, 1))),
+    ("corner_3x3", tuple((x, y) for y in range(3) for x in range(3))),
+    ("corner_2x5", tuple((x, y) for y in range(2) for x in range(5))),
+    ("diag_8", tuple((i, i) for i in range(8))),
+    ("diag_7", tuple((i + 1, i) for i in range(7))),
+    ("diag_6", tuple((i + 2, i) for i in range(6))),
+    ("diag_5", tuple((i + 3, i) for i in range(5))),
+    ("diag_4", tuple((i + 4, i) for i in range(4))),
+)
+
+# 段階の数 (駒数 10個ごと)
+NUM_PHASES = 6
+
+_SYMMETRIES = (
+    lambda x, y: (x, y), lambda x, y: (7 - x, y), lambda x, y: (x, 7 - y), lambda x, y: (7 - x, 7 - y),
+    lambda x, y: (y, x), lambda x, y: (7 - y, x), lambda x, y: (y, 7 - x), lambda x, y: (7 - y, 7 - x),
+)
+
+
+def _features():
+    """パターンの対称な形をすべて (パターンの番号, マス番号のタプル) で返す"""
+    features = []
+    for group, (_, base) in enumerate(PATTERNS):
+        seen = set()
+        for transform in _SYMMETRIES:
+            squares = tuple(y * 8 + x for x, y in (transform(x, y) for x, y in base))
+            if frozenset(squares) not in seen:
+                seen.add(frozenset(squares))
+                features.append((group, squares))
+    return features
+
+
+# 評価に使うパターンの形 (特徴) の一覧
+FEATURES = _features()
+# 特徴ごとのパターンの番号
+FEATURE_GROUPS = tuple(group for group, _ in FEATURES)
+# パターンごとの番号の数 (3**マス数)
+GROUP_SIZES = tuple(3 ** len(base) for _, base in PATTERNS)
+
+# マスごとに、そのマスを含む特徴と 3進数の桁の重み (特徴の番号, 3**桁)
+SQUARE_FEATURES = tuple(
+    tuple((i, 3 ** squares.index(sq)) for i, (_, squares) in enumerate(FEATURES) if sq in squares)
+    for sq in range(64)
+)
+# 相手の駒を置くとき (桁の値 2) 用
+_SQUARE_FEATURES_2 = tuple(tuple((i, 2 * pw) for i, pw in sf) for sf in SQUARE_FEATURES)
+
+
+def _self_symmetries(base):
+    """基本形を自分自身に移す対称 (恒等を含む) ごとに、並びの置換を返す
+
+    置換 perm は、基本形の k 番目のマスが移る先が perm[k] 番目のマスであることを表す。
+    """
+    perms = []
+    for transform in _SYMMETRIES:
+        moved = [transform(x, y) for x, y in base]
+        if set(moved) == set(base):
+            perms.append(tuple(base.index(c) for c in moved))
+    return perms
+
+
+@lru_cache(maxsize=None)
+def canonical_table(group):
+    """パターン group の番号を、対称な並びの番号のうち最小のもの (代表) にする表"""
+    base = PATTERNS[group][1]
+    result = None
+    for perm in _self_symmetries(base):
+        table = [0]
+        for k in range(len(base)):
+            pw = 3 ** perm[k]
+            table = [v + d * pw for d in range(3) for v in table]
+        result = table if result is None else list(map(min, result, table))
+    return array("i", result)
+
+
+def phase_of(discs):
+    """駒数から段階を返す"""
+    return min(NUM_PHASES - 1, (discs - 4) // 10)
+
+
+def indices(p, o):
+    """手番側 p、相手側 o の局面の特徴ごとの番号のリストを返す"""
+    result = []
+    for _, squares in FEATURES:
+        index = 0
+        for sq in reversed(squares):
+            index = index * 3 + (p >> sq & 1) + 2 * (o >> sq & 1)
+        result.append(index)
+    return result
+
+
+def _swap_table(n):
+    """n マスの番号の 1 と 2 (手番側と相手) を入れ替えた番号の表"""
+    table = array("i", [0])
+    for _ in range(n):
+        # 桁を1つ増やす: 下の桁は今までの表、上の桁は 0, 2, 1 の順
+        size = len(table)
+        table = array("i", [v + d * size for d in (0, 2, 1) for v in table])
+    return table
+
+
+class PatternWeights:
+    """段階ごと・パターンごとの評価値の表"""
+    def __init__(self, tables=None):
+        # tables[段階][パターン] = array("h")
+        self.tables = tables or [[array("h", bytes(2 * size)) for size in GROUP_SIZES]
+                                 for _ in range(NUM_PHASES)]
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < HEADER.size:
+            raise ValueError(f"重みファイルの形式が正しくありません: {path}")
+        magic, phases, groups, _ = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or phases != NUM_PHASES or groups != len(PATTERNS):
+            raise ValueError(f"重みファイルの形式が正しくありません: {path}")
+        if len(data) != HEADER.size + 2 * NUM_PHASES * sum(GROUP_SIZES):
+            raise ValueError(f"重みファイルの大きさが正しくありません: {path}")
+        tables = []
+        offset = HEADER.size
+        for _ in range(NUM_PHASES):
+            phase = []
+            for size in GROUP_SIZES:
+                table = array("h")
+                table.frombytes(data[offset:offset + 2 * size])
+                if sys.byteorder == "big":
+                    table.byteswap()
+                phase.append(table)
+                offset += 2 * size
+            tables.append(phase)
+        return cls(tables)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, NUM_PHASES, len(PATTERNS), 0))
+            for phase in self.tables:
+                for table in phase:
+                    if sys.byteorder == "big":
+                        table = array("h", table)
+                        table.byteswap()
+                    f.write(table.tobytes())
+
+
+class PatternIndexer:
+    """着手に合わせて特徴ごとの番号を更新する
+
+    状態は (特徴ごとの番号, 最初の局面の手番側の手番かどうか) で、
+    番号は最初の局面の手番側の駒を 1、相手の駒を 2 とする。
+    """
+    def root(self, p, o):
+        return indices(p, o), True
+
+    def play(self, state, sq, f):
+        """手番側が sq に打って f の駒を裏返した後の状態"""
+        idx, us = state
+        idx = idx.copy()
+        if us:
+            for i, pw in SQUARE_FEATURES[sq]:
+                idx[i] += pw
+            while f:
+                b = f & -f
+                f ^= b
+                for i, pw in SQUARE_FEATURES[b.bit_length() - 1]:
+                    idx[i] -= pw
+        else:
+            for i, pw in _SQUARE_FEATURES_2[sq]:
+                idx[i] += pw
+            while f:
+                b = f & -f
+                f ^= b
+                for i, pw in SQUARE_FEATURES[b.bit_length() - 1]:
+                    idx[i] += pw
+        return idx, not us
+
+    def passed(self, state):
+        return state[0], not state[1]
+
+
+class PatternEvaluator(PatternIndexer):
+    """パターンの表による評価 (search.AlphaBetaSearch の evaluator に渡す)
+
+    状態は PatternIndexer と同じで、最初の局面の手番側が手番のときは表をそのまま、
+    相手が手番のときは 1 と 2 を入れ替えた表を引く。
+    """
+    def __init__(self, weights):
+        self.weights = weights
+        swaps = [_swap_table(len(base)) for _, base in PATTERNS]
+        canonical = [canonical_table(group) for group in range(len(PATTERNS))]
+        # own[段階] / opp[段階] = 特徴ごとの表のリスト
+        self.own = []
+        self.opp = []
+        for tables in weights.tables:
+            # 対称な並びの番号には代表の番号の値を使う
+            phase = [array("h", map(table.__getitem__, canon)) for table, canon in zip(tables, canonical)]
+            swapped = [array("h", map(table.__getitem__, swap)) for table, swap in zip(phase, swaps)]
+            self.own.append([phase[group] for group in FEATURE_GROUPS])
+            self.opp.append([swapped[group] for group in FEATURE_GROUPS])
+
+    @classmethod
+    def load(cls, path):
+        return cls(PatternWeights.load(path))
+
+    def evaluate(self, state, p, o):
+        """手番側 p から見た評価値"""
+        idx, us = state
+        phase = phase_of(popcount(p | o))
+        return sum(map(getitem, self.own[phase] if us else self.opp[phase], idx))
+
+    def evaluate_position(self, p, o):
+        """手番側 p、相手側 o の局面の評価値 (状態を使わずに計算する)"""
+        return self.evaluate(self.root(p, o), p, o)
+
+
+def run_benchmark(path, depth, empties, count, seed=0):
+    """評価表と着手可能数による評価と、パターンによる評価で、同じ深さを読む速度を比べる"""
+    from endgame import benchmark_positions
+    from search import AlphaBetaSearch
+    from ttable import TranspositionTable
+
+    evaluators = [("評価表", None), ("パターン", PatternEvaluator.load(path))]
+    positions = benchmark_positions(empties, count, seed)
+    print(f"{'評価':<8} {'ノード数':>10} {'時間(秒)':>10} {'nps':>10}")
+    for name, evaluator in evaluators:
+        searcher = AlphaBetaSearch(float("inf"), depth, tt=TranspositionTable(16), evaluator=evaluator)
+        nodes = 0
+        start = perf_counter()
+        for p, o in positions:
+            searcher.tt.clear()
+            nodes += searcher.search(p, o).nodes
+        elapsed = perf_counter() - start
+        print(f"{name:<8} {nodes:>10} {elapsed:>10.3f} {int(nodes / elapsed):>10}")
+
+
+if __name__ == "__main__":
+    # argparse は othello の起動時に読み込まないように、コマンドとして使うときだけ読み込む
+    import argparse
+
+    parser = argparse.ArgumentParser(description="パターンによる評価の探索速度を計測する")
+    parser.add_argument("--weights", default="othello_weights.bin", help="重みファイル")
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--empties", type=int, default=36)
+    parser.add_argument("--count", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    run_benchmark(args.weights, args.depth, args.empties, args.count, args.seed)
@@ -0,0 +1,66 @@
+# coding: UTF-8
+"""perft (着手生成の検証と速度の計測)
+
+初期局面から depth 手先までのすべての手順を数え、既知のノード数と比べる。
+パスも1手として数え、両者とも打てない (終局) 局面はその深さで葉とする。
+bitboard.legal_moves / flips の正しさの確認と、葉の数/秒の計測に使う。
+
+    python perft.py --depth 9        # 1〜9手の葉の数を確認し、速度を表示する
+"""
+import argparse
+import sys
+from time import perf_counter
+
+from bitboard import INIT_BLACK, INIT_WHITE, flips, legal_moves
+
+# 初期局面からの葉の数 (パスを1手として数える)
+PERFT_COUNTS = {
+    1: 4, 2: 12, 3: 56, 4: 244, 5: 1396, 6: 8200, 7: 55092, 8: 390216,
+    9: 3005288, 10: 24571284, 11: 212258800,
+}
+
+
+def perft(depth, p=INIT_BLACK, o=INIT_WHITE, passed=False):
+    """手番側 p、相手側 o の局面から depth 手先の葉の数を返す"""
+    moves = legal_moves(p, o)
+    if not moves:
+        if passed:
+            return 1 # 終局
+        return perft(depth - 1, o, p, True) if depth > 1 else 1
+    if depth == 1:
+        return moves.bit_count()
+    count = 0
+    while moves:
+        b = moves & -moves
+        moves ^= b
+        f = flips(p, o, b.bit_length() - 1)
+        count += perft(depth - 1, o & ~f, p | f | b)
+    return count
+
+
+def run_perft(max_depth):
+    """1〜max_depth 手の perft を計測し、既知の値と一致したかどうかを返す"""
+    ok = True
+    print(f"{'深さ':>4} {'葉の数':>12} {'時間(秒)':>10} {'葉/秒':>12}  結果")
+    for depth in range(1, max_depth + 1):
+        start = perf_counter()
+        count = perft(depth)
+        elapsed = perf_counter() - start
+        expected = PERFT_COUNTS.get(depth)
+        if expected is None:
+            status = "(既知の値なし)"
+        elif count == expected:
+            status = "OK"
+        else:
+            status = f"NG (正しくは {expected})"
+            ok = False
+        rate = int(count / elapsed) if elapsed else 0
+        print(f"{depth:>4} {count:>12} {elapsed:>10.3f} {rate:>12}  {status}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="着手生成の perft")
+    parser.add_argument("--depth", type=int, default=9, help="数える最大の深さ")
+    args = parser.parse_args()
+    sys.exit(0 if run_perft(args.depth) else 1)
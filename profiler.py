@@ -0,0 +1,143 @@
+# coding: UTF-8
+"""処理時間の計測 (tkinter に依存しない)
+
+着手生成 (movegen)・反転 (flip)・評価による手の選択 (eval)・探索 (search)・
+描画 (render) などの区間の時間を perf_counter_ns で測り、プレイヤー (手番) ごとに
+集める。1局分の結果は p50/p95/p99/最大と、2の累乗ごとの度数 (ヒストグラム) にして
+JSONL ファイルに1行ずつ追記する。度数は対局をまたいで足し合わせられるので、
+何千局分の結果もまとめて集計できる。
+
+区間は入れ子にでき、外側の区間の時間には内側の区間の時間を含めない
+(着手の中で行う描画は flip ではなく render に数える)。
+入れ子の区間 (span) はメインスレッドだけで使い、別スレッドからは add() を使う。
+
+    python profiler.py othello_profile.jsonl   # 全対局の分布を集計して表示する
+"""
+import json
+from array import array
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter_ns
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, q):
+    """ソート済みの値の q パーセンタイル (最近順位法)"""
+    if not sorted_values:
+        return 0
+    rank = max(1, -(-q * len(sorted_values) // 100))
+    return sorted_values[rank - 1]
+
+
+def summarize_samples(samples):
+    """1区間分の時間 (ns) の集計を辞書で返す"""
+    values = sorted(samples)
+    summary = {"count": len(values), "total_ns": sum(values)}
+    for q in PERCENTILES:
+        summary[f"p{q}_ns"] = percentile(values, q)
+    summary["max_ns"] = values[-1] if values else 0
+    # ヒストグラム: ns のビット長 (2**(k-1) 以上 2**k 未満) ごとの度数
+    buckets = defaultdict(int)
+    for v in values:
+        buckets[v.bit_length()] += 1
+    summary["buckets"] = {str(k): n for k, n in sorted(buckets.items())}
+    return summary
+
+
+class Profiler:
+    """区間ごと・プレイヤーごとの処理時間を集める"""
+    def __init__(self):
+        # (プレイヤー, 区間名) -> 時間 (ns) の配列
+        self.samples = defaultdict(lambda: array("q"))
+        # 計測中の区間 [プレイヤー, 区間名, 開始時刻, 内側の区間の時間]
+        self._stack = []
+
+    def clear(self):
+        self.samples.clear()
+        self._stack.clear()
+
+    def add(self, player, name, ns):
+        self.samples[player, name].append(ns)
+
+    @contextmanager
+    def span(self, player, name):
+        """with の中の時間を計測する (内側の区間の時間は除く)"""
+        frame = [player, name, perf_counter_ns(), 0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            elapsed = perf_counter_ns() - frame[2]
+            self._stack.pop()
+            self.add(player, name, elapsed - frame[3])
+            if self._stack:
+                self._stack[-1][3] += elapsed
+
+    def summary(self):
+        """{プレイヤー: {区間名: 集計}} を返す"""
+        result = defaultdict(dict)
+        for (player, name), samples in sorted(self.samples.items()):
+            result[player][name] = summarize_samples(samples)
+        return dict(result)
+
+    def write_jsonl(self, path, **info):
+        """1局分の集計を info (プレイヤーの種類など) と合わせて JSONL で追記する"""
+        write_jsonl(path, dict(info, spans=self.summary()))
+
+
+def write_jsonl(path, entry):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def merge_buckets(entries):
+    """JSONL の各局の度数を {(プレイヤー, 区間名): {ビット長: 度数}} に足し合わせる"""
+    merged = defaultdict(lambda: defaultdict(int))
+    maxima = defaultdict(int)
+    for entry in entries:
+        players = {"first": entry.get("black"), "second": entry.get("white")}
+        for turn, spans in entry["spans"].items():
+            player = f"{turn}({players[turn]})" if players.get(turn) else turn
+            for name, summary in spans.items():
+                for k, n in summary["buckets"].items():
+                    merged[player, name][int(k)] += n
+                maxima[player, name] = max(maxima[player, name], summary["max_ns"])
+    return merged, maxima
+
+
+def bucket_percentile(buckets, q):
+    """度数から q パーセンタイルの上限 (ns) を返す (2の累乗の精度)"""
+    total = sum(buckets.values())
+    rank = max(1, -(-q * total // 100))
+    seen = 0
+    for k in sorted(buckets):
+        seen += buckets[k]
+        if seen >= rank:
+            return 1 << k
+    return 0
+
+
+def main(argv=None):
+    # argparse は othello の起動時に読み込まないように、コマンドとして使うときだけ読み込む
+    import argparse
+
+    parser = argparse.ArgumentParser(description="処理時間の JSONL を集計する")
+    parser.add_argument("paths", nargs="+", help="Profiler.write_jsonl で書いたファイル")
+    args = parser.parse_args(argv)
+
+    entries = []
+    for path in args.paths:
+        with open(path, encoding="utf-8") as f:
+            entries.extend(json.loads(line) for line in f if line.strip())
+    merged, maxima = merge_buckets(entries)
+    print(f"{len(entries)} 局 (p50/p95/p99 は2の累乗単位の上限, µs)")
+    print(f"{'プレイヤー':<20} {'区間':<8} {'回数':>8} {'p50':>10} {'p95':>10} {'p99':>10} {'最大':>10}")
+    for (player, name), buckets in sorted(merged.items()):
+        values = [min(bucket_percentile(buckets, q), maxima[player, name]) / 1000 for q in PERCENTILES]
+        print(f"{player:<20} {name:<8} {sum(buckets.values()):>8} "
+              + " ".join(f"{v:>10.1f}" for v in values) + f" {maxima[player, name] / 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# coding: UTF-8
+"""棋譜の読み書き (tkinter に依存しない)
+
+テキストのログファイル (.txt) の読み込みと、多数の対局をまとめて保存する
+バイナリの棋譜アーカイブ (.othr) の読み書きを行う。
+
+アーカイブの形式 (リトルエンディアン)
+  ファイルヘッダ 8バイト: マジック "OTHREC01"
+  対局ごとに
+    ヘッダ 5バイト: 先手のプレイヤー uint8, 後手のプレイヤー uint8,
+                    黒の駒数 uint8, 白の駒数 uint8, 手数 uint8
+    着手 手数バイト: マス番号 (y * 8 + x)。パスは記録せず、読み込み時に補う
+
+対局はファイルの末尾に追記していくので、何百万局でも1つのファイルに保存でき、
+読み込みも1局ずつ順に行うのでメモリに全体を載せる必要はない。
+
+    python record.py --convert othello_log_*.txt --output games.othr
+    python record.py --info games.othr
+"""
+import os
+import re
+import struct
+from collections import namedtuple
+
+from bitboard import popcount, sq_to_tag, tag_to_sq
+from rules import iter_positions
+
+# ログの着手行 ("1: 黒(先)が 4_2 に配置") から 'X_Y' 形式のタグを取り出す
+LOG_MOVE_PATTERN = re.compile(r'が (\d{1,2}_\d{1,2}) に配置')
+
+MAGIC = b"OTHREC01"
+GAME_HEADER = struct.Struct("<BBBBB")
+
+# プレイヤーの種類 (アーカイブには番号で保存するので、追加は末尾に行う)
+PLAYERS = ("unknown", "human", "random", "random_2", "random_3", "alphabeta", "mcts")
+
+GameRecord = namedtuple("GameRecord", "black white black_count white_count moves")
+GameRecord.__doc__ = """1局分の棋譜 (black/white はプレイヤーの種類、moves はマス番号の bytes)"""
+
+
+def iter_text_log(f):
+    """ログファイルの着手行を (行, マス番号) で順に返す"""
+    for line in f:
+        if "に配置" not in line: # 着手行以外は正規表現を使わずに読み飛ばす
+            continue
+        match = LOG_MOVE_PATTERN.search(line)
+        if match:
+            yield line.strip(), tag_to_sq(match.group(1))
+
+
+def read_text_log(path):
+    """テキストのログファイルから着手の列 (マス番号のリスト) を読み込む"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [sq for _, sq in iter_text_log(f)]
+
+
+def format_move_line(count, turn, sq):
+    """着手を ログの1行の形式 ("1: 黒(先)が 4_2 に配置") にする"""
+    player = "黒(先)" if turn == "first" else "白(後)"
+    return f"{count}: {player}が {sq_to_tag(sq)} に配置"
+
+
+def move_lines(moves):
+    """着手の列からログの行を作る (パスを補って手番を決める)"""
+    return [format_move_line(count, position.turn, sq)
+            for count, (position, sq) in enumerate(iter_positions(moves), 1)]
+
+
+def final_counts(moves):
+    """着手の列を最後まで打ったときの (黒の駒数, 白の駒数) を返す"""
+    position = None
+    for position, _ in iter_positions(moves):
+        pass
+    if position is None:
+        return 2, 2
+    final, _ = position.play(moves[-1])
+    return popcount(final.black), popcount(final.white)
+
+
+def make_record(moves, black="unknown", white="unknown"):
+    """着手の列から GameRecord を作る (駒数は最後まで打って求める)"""
+    black_count, white_count = final_counts(moves)
+    return GameRecord(black, white, black_count, white_count, bytes(moves))
+
+
+class RecordWriter:
+    """棋譜アーカイブに対局を追記する
+
+        with RecordWriter("games.othr") as writer:
+            writer.write(record)
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        elif not _has_magic(path):
+            self._file.close()
+            raise ValueError(f"棋譜アーカイブの形式が正しくありません: {path}")
+        self.count = 0
+
+    def write(self, record):
+        """GameRecord を1局追記する"""
+        moves = bytes(record.moves)
+        if len(moves) > 255:
+            raise ValueError("手数が多すぎます")
+        self._file.write(GAME_HEADER.pack(_player_code(record.black), _player_code(record.white),
+                                          record.black_count, record.white_count, len(moves)))
+        self._file.write(moves)
+        self.count += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _player_code(name):
+    return PLAYERS.index(name) if name in PLAYERS else 0
+
+
+def _has_magic(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def iter_records(path):
+    """棋譜アーカイブの対局を GameRecord で1局ずつ返す"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"棋譜アーカイブの形式が正しくありません: {path}")
+        read = f.read
+        size = GAME_HEADER.size
+        while True:
+            header = read(size)
+            if len(header) < size:
+                if header:
+                    raise ValueError(f"棋譜アーカイブの末尾が壊れています: {path}")
+                return
+            black, white, black_count, white_count, n = GAME_HEADER.unpack(header)
+            moves = read(n)
+            if len(moves) < n:
+                raise ValueError(f"棋譜アーカイブの末尾が壊れています: {path}")
+            yield GameRecord(PLAYERS[black] if black < len(PLAYERS) else "unknown",
+                             PLAYERS[white] if white < len(PLAYERS) else "unknown",
+                             black_count, white_count, moves)
+
+
+def last_record(path):
+    """棋譜アーカイブの最後の対局を返す (対局がなければ None)"""
+    record = None
+    for record in iter_records(path):
+        pass
+    return record
+
+
+def convert_text_logs(paths, output):
+    """テキストのログファイルを棋譜アーカイブに追記し、追記した対局数を返す"""
+    with RecordWriter(output) as writer:
+        for path in paths:
+            moves = read_text_log(path)
+            if moves:
+                writer.write(make_record(moves))
+        return writer.count
+
+
+def main(argv=None):
+    # argparse は othello の起動時に読み込まないように、コマンドとして使うときだけ読み込む
+    import argparse
+
+    parser = argparse.ArgumentParser(description="棋譜アーカイブの変換・確認")
+    parser.add_argument("--convert", nargs="*", default=[], metavar="LOG", help="アーカイブに追記するログファイル (.txt)")
+    parser.add_argument("--output", default="othello_games.othr", help="追記先のアーカイブ")
+    parser.add_argument("--info", nargs="*", default=[], metavar="ARCHIVE", help="対局数と勝敗を表示するアーカイブ")
+    args = parser.parse_args(argv)
+
+    if args.convert:
+        count = convert_text_logs(args.convert, args.output)
+        print(f"{count} 局を {args.output} に追記しました ({os.path.getsize(args.output)} バイト)")
+    for path in args.info:
+        games = black_wins = white_wins = plies = 0
+        for record in iter_records(path):
+            games += 1
+            plies += len(record.moves)
+            black_wins += record.black_count > record.white_count
+            white_wins += record.white_count > record.black_count
+        print(f"{path}: {games} 局, 黒の勝ち {black_wins}, 白の勝ち {white_wins}, "
+              f"引き分け {games - black_wins - white_wins}, 平均手数 {plies / games if games else 0:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# coding: UTF-8
+"""リプレイ用の棋譜のタイムライン (tkinter に依存しない)
+
+1局分の着手から、各手の反転 (差分) と一定間隔の局面 (チェックポイント) を
+作っておき、任意の手数の局面をすぐに復元できるようにする。
+手数ごとに盤面全体を保存しないので、長い対局でもメモリはほとんど増えない。
+パスも着手の列から補うので、パスの後も手番は正しく復元される。
+"""
+from array import array
+
+from rules import Position, iter_positions
+
+# チェックポイントを置く間隔 (手数)
+CHECKPOINT_INTERVAL = 8
+
+
+class ReplayTimeline:
+    """着手の列 (マス番号) から任意の手数の局面を復元する
+
+    ply 手目までを打った局面を position(ply) で返す (0 は初期局面)。
+    着手が不正なら ValueError を送出する。
+    """
+    def __init__(self, moves, interval=CHECKPOINT_INTERVAL):
+        self.interval = interval
+        self.moves = bytes(moves)
+        # ply 手目の着手で裏返った駒 (ビットボード) と、打った側が黒かどうか
+        self.flips = array("Q")
+        self.black_moved = bytearray()
+        self.checkpoints = []
+        position = Position()
+        for ply, (position, sq) in enumerate(iter_positions(self.moves)):
+            if ply % interval == 0:
+                self.checkpoints.append(position)
+            position, flipped = position.play(sq)
+            self.flips.append(flipped)
+            self.black_moved.append(position.turn == "second")
+        # 最後の局面の手番 (打てる側。どちらも打てなければ終局)
+        if not position.legal_moves() and position.passed().legal_moves():
+            position = position.passed()
+        if len(self.moves) % interval == 0:
+            self.checkpoints.append(position)
+        self.final_turn = position.turn
+
+    def __len__(self):
+        return len(self.moves)
+
+    def turn(self, ply):
+        """ply 手目までを打った局面の手番 ("first" / "second")"""
+        if ply >= len(self.moves):
+            return self.final_turn
+        # 次の手を打つ側が手番 (パスがあっても正しい)
+        return "first" if self.black_moved[ply] else "second"
+
+    def move(self, ply):
+        """ply 手目 (1 始まり) の (手番, マス番号, 裏返った駒) を返す"""
+        turn = "first" if self.black_moved[ply - 1] else "second"
+        return turn, self.moves[ply - 1], self.flips[ply - 1]
+
+    def position(self, ply):
+        """ply 手目までを打った局面を Position で返す"""
+        if not 0 <= ply <= len(self.moves):
+            raise IndexError(f"手数が範囲外です: {ply}")
+        base = ply // self.interval * self.interval
+        checkpoint = self.checkpoints[ply // self.interval]
+        black, white = checkpoint.black, checkpoint.white
+        # チェックポイントから差分を適用して進める (高々 interval - 1 手)
+        for i in range(base, ply):
+            placed = self.flips[i] | (1 << self.moves[i])
+            if self.black_moved[i]:
+                black |= placed
+                white &= ~placed
+            else:
+                white |= placed
+                black &= ~placed
+        return Position(black, white, self.turn(ply))
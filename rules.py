@@ -0,0 +1,254 @@
+# coding: UTF-8
+"""オセロのルール本体 (tkinter に依存しない)
+
+盤面はビットボード、マスはマス番号 sq = y * 8 + x で扱う。
+盤面の変化はリスナーに通知されるので、GUI はイベントを購読して描画する。
+"""
+from bitboard import (FULL, INIT_BLACK, INIT_WHITE, flips, iter_bits,
+                      legal_moves, popcount)
+
+# 評価表 (マス番号順、CPUの手の評価に使う)
+EVAL_TABLE = (
+     30, -12,   0,  -1,  -1,   0, -12,  30,
+    -12, -15,  -3,  -3,  -3,  -3, -15, -12,
+      0,  -3,   0,  -1,  -1,   0,  -3,   0,
+     -1,  -3,  -1,  -1,  -1,  -1,  -3,  -1,
+     -1,  -3,  -1,  -1,  -1,  -1,  -3,  -1,
+      0,  -3,   0,  -1,  -1,   0,  -3,   0,
+    -12, -15,  -3,  -3,  -3,  -3, -15, -12,
+     30, -12,   0,  -1,  -1,   0, -12,  30,
+)
+
+
+def to_sq(row, col):
+    """(行, 列) をマス番号に変換する"""
+    return row * 8 + col
+
+
+def to_row_col(sq):
+    """マス番号を (行, 列) に変換する"""
+    return sq >> 3, sq & 7
+
+
+def iter_positions(moves):
+    """着手の列 (マス番号) を初期局面から打ち進め、各手の直前の局面と手を返す
+
+    打てない側の手番は自動でパスする。(Position, sq) を順に返す。
+    """
+    position = Position()
+    for sq in moves:
+        if not position.legal_moves():
+            # 手番側に打てる手がなければパス
+            position = position.passed()
+        if not position.legal_moves() >> sq & 1:
+            raise ValueError(f"マス {sq} には打てません")
+        yield position, sq
+        position, _ = position.play(sq)
+
+
+class Position:
+    """局面 (黒・白のビットボードと手番) を表す小さな値オブジェクト
+
+    __slots__ で属性を固定しているので、リプレイの履歴や探索で
+    大量に保持しても辞書ほどメモリを使わない。コピー・比較・ハッシュも軽い。
+    """
+    __slots__ = ("black", "white", "turn")
+
+    def __init__(self, black=INIT_BLACK, white=INIT_WHITE, turn="first"):
+        self.black = black
+        self.white = white
+        self.turn = turn
+
+    def copy(self):
+        return Position(self.black, self.white, self.turn)
+
+    def __eq__(self, other):
+        if not isinstance(other, Position):
+            return NotImplemented
+        return self.black == other.black and self.white == other.white and self.turn == other.turn
+
+    def __hash__(self):
+        return hash((self.black, self.white, self.turn))
+
+    def __repr__(self):
+        return f"Position(0x{self.black:016x}, 0x{self.white:016x}, {self.turn!r})"
+
+    def own_and_opponent(self):
+        """手番側と相手側のビットボードを返す"""
+        if self.turn == "second":
+            return self.white, self.black
+        return self.black, self.white
+
+    def legal_moves(self):
+        """手番側の合法手をビットボードで返す"""
+        p, o = self.own_and_opponent()
+        return legal_moves(p, o)
+
+    def play(self, sq):
+        """マス sq に打った後の局面と、裏返した駒を返す (自身は変更しない)"""
+        p, o = self.own_and_opponent()
+        flipped = flips(p, o, sq)
+        p |= flipped | (1 << sq)
+        o &= ~flipped
+        if self.turn == "first":
+            return Position(p, o, "second"), flipped
+        return Position(o, p, "first"), flipped
+
+    def passed(self):
+        """パスした後の局面を返す"""
+        return Position(self.black, self.white, "second" if self.turn == "first" else "first")
+
+
+class Game:
+    """盤面とゲームの進行状態を管理するクラス
+
+    リスナーには次のイベントが通知される。
+      ("reset",)                    盤面が初期化・再設定された
+      ("move", turn, sq, flipped)   turn が sq に打ち、flipped の駒を裏返した
+      ("pass", turn)                turn がパスした
+      ("turn", turn)                手番が turn に替わった
+    """
+    __slots__ = ("black", "white", "turn", "turn_to_piece", "listeners", "count", "play_log",
+                 "pass_count", "finish_flag", "_moves_key", "_moves", "_move_list")
+
+    def __init__(self):
+        # ターン管理変数(first:先攻, second:後攻 wait:ゲーム前)
+        self.turn = "wait"
+        # 先攻：1 後攻:2の辞書定義
+        self.turn_to_piece = {"first": 1, "second": 2}
+        # イベントの通知先
+        self.listeners = []
+        # 合法手のキャッシュ (局面 (黒, 白, 手番) ごとに1回だけ計算する)
+        self._moves_key = None
+        self._moves = 0
+        self._move_list = None
+        self.init_board_setup()
+
+    def init_board_setup(self):
+        """駒の初期配置とゲームの進行状態を初期化する"""
+        self.black = INIT_BLACK
+        self.white = INIT_WHITE
+        # ターン数カウント変数
+        self.count = 0
+        # プレイログ (ターン数, 手番, マス番号)
+        self.play_log = []
+        # お互い打つ手がなくなった時にゲーム終了する
+        self.pass_count = 0 # 連続パス回数
+        # ゲームを終了フラグ
+        self.finish_flag = False
+        self.notify("reset")
+
+    def set_position(self, black, white, turn):
+        """盤面と手番を直接設定する"""
+        self.black = black
+        self.white = white
+        self.turn = turn
+        self.notify("reset")
+
+    def position(self):
+        """現在の局面を Position で返す"""
+        return Position(self.black, self.white, self.turn)
+
+    def restore(self, position):
+        """Position の局面に戻す"""
+        self.set_position(position.black, position.white, position.turn)
+
+    # --- イベント通知 ---
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def notify(self, event, *args):
+        for listener in self.listeners:
+            listener(event, *args)
+
+    # --- 盤面の参照 ---
+    def piece_at(self, sq):
+        """マス sq の駒を返す (0:なし 1:黒 2:白)"""
+        if self.black >> sq & 1:
+            return 1
+        if self.white >> sq & 1:
+            return 2
+        return 0
+
+    def own_and_opponent(self):
+        """手番側と相手側のビットボードを返す"""
+        if self.turn == "second":
+            return self.white, self.black
+        return self.black, self.white
+
+    def legal_moves(self):
+        """手番側の合法手をビットボードで返す (同じ局面では計算結果を使い回す)"""
+        key = (self.black, self.white, self.turn)
+        if key != self._moves_key:
+            self._moves_key = key
+            self._move_list = None
+            if self.turn in self.turn_to_piece:
+                p, o = self.own_and_opponent()
+                self._moves = legal_moves(p, o)
+            else:
+                self._moves = 0
+        return self._moves
+
+    def move_list(self):
+        """手番側の合法手をマス番号のリストで返す (呼び出し側で変更しないこと)"""
+        moves = self.legal_moves()
+        if self._move_list is None:
+            self._move_list = list(iter_bits(moves))
+        return self._move_list
+
+    def is_legal(self, sq):
+        """マス sq に打てるかどうか"""
+        return bool(self.legal_moves() >> sq & 1)
+
+    def counts(self):
+        """(黒の駒数, 白の駒数) を返す"""
+        return popcount(self.black), popcount(self.white)
+
+    # --- 着手 ---
+    def play(self, sq):
+        """手番側がマス sq に打って手番を交代し、裏返した駒を返す"""
+        turn = self.turn
+        p, o = self.own_and_opponent()
+        flipped = flips(p, o, sq)
+        if not flipped or (p | o) >> sq & 1:
+            raise ValueError(f"マス {sq} には打てません")
+        p |= flipped | (1 << sq)
+        o &= ~flipped
+        if turn == "first":
+            self.black, self.white = p, o
+        else:
+            self.white, self.black = p, o
+
+        self.count += 1
+        self.pass_count = 0
+        self.play_log.append((self.count, turn, sq))
+        self.notify("move", turn, sq, flipped)
+        self.change_turn()
+        return flipped
+
+    def pass_turn(self):
+        """手番側がパスする"""
+        self.pass_count += 1
+        self.notify("pass", self.turn)
+        self.change_turn()
+
+    # --- ターン変更メソッド ---
+    def change_turn(self):
+        if self.turn == "first":
+            self.turn = "second"
+        elif self.turn == "second":
+            self.turn = "first"
+        self.notify("turn", self.turn)
+
+    # --- ゲーム終了判断メソッド ---
+    def finish_game(self):
+        if self.pass_count >= 2:
+            self.finish_flag = True
+            return
+        if (self.black | self.white) == FULL:
+            self.finish_flag = True
+            return
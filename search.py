@@ -0,0 +1,278 @@
+# coding: UTF-8
+"""αβ探索 (negamax) による CPU の思考
+
+反復深化で1手ずつ深く読み、持ち時間を使い切った時点で
+最後に読み切った深さの最善手を返す。
+"""
+from time import perf_counter
+
+from bitboard import (FULL, flips, iter_bits, legal_moves, popcount, zobrist,
+                      zobrist_after)
+from rules import EVAL_TABLE
+from ttable import EXACT, LOWER, NO_MOVE, UPPER
+
+# 評価値の上限 (終局の石差はこれを基準に換算する)
+INF = 1 << 30
+# 終局時の石差1個あたりの評価値 (途中局面の評価値より十分大きくする)
+DISC_SCORE = 1000
+# 着手可能数1手あたりの評価値
+MOBILITY_WEIGHT = 3
+# 何ノードごとに時間切れを確認するか
+CHECK_INTERVAL = 1024
+
+# 1行(8マス)分の駒の並びに対する評価表の合計 (行ごとに256通り)
+_ROW_VALUES = [
+    [sum(EVAL_TABLE[row * 8 + col] for col in range(8) if bits >> col & 1) for bits in range(256)]
+    for row in range(8)
+]
+
+# 評価表の値が高い順にまとめたマスのグループ (手の並べ替え用)
+_ORDER_MASKS = [
+    sum(1 << sq for sq in range(64) if EVAL_TABLE[sq] == value)
+    for value in sorted(set(EVAL_TABLE), reverse=True)
+]
+
+
+class SearchTimeout(Exception):
+    """持ち時間を使い切ったときに探索を打ち切るための例外"""
+
+
+class SearchResult:
+    """探索結果 (最善手、評価値、読んだ深さ、ノード数、経過時間)
+
+    exact が True のときは終盤の完全読みの結果で、評価値は最終石差。
+    """
+    def __init__(self, move, score, depth, nodes, elapsed, exact=False, lines=None):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.exact = exact
+        # 評価値の高い順の (手, 評価値) のリスト (search の count で指定した数まで)
+        self.lines = lines if lines is not None else [(move, score)]
+
+    @property
+    def nps(self):
+        """1秒あたりの探索ノード数"""
+        if self.elapsed <= 0:
+            return 0
+        return int(self.nodes / self.elapsed)
+
+    def __str__(self):
+        if self.exact:
+            return f"完全読み: 空き {self.depth}, 石差 {self.score:+d}, {self.nodes} ノード, {self.nps} nps"
+        return f"深さ {self.depth}, 評価値 {self.score}, {self.nodes} ノード, {self.nps} nps"
+
+
+def positional(b):
+    """ビットボード b の駒について評価表の値を合計する"""
+    rv = _ROW_VALUES
+    return (rv[0][b & 255] + rv[1][b >> 8 & 255] + rv[2][b >> 16 & 255] + rv[3][b >> 24 & 255]
+            + rv[4][b >> 32 & 255] + rv[5][b >> 40 & 255] + rv[6][b >> 48 & 255] + rv[7][b >> 56])
+
+
+def evaluate(p, o):
+    """手番側 p から見た局面の評価値 (評価表 + 着手可能数)"""
+    mobility = popcount(legal_moves(p, o)) - popcount(legal_moves(o, p))
+    return positional(p) - positional(o) + MOBILITY_WEIGHT * mobility
+
+
+def final_score(p, o):
+    """終局時の手番側 p から見た評価値"""
+    return (popcount(p) - popcount(o)) * DISC_SCORE
+
+
+class PositionalEvaluator:
+    """評価表と着手可能数による評価 (AlphaBetaSearch の既定の evaluator)
+
+    evaluator は探索中の状態を root / play / passed で更新し、evaluate で評価する。
+    この評価は局面だけで決まるので、状態は持たない。
+    """
+    def root(self, p, o):
+        return None
+
+    def play(self, state, sq, f):
+        return None
+
+    def passed(self, state):
+        return None
+
+    def evaluate(self, state, p, o):
+        return evaluate(p, o)
+
+
+def ordered_moves(moves):
+    """合法手を評価表の値が高い順に返す"""
+    result = []
+    for mask in _ORDER_MASKS:
+        m = moves & mask
+        if m:
+            result.extend(iter_bits(m))
+    return result
+
+
+class AlphaBetaSearch:
+    """反復深化つき negamax αβ探索
+
+    tt に置換表を渡すと探索結果を再利用する。endgame に完全読み
+    (endgame.EndgameSolver) を渡すと、空きマスが endgame_empties 以下で
+    完全読みに切り替える (endgame_time_limit 秒で読み切れなければ通常の探索)。
+    evaluator に pattern.PatternEvaluator などを渡すと、途中局面の評価に使う。
+    """
+    def __init__(self, time_limit=1.0, max_depth=60, tt=None,
+                 endgame=None, endgame_empties=12, endgame_time_limit=5.0, evaluator=None):
+        # 1手あたりの持ち時間 (秒)
+        self.time_limit = time_limit
+        # 読む深さの上限
+        self.max_depth = max_depth
+        # 置換表 (ttable.TranspositionTable)
+        self.tt = tt
+        # 終盤の完全読み
+        self.endgame = endgame
+        self.endgame_empties = endgame_empties
+        self.endgame_time_limit = endgame_time_limit
+        # 途中局面の評価
+        self.evaluator = evaluator or PositionalEvaluator()
+        self.nodes = 0
+        self.deadline = 0.0
+        # stop() で打ち切られたかどうか
+        self.stopped = False
+
+    def stop(self):
+        """探索を打ち切る (別スレッドから呼ぶ。次に時間を確認したところで終わる)"""
+        self.stopped = True
+        self.deadline = 0.0
+        if self.endgame is not None:
+            self.endgame.deadline = 0.0
+
+    def search(self, p, o, count=1):
+        """手番側 p、相手側 o の局面で最善手を探索して SearchResult を返す
+
+        count を 2 以上にすると、評価値の高い count 手の正確な評価値を
+        SearchResult.lines に入れる (その分探索は遅くなり、完全読みは使わない)。
+        stop() で打ち切られた場合は、それまでに読めた範囲の最善手を返す。
+        """
+        self.stopped = False
+        moves = ordered_moves(legal_moves(p, o))
+        if not moves:
+            return SearchResult(None, 0, 0, 0, 0.0)
+        empties = 64 - popcount(p | o)
+
+        if self.endgame is not None and empties <= self.endgame_empties and count == 1:
+            try:
+                return self.endgame.solve(p, o, perf_counter() + self.endgame_time_limit)
+            except SearchTimeout:
+                pass # 読み切れなかったので通常の探索で選ぶ
+
+        start = perf_counter()
+        self.nodes = 0
+        self.deadline = 0.0 if self.stopped else start + self.time_limit
+        h, h_rev = zobrist(p, o), zobrist(o, p)
+        ev = self.evaluator.root(p, o)
+
+        lines, reached = [(moves[0], -INF)], 0
+        for depth in range(1, min(self.max_depth, empties) + 1):
+            try:
+                scores = self._search_root(p, o, h, h_rev, ev, moves, depth, count)
+            except SearchTimeout:
+                break
+            # 次の反復では評価値の高い手から読む
+            moves.sort(key=lambda sq: scores[sq], reverse=True)
+            lines, reached = [(sq, scores[sq]) for sq in moves[:count]], depth
+            if perf_counter() >= self.deadline:
+                break
+
+        best_move, best_score = lines[0]
+        return SearchResult(best_move, best_score, reached, self.nodes, perf_counter() - start, lines=lines)
+
+    def _search_root(self, p, o, h, h_rev, ev, moves, depth, count=1):
+        """ルート局面の各手の評価値を返す (上位 count 手以外は上限値)"""
+        scores = {sq: -INF for sq in moves}
+        # これまでの上位 count 手の評価値 (昇順)。count 番目より良い手だけを正確に読む
+        top = []
+        alpha = -INF
+        play = self.evaluator.play
+        for sq in moves:
+            f = flips(p, o, sq)
+            ch, ch_rev = zobrist_after(h, h_rev, sq, f)
+            score = -self._negamax(o & ~f, p | f | (1 << sq), ch, ch_rev, play(ev, sq, f),
+                                   depth - 1, -INF, -alpha, False)
+            scores[sq] = score
+            if score > alpha or len(top) < count:
+                top.append(score)
+                top.sort()
+                del top[:-count]
+                if len(top) == count:
+                    alpha = top[0]
+        if self.tt is not None:
+            best = max(moves, key=lambda sq: scores[sq])
+            self.tt.store(h, depth, EXACT, scores[best], best)
+        return scores
+
+    def _negamax(self, p, o, h, h_rev, ev, depth, alpha, beta, passed):
+        """ev は evaluator の状態"""
+        self.nodes += 1
+        if not self.nodes % CHECK_INTERVAL and perf_counter() > self.deadline:
+            raise SearchTimeout()
+        if depth <= 0:
+            if (p | o) == FULL:
+                return final_score(p, o)
+            return self.evaluator.evaluate(ev, p, o)
+
+        moves = legal_moves(p, o)
+        if not moves:
+            if passed: # 両者とも打てないので終局
+                return final_score(p, o)
+            return -self._negamax(o, p, h_rev, h, self.evaluator.passed(ev), depth, -beta, -alpha, True)
+
+        # 置換表を参照する
+        tt = self.tt
+        tt_move = NO_MOVE
+        if tt is not None:
+            entry = tt.probe(h)
+            if entry:
+                e_depth, e_flag, e_score, tt_move = entry
+                if e_depth >= depth:
+                    if e_flag == EXACT:
+                        return e_score
+                    if e_flag == LOWER:
+                        if e_score > alpha:
+                            alpha = e_score
+                    elif e_score < beta:
+                        beta = e_score
+                    if alpha >= beta:
+                        return e_score
+        alpha_orig = alpha
+
+        order = ordered_moves(moves)
+        if tt_move != NO_MOVE and moves >> tt_move & 1:
+            # 置換表の最善手から読む
+            order.remove(tt_move)
+            order.insert(0, tt_move)
+
+        best = -INF
+        best_move = NO_MOVE
+        play = self.evaluator.play
+        for sq in order:
+            f = flips(p, o, sq)
+            ch, ch_rev = zobrist_after(h, h_rev, sq, f)
+            score = -self._negamax(o & ~f, p | f | (1 << sq), ch, ch_rev, play(ev, sq, f),
+                                   depth - 1, -beta, -alpha, False)
+            if score > best:
+                best = score
+                best_move = sq
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if tt is not None:
+            if best <= alpha_orig:
+                flag = UPPER
+            elif best >= beta:
+                flag = LOWER
+            else:
+                flag = EXACT
+            tt.store(h, depth, flag, best, best_move)
+        return best
@@ -0,0 +1,216 @@
+# coding: UTF-8
+"""CPU 同士の自己対戦 (ヘッドレス)
+
+GUI を使わずに多数の対局を複数プロセスで行い、勝敗と石差を集計する。
+
+    python othello.py --selfplay 1000 --black random_3 --white random_2 --workers 4
+"""
+import argparse
+import json
+import random
+import statistics
+from multiprocessing import Pool
+from time import perf_counter, perf_counter_ns
+
+from endgame import EndgameSolver
+from profiler import Profiler, write_jsonl
+from record import GameRecord, RecordWriter
+from rules import Game
+from search import AlphaBetaSearch
+from strategies import CPU_LEVELS, CpuPlayer
+from ttable import TranspositionTable
+
+# ワーカープロセスごとのプレイヤー (_init_worker で作る)
+_players = {}
+
+
+def make_player(level, time_limit=0.1, tt_mb=16, endgame_empties=10, book_file=None, weights_file=None,
+                playouts=None):
+    """自己対戦用の CPU を作る (探索するレベルは置換表などもプロセス内で使い回す)"""
+    searcher = None
+    book = None
+    if level == "mcts":
+        from mcts import MctsSearch
+        searcher = MctsSearch(time_limit, playouts)
+    if level == "alphabeta":
+        evaluator = None
+        if weights_file:
+            from pattern import PatternEvaluator
+            evaluator = PatternEvaluator.load(weights_file)
+        searcher = AlphaBetaSearch(time_limit, tt=TranspositionTable(tt_mb), endgame=EndgameSolver(),
+                                   endgame_empties=endgame_empties, evaluator=evaluator)
+        if book_file:
+            # 定跡は mmap で開くので、プロセスごとに開いても読み込みの時間はかからない
+            from book import OpeningBook
+            book = OpeningBook(book_file)
+    return CpuPlayer(level, searcher=searcher, book=book)
+
+
+def play_game(black, white, record=None, profiler=None):
+    """black(先手) と white(後手) で1局打ち、(黒の駒数, 白の駒数, 手数) を返す
+
+    record にリストを渡すと、着手 (マス番号) を順に追加する。
+    profiler (profiler.Profiler) を渡すと、手番ごとに着手生成・手の選択・反転の時間を記録する。
+    """
+    game = Game()
+    game.turn = "first"
+    players = {"first": black, "second": white}
+    while True:
+        start = perf_counter_ns()
+        moves = game.move_list()
+        generated = perf_counter_ns()
+        if not moves:
+            if game.pass_count >= 1: # 相手も直前にパスしている
+                break
+            game.pass_turn()
+            continue
+        turn = game.turn
+        player = players[turn]
+        p, o = game.own_and_opponent()
+        sq = player.choose(p, o, moves)
+        chosen = perf_counter_ns()
+        game.play(sq)
+        if profiler is not None:
+            profiler.add(turn, "movegen", generated - start)
+            profiler.add(turn, "search" if player.searcher else "eval", chosen - generated)
+            profiler.add(turn, "flip", perf_counter_ns() - chosen)
+        if record is not None:
+            record.append(sq)
+    black_count, white_count = game.counts()
+    return black_count, white_count, game.count
+
+
+def _init_worker(black_level, white_level, options, profile=False):
+    _players["first"] = make_player(black_level, **options)
+    _players["second"] = make_player(white_level, **options)
+    _players["profiler"] = Profiler() if profile else None
+
+
+def _play_seeded(seed):
+    """乱数の種を固定して1局打ち、(黒の駒数, 白の駒数, 手数, 着手の bytes, 処理時間の集計) を返す
+
+    ワーカープロセスで実行する。処理時間の集計は計測しないときは None。
+    """
+    rng = random.Random(seed)
+    for player in (_players["first"], _players["second"]):
+        player.rng = rng
+        if player.level == "mcts":
+            player.searcher.rng.seed(seed)
+            player.searcher.clear()
+    profiler = _players["profiler"]
+    if profiler is not None:
+        profiler.clear()
+    moves = []
+    black_count, white_count, plies = play_game(_players["first"], _players["second"], moves, profiler)
+    return black_count, white_count, plies, bytes(moves), profiler and profiler.summary()
+
+
+def _iter_results(games, black_level, white_level, workers, seed, options, profile=False):
+    seeds = range(seed, seed + games)
+    if workers <= 1:
+        _init_worker(black_level, white_level, options, profile)
+        yield from map(_play_seeded, seeds)
+    else:
+        with Pool(workers, initializer=_init_worker,
+                  initargs=(black_level, white_level, options, profile)) as pool:
+            chunksize = max(1, games // (workers * 8))
+            yield from pool.imap_unordered(_play_seeded, seeds, chunksize)
+
+
+def run_selfplay(games, black_level, white_level, workers=1, seed=0, options=None, record_path=None,
+                 profile_path=None):
+    """games 局の自己対戦を行い、集計結果の辞書を返す
+
+    record_path を渡すと、対局を棋譜アーカイブ (record.py) に追記する。
+    profile_path を渡すと、対局ごとの処理時間の集計を JSONL で追記する (profiler.py)。
+    """
+    options = options or {}
+    start = perf_counter()
+    results = []
+    writer = RecordWriter(record_path) if record_path else None
+    try:
+        for black_count, white_count, plies, moves, spans in _iter_results(
+                games, black_level, white_level, workers, seed, options, profile_path is not None):
+            results.append((black_count, white_count, plies))
+            if writer is not None:
+                writer.write(GameRecord(black_level, white_level, black_count, white_count, moves))
+            if spans is not None:
+                write_jsonl(profile_path, {"black": black_level, "white": white_level, "black_count": black_count,
+                                           "white_count": white_count, "plies": plies, "spans": spans})
+    finally:
+        if writer is not None:
+            writer.close()
+    elapsed = perf_counter() - start
+    return summarize(results, elapsed, black_level, white_level, workers)
+
+
+def summarize(results, elapsed, black_level, white_level, workers):
+    """対局結果のリストを集計する"""
+    diffs = [b - w for b, w, _ in results]
+    games = len(results)
+    black_wins = sum(1 for d in diffs if d > 0)
+    white_wins = sum(1 for d in diffs if d < 0)
+    return {
+        "black": black_level,
+        "white": white_level,
+        "games": games,
+        "black_wins": black_wins,
+        "white_wins": white_wins,
+        "draws": games - black_wins - white_wins,
+        "black_win_rate": black_wins / games if games else 0.0,
+        "disc_diff_mean": statistics.fmean(diffs) if diffs else 0.0,
+        "disc_diff_stdev": statistics.stdev(diffs) if games > 1 else 0.0,
+        "plies_mean": statistics.fmean(r[2] for r in results) if results else 0.0,
+        "workers": workers,
+        "elapsed_sec": elapsed,
+        "games_per_sec": games / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def format_summary(summary):
+    """集計結果を表示用の文字列にする"""
+    games = summary["games"]
+    return "\n".join([
+        "--- 自己対戦 ---",
+        f"先手(黒): {summary['black']}  後手(白): {summary['white']}  対局数: {games}",
+        f"黒の勝ち: {summary['black_wins']}  白の勝ち: {summary['white_wins']}  引き分け: {summary['draws']}",
+        f"黒の勝率: {summary['black_win_rate'] * 100:.1f}%",
+        f"石差(黒-白): 平均 {summary['disc_diff_mean']:+.2f}, 標準偏差 {summary['disc_diff_stdev']:.2f}",
+        f"平均手数: {summary['plies_mean']:.1f}",
+        f"時間: {summary['elapsed_sec']:.2f}秒 ({summary['games_per_sec']:.1f} 局/秒, {summary['workers']} プロセス)",
+    ])
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="CPU 同士の自己対戦 (GUI なし)")
+    parser.add_argument("--selfplay", dest="games", type=int, required=True, metavar="N", help="対局数")
+    parser.add_argument("--black", choices=CPU_LEVELS, default="random_3", help="先手(黒)のレベル")
+    parser.add_argument("--white", choices=CPU_LEVELS, default="random_2", help="後手(白)のレベル")
+    parser.add_argument("--workers", type=int, default=1, help="プロセス数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数の種 (i局目は seed + i)")
+    parser.add_argument("--time", type=float, default=0.1, help="alphabeta / mcts の1手あたりの持ち時間 (秒)")
+    parser.add_argument("--playouts", type=int, help="mcts の1手あたりのプレイアウト数 (省略時は持ち時間で打ち切る)")
+    parser.add_argument("--tt-mb", type=int, default=16, help="alphabeta の置換表のメモリ上限 (MB)")
+    parser.add_argument("--endgame-empties", type=int, default=10, help="alphabeta が完全読みに切り替える空きマス数")
+    parser.add_argument("--book", help="alphabeta が使う定跡ファイル")
+    parser.add_argument("--weights", help="alphabeta が使うパターン評価の重みファイル")
+    parser.add_argument("--record", help="対局を追記する棋譜アーカイブ (.othr)")
+    parser.add_argument("--profile", help="対局ごとの処理時間の集計を追記する JSONL ファイル")
+    parser.add_argument("--output", help="集計結果を JSON で保存するファイル")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    options = {"time_limit": args.time, "tt_mb": args.tt_mb, "endgame_empties": args.endgame_empties,
+               "book_file": args.book, "weights_file": args.weights, "playouts": args.playouts}
+    summary = run_selfplay(args.games, args.black, args.white, args.workers, args.seed, options, args.record,
+                           args.profile)
+    print(format_summary(summary))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
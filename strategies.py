@@ -0,0 +1,91 @@
+# coding: UTF-8
+"""CPU の手の選び方 (tkinter に依存しない)
+
+GUI の CPU (Othello.random_hit_1/2/3, alphabeta_hit, mcts_hit) と、
+ヘッドレスの自己対戦 (selfplay.py) で共通に使う。
+"""
+import random
+
+from rules import EVAL_TABLE
+
+# CPU のレベル (GUI のボタンの順)
+CPU_LEVELS = ("random", "random_2", "random_3", "alphabeta", "mcts")
+
+# 角のマス
+CORNER_SQUARES = (0, 7, 56, 63)
+# 角の隣のマス
+CORNER_NEIGHBORS = frozenset(
+    (y + dy) * 8 + (x + dx)
+    for x in (0, 7) for y in (0, 7)
+    for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+    if not (dx == 0 and dy == 0) and 0 <= x + dx <= 7 and 0 <= y + dy <= 7
+)
+
+
+def choose_random(moves, rng=random):
+    """完全乱数"""
+    if len(moves) == 1:
+        return moves[0]
+    return moves[rng.randint(0, len(moves) - 1)]
+
+
+def choose_corner_first(moves, rng=random):
+    """角を取れるなら最優先、角の隣は避けてランダム"""
+    for sq in moves:
+        if sq in CORNER_SQUARES:
+            return sq
+
+    preferred_list = [sq for sq in moves if sq not in CORNER_NEIGHBORS]
+    if not preferred_list: # 避けた結果、手が無くなったら元のリストから選ぶ
+        preferred_list = moves
+    return rng.choice(preferred_list)
+
+
+def choose_best_eval(moves):
+    """角を取れるなら最優先、それ以外は評価表の値が最も高い手"""
+    for sq in moves:
+        if sq in CORNER_SQUARES:
+            return sq
+
+    max_eval_sq = None
+    max_eval_score = -float('inf')
+    for sq in moves:
+        if EVAL_TABLE[sq] > max_eval_score:
+            max_eval_score = EVAL_TABLE[sq]
+            max_eval_sq = sq
+    return max_eval_sq
+
+
+class CpuPlayer:
+    """レベルを指定して手を選ぶ CPU
+
+    探索するレベル (alphabeta: search.AlphaBetaSearch, mcts: mcts.MctsSearch) には
+    searcher を渡す。book (book.OpeningBook) を渡すと
+    探索の前に定跡を引く。
+    """
+    def __init__(self, level, rng=random, searcher=None, book=None):
+        if level not in CPU_LEVELS:
+            raise ValueError(f"不明なCPUのレベルです: {level}")
+        if level in ("alphabeta", "mcts") and searcher is None:
+            raise ValueError(f"{level} には searcher が必要です")
+        self.level = level
+        self.rng = rng
+        self.searcher = searcher
+        self.book = book
+        # 直前の探索結果 (alphabeta / mcts のみ)
+        self.last_result = None
+
+    def choose(self, p, o, moves):
+        """手番側 p、相手側 o、合法手のリスト moves から打つマスを返す"""
+        if self.level == "random":
+            return choose_random(moves, self.rng)
+        if self.level == "random_2":
+            return choose_corner_first(moves, self.rng)
+        if self.level == "random_3":
+            return choose_best_eval(moves)
+        if self.book is not None:
+            entry = self.book.lookup(p, o)
+            if entry and entry[0] in moves:
+                return entry[0]
+        self.last_result = self.searcher.search(p, o)
+        return self.last_result.move
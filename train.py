@@ -0,0 +1,278 @@
+# coding: UTF-8
+"""パターン評価の重みの学習 (NumPy を使う)
+
+棋譜 (テキストのログ・棋譜アーカイブ・その場で行う自己対戦) の各局面について、
+手番側から見た特徴ごとの番号 (pattern.indices を対称な並びの代表にしたもの) と
+最終的な石差を取り出し、ディスク上の配列 (numpy.memmap で読む) に書き出す。棋譜は少しずつ読んで書き足すので、
+棋譜の量がメモリに載らなくてもよい。局面の取り出しは複数プロセスで行う。
+重みは段階ごとに、評価値の合計と石差の二乗誤差が小さくなるように勾配法で求める。
+学習は配列を一定の行数ずつ読んで行うので、メモリに載らない量の局面でも学習できる。
+
+    python train.py --records othello_games.othr --logs othello_log_*.txt --output othello_weights.bin
+    python train.py --selfplay 2000 --level random_3 --epochs 50
+    python train.py --data training_data --epochs 50   # 前回取り出した局面で学習し直す
+"""
+import argparse
+import os
+from array import array
+from itertools import islice
+from multiprocessing import Pool
+from time import perf_counter
+
+import numpy as np
+
+from bitboard import legal_moves
+from pattern import (FEATURE_GROUPS, FEATURES, GROUP_SIZES, NUM_PHASES, PATTERNS, PatternIndexer,
+                     PatternWeights, _swap_table, canonical_table, phase_of)
+from record import iter_records, read_text_log
+from rules import iter_positions
+from search import DISC_SCORE
+
+# 取り出した局面を書き出すディレクトリ
+DATA_DIR = "training_data"
+# 書き出すファイルと要素の型 (特徴ごとの番号, 段階, 石差)
+_DATA_FILES = (("features.bin", np.uint16), ("phases.bin", np.uint8), ("targets.bin", np.int8))
+# 1プロセスにまとめて渡す対局数
+CHUNK_GAMES = 256
+# 学習で一度に読む局面数
+CHUNK_ROWS = 1 << 16
+# 重みの要素数 (全パターンの番号の数の合計) と、特徴ごとの先頭の位置
+GROUP_OFFSETS = np.cumsum((0,) + GROUP_SIZES[:-1])
+FEATURE_OFFSETS = GROUP_OFFSETS[list(FEATURE_GROUPS)]
+WEIGHTS_PER_PHASE = sum(GROUP_SIZES)
+
+# 黒の駒を 1 とした番号を、白の駒を 1 とした番号に変える表 (特徴ごと)
+_SWAPS = [np.frombuffer(_swap_table(len(PATTERNS[group][1])), dtype=np.int32).astype(np.uint16)
+          for group in FEATURE_GROUPS]
+# パターンごとの、対称な並びの番号を代表の番号にする表 (pattern.canonical_table)
+_CANONICAL = [np.frombuffer(canonical_table(group), dtype=np.int32) for group in range(len(PATTERNS))]
+
+
+def _is_terminal(position):
+    """両者とも打てない (終局した) 局面かどうか"""
+    p, o = position.own_and_opponent()
+    return not legal_moves(p, o) and not legal_moves(o, p)
+
+
+def is_finished(moves):
+    """着手の列が終局まで打たれているかどうか (GUI は対局の途中でも棋譜を保存できる)"""
+    position = None
+    for position, _ in iter_positions(moves):
+        pass
+    return position is not None and _is_terminal(position.play(moves[-1])[0])
+
+
+def _empty_rows():
+    return (np.empty((0, len(FEATURES)), np.uint16), np.empty(0, np.uint8), np.empty(0, np.int8))
+
+
+def extract_game(moves):
+    """1局分の各局面の (特徴ごとの番号, 段階, 石差) を配列で返す
+
+    番号と石差は手番側から見た値で、番号は対称な並びの代表にする (対称な局面で重みを共有する)。
+    パスの局面は含めない。石差は最終的な石差なので、終局していない棋譜からは何も返さない。
+    """
+    indexer = PatternIndexer()
+    rows = []
+    black_to_move = []
+    discs = []
+    state = None
+    position = None
+    for position, sq in iter_positions(moves):
+        black = position.turn == "first"
+        if state is None:
+            # 黒を最初の局面の手番側として番号を更新していく
+            state = indexer.root(position.black, position.white)
+        elif state[1] != black:
+            state = indexer.passed(state)
+        p, o = position.own_and_opponent()
+        rows.append(state[0])
+        black_to_move.append(black)
+        discs.append((p | o).bit_count())
+        state = indexer.play(state, sq, position.play(sq)[1])
+    if position is None:
+        return _empty_rows()
+    final, _ = position.play(moves[-1])
+    if not _is_terminal(final):
+        return _empty_rows()
+    diff = final.black.bit_count() - final.white.bit_count()
+
+    features = np.array(rows, dtype=np.uint16)
+    black_to_move = np.array(black_to_move)
+    # 白の手番の局面は 1 と 2 を入れ替えて手番側から見た番号にする
+    for i, swap in enumerate(_SWAPS):
+        features[:, i] = np.where(black_to_move, features[:, i], swap[features[:, i]])
+        features[:, i] = _CANONICAL[FEATURE_GROUPS[i]][features[:, i]]
+    phases = np.array([phase_of(n) for n in discs], dtype=np.uint8)
+    targets = np.where(black_to_move, diff, -diff).astype(np.int8)
+    return features, phases, targets
+
+
+def _extract_games(games):
+    results = [extract_game(moves) for moves in games]
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def iter_games(logs=(), records=(), selfplay=0, level="random_3", random_plies=8, seed=0, skipped=None):
+    """学習に使う棋譜を着手の列 (bytes) で順に返す
+
+    終局していない棋譜 (対局の途中で保存したもの) は飛ばし、skipped (リスト) を渡すと
+    飛ばした棋譜の出どころ (ファイル名) を追加する。
+    """
+    def finished(moves, source):
+        if is_finished(moves):
+            return True
+        if skipped is not None:
+            skipped.append(source)
+        return False
+
+    for path in logs:
+        moves = read_text_log(path)
+        if moves and finished(moves, path):
+            yield bytes(moves)
+    for path in records:
+        for record in iter_records(path):
+            if finished(record.moves, path):
+                yield record.moves
+    if selfplay:
+        from book import selfplay_games
+        for moves in selfplay_games(selfplay, level, random_plies, seed):
+            yield bytes(moves)
+
+
+def build_dataset(games, data_dir=DATA_DIR, workers=None, max_rows=None):
+    """棋譜の各局面をディスク上の配列に書き出し、局面数を返す
+
+    games は着手の列を順に返すもの (iter_games など)。棋譜は CHUNK_GAMES 局ずつ読んで
+    取り出した局面をファイルの末尾に足していくので、全局をメモリに載せない。
+    max_rows を指定すると、その局面数で打ち切る。
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+    rows = 0
+    files = [open(os.path.join(data_dir, name), "wb") for name, _ in _DATA_FILES]
+    try:
+        with Pool(workers) as pool:
+            # 一度にプロセスへ渡す棋譜の数を抑える (imap は渡すものを先に全部読んでしまう)
+            for batch in _chunks(_chunks(games, CHUNK_GAMES), workers * 2):
+                for arrays in pool.imap(_extract_games, batch):
+                    if max_rows is not None:
+                        arrays = [a[:max_rows - rows] for a in arrays]
+                    for f, a in zip(files, arrays):
+                        f.write(a.tobytes())
+                    rows += len(arrays[2])
+                if max_rows is not None and rows >= max_rows:
+                    break
+    finally:
+        for f in files:
+            f.close()
+    with open(os.path.join(data_dir, "rows.txt"), "w") as f:
+        f.write(f"{rows}\n")
+    return rows
+
+
+def load_dataset(data_dir=DATA_DIR):
+    """build_dataset で書き出した配列を (特徴, 段階, 石差) で読み込む (メモリには載せない)"""
+    with open(os.path.join(data_dir, "rows.txt")) as f:
+        rows = int(f.read())
+    if not rows:
+        return (np.empty((0, len(FEATURES)), np.uint16), np.empty(0, np.uint8), np.empty(0, np.int8))
+    return tuple(np.memmap(os.path.join(data_dir, name), dtype=dtype, mode="r",
+                           shape=(rows, len(FEATURES)) if name == "features.bin" else (rows,))
+                 for name, dtype in _DATA_FILES)
+
+
+def _weight_indices(features, phases):
+    """局面ごと・特徴ごとに、重みの配列 (全段階をつなげたもの) の位置を返す"""
+    return (features.astype(np.int64) + FEATURE_OFFSETS
+            + phases.astype(np.int64)[:, None] * WEIGHTS_PER_PHASE)
+
+
+def fit(features, phases, targets, epochs=30, rate=1.0, regularization=1.0, chunk_rows=CHUNK_ROWS, report=None):
+    """重み (石差の単位、全段階をつなげた配列) を最小二乗で求める
+
+    重みごとに、その重みを使う局面の誤差の平均だけ動かす勾配法で、
+    1回の更新で配列を chunk_rows 行ずつ読んで全局面の勾配をまとめる。
+    regularization は出現の少ない番号の重みを 0 に近づける強さ。
+    """
+    size = NUM_PHASES * WEIGHTS_PER_PHASE
+    weights = np.zeros(size)
+    counts = np.zeros(size)
+    n = len(targets)
+    for start in range(0, n, chunk_rows):
+        index = _weight_indices(features[start:start + chunk_rows], phases[start:start + chunk_rows])
+        counts += np.bincount(index.ravel(), minlength=size)
+    # 1局面の誤差は特徴の数だけの重みで分け合う
+    step = rate / (len(FEATURES) * (counts + regularization))
+
+    for epoch in range(epochs):
+        gradient = np.zeros(size)
+        error = 0.0
+        for start in range(0, n, chunk_rows):
+            index = _weight_indices(features[start:start + chunk_rows], phases[start:start + chunk_rows])
+            residual = targets[start:start + chunk_rows] - weights[index].sum(axis=1)
+            error += float(residual @ residual)
+            gradient += np.bincount(index.ravel(), weights=np.repeat(residual, index.shape[1]), minlength=size)
+        weights += step * gradient
+        if report is not None:
+            report(epoch + 1, (error / max(n, 1)) ** 0.5)
+    return weights
+
+
+def to_pattern_weights(weights):
+    """石差の単位の重みを PatternWeights (search.DISC_SCORE の単位の int16) にする
+
+    学習するのは代表の番号の重みだけなので、対称な並びの番号にも同じ値を書く。
+    """
+    scaled = np.clip(np.rint(weights * DISC_SCORE), -32768, 32767).astype("<i2")
+    tables = []
+    for phase in range(NUM_PHASES):
+        base = phase * WEIGHTS_PER_PHASE
+        tables.append([array("h", scaled[base + offset:base + offset + size][canonical].tolist())
+                       for offset, size, canonical in zip(GROUP_OFFSETS, GROUP_SIZES, _CANONICAL)])
+    return PatternWeights(tables)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="パターン評価の重みを学習する")
+    parser.add_argument("--logs", nargs="*", default=[], help="取り込むログファイル (.txt)")
+    parser.add_argument("--records", nargs="*", default=[], help="取り込む棋譜アーカイブ (.othr)")
+    parser.add_argument("--selfplay", type=int, default=0, help="学習の前に自己対戦する対局数")
+    parser.add_argument("--level", default="random_3", help="自己対戦の CPU のレベル")
+    parser.add_argument("--random-plies", type=int, default=8, help="自己対戦で序盤にランダムに打つ手数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="局面を取り出すプロセス数 (省略時は CPU 数)")
+    parser.add_argument("--data", default=DATA_DIR, help="取り出した局面を置くディレクトリ")
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--rate", type=float, default=1.0, help="学習率")
+    parser.add_argument("--regularization", type=float, default=1.0, help="正則化の強さ")
+    parser.add_argument("--output", default="othello_weights.bin")
+    args = parser.parse_args(argv)
+
+    if args.logs or args.records or args.selfplay:
+        start = perf_counter()
+        skipped = []
+        rows = build_dataset(iter_games(args.logs, args.records, args.selfplay, args.level,
+                                        args.random_plies, args.seed, skipped), args.data, args.workers)
+        print(f"{rows} 局面を取り出しました ({perf_counter() - start:.1f}秒)")
+        if skipped:
+            print(f"終局していない棋譜 {len(skipped)} 局を飛ばしました ({', '.join(sorted(set(skipped)))})")
+    features, phases, targets = load_dataset(args.data)
+    if not len(targets):
+        parser.error("学習する局面がありません")
+
+    start = perf_counter()
+    weights = fit(features, phases, targets, args.epochs, args.rate, args.regularization,
+                  report=lambda epoch, rmse: print(f"{epoch:>4}: 石差の誤差 {rmse:.3f}"))
+    to_pattern_weights(weights).save(args.output)
+    print(f"{args.output} に保存しました ({perf_counter() - start:.1f}秒)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# coding: UTF-8
+"""探索用の置換表 (トランスポジションテーブル)
+
+Zobrist ハッシュをキーに、読んだ深さ・評価値の種類・評価値・最善手を保存する。
+メモリ使用量が上限を超えないよう、エントリは固定長の array に確保する。
+1つのバケットは2エントリで、0番目は深さ優先、1番目は常に上書きする。
+"""
+from array import array
+
+# 評価値の種類
+EXACT = 0  # 正確な値
+LOWER = 1  # 下限値 (βカット)
+UPPER = 2  # 上限値 (αを超えなかった)
+
+# 最善手なし
+NO_MOVE = -1
+
+# 1エントリあたりのバイト数 (キー8 + 評価値4 + 深さ1 + 種類1 + 手1)
+ENTRY_BYTES = 15
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=64):
+        # メモリ上限に収まる最大の2のべき乗個のバケットを確保する
+        entries = max(2, int(size_mb * 1024 * 1024) // ENTRY_BYTES)
+        buckets = 1 << ((entries // 2).bit_length() - 1)
+        self.mask = buckets - 1
+        self.size = buckets * 2
+        self.keys = array("Q", bytes(8 * self.size))
+        self.scores = array("i", bytes(4 * self.size))
+        self.depths = array("b", [-1]) * self.size  # -1 は空きエントリ
+        self.flags = array("b", bytes(self.size))
+        self.moves = array("b", bytes(self.size))
+        # --- 統計情報 ---
+        self.hits = 0        # キーが一致した
+        self.misses = 0      # キーが一致しなかった
+        self.collisions = 0  # バケットが別の局面で埋まっていた
+        self.stores = 0
+
+    @property
+    def size_bytes(self):
+        return self.size * ENTRY_BYTES
+
+    def clear(self):
+        """すべてのエントリと統計情報を消去する"""
+        self.depths = array("b", [-1]) * self.size
+        self.hits = self.misses = self.collisions = self.stores = 0
+
+    def probe(self, key):
+        """キーに一致するエントリを (深さ, 種類, 評価値, 最善手) で返す。なければ None"""
+        i = (key & self.mask) << 1
+        keys = self.keys
+        depths = self.depths
+        for slot in (i, i + 1):
+            if depths[slot] >= 0 and keys[slot] == key:
+                self.hits += 1
+                return depths[slot], self.flags[slot], self.scores[slot], self.moves[slot]
+        self.misses += 1
+        if depths[i] >= 0 or depths[i + 1] >= 0:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        """エントリを保存する"""
+        i = (key & self.mask) << 1
+        self.stores += 1
+        if self.keys[i] == key or depth >= self.depths[i]:
+            # 深さ優先のエントリを置き換える。元の局面は常に上書きの方へ移す
+            if self.depths[i] >= 0 and self.keys[i] != key:
+                self._write(i + 1, self.keys[i], self.depths[i], self.flags[i], self.scores[i], self.moves[i])
+            self._write(i, key, depth, flag, score, move)
+        else:
+            self._write(i + 1, key, depth, flag, score, move)
+
+    def _write(self, slot, key, depth, flag, score, move):
+        self.keys[slot] = key
+        self.depths[slot] = depth
+        self.flags[slot] = flag
+        self.scores[slot] = score
+        self.moves[slot] = move
+
+    def stats_text(self):
+        """統計情報を整形して文字列として返す"""
+        probes = self.hits + self.misses
+        rate = self.hits / probes * 100 if probes else 0.0
+        return (f" 置換表: {self.size_bytes / (1024 * 1024):.0f}MB, ヒット {self.hits}, ミス {self.misses}"
+                f" (衝突 {self.collisions}), ヒット率 {rate:.1f}%")
+
+
+def _pack(depth, flag, score, move):
+    """エントリのキー以外の値を 64bit にまとめる (共有置換表の整合性の確認用)"""
+    return (score & 0xFFFFFFFF) | (depth & 0xFF) << 32 | (flag & 0xFF) << 40 | (move & 0xFF) << 48
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """複数のプロセスで共有する置換表 (multiprocessing.shared_memory 上に確保する)
+
+    name を渡すと、別のプロセスで作った置換表に接続する。
+    ロックは使わず、キーにはエントリの値との XOR を保存しておき、
+    読み出したときに一致しなければ (別のプロセスが書き込み中なら) ミスとして扱う。
+    """
+    def __init__(self, size_mb=64, name=None):
+        from multiprocessing import shared_memory
+
+        entries = max(2, int(size_mb * 1024 * 1024) // ENTRY_BYTES)
+        buckets = 1 << ((entries // 2).bit_length() - 1)
+        self.mask = buckets - 1
+        self.size = size = buckets * 2
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size * ENTRY_BYTES)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        buf = self.shm.buf
+        self.keys = buf[:8 * size].cast("Q")
+        self.scores = buf[8 * size:12 * size].cast("i")
+        self.depths = buf[12 * size:13 * size].cast("b")
+        self.flags = buf[13 * size:14 * size].cast("b")
+        self.moves = buf[14 * size:15 * size].cast("b")
+        if self.owner:
+            self.clear()
+        self.hits = self.misses = self.collisions = self.stores = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def clear(self):
+        """すべてのエントリと統計情報を消去する (共有しているすべてのプロセスに反映される)"""
+        self.depths[:] = array("b", [-1]) * self.size
+        self.hits = self.misses = self.collisions = self.stores = 0
+
+    def close(self):
+        """共有メモリから切り離す (作ったプロセスでは共有メモリも解放する)"""
+        for view in (self.keys, self.scores, self.depths, self.flags, self.moves):
+            view.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def _key(self, slot):
+        return self.keys[slot] ^ _pack(self.depths[slot], self.flags[slot], self.scores[slot], self.moves[slot])
+
+    def probe(self, key):
+        i = (key & self.mask) << 1
+        depths = self.depths
+        for slot in (i, i + 1):
+            depth = depths[slot]
+            if depth >= 0:
+                flag, score, move = self.flags[slot], self.scores[slot], self.moves[slot]
+                if self.keys[slot] ^ _pack(depth, flag, score, move) == key:
+                    self.hits += 1
+                    return depth, flag, score, move
+        self.misses += 1
+        if depths[i] >= 0 or depths[i + 1] >= 0:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        i = (key & self.mask) << 1
+        self.stores += 1
+        old_key = self._key(i)
+        if old_key == key or depth >= self.depths[i]:
+            if self.depths[i] >= 0 and old_key != key:
+                self._write(i + 1, old_key, self.depths[i], self.flags[i], self.scores[i], self.moves[i])
+            self._write(i, key, depth, flag, score, move)
+        else:
+            self._write(i + 1, key, depth, flag, score, move)
+
+    def _write(self, slot, key, depth, flag, score, move):
+        self.depths[slot] = depth
+        self.flags[slot] = flag
+        self.scores[slot] = score
+        self.moves[slot] = move
+        self.keys[slot] = key ^ _pack(depth, flag, score, move)
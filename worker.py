@@ -0,0 +1,70 @@
+# coding: UTF-8
+"""CPU の思考を別スレッドで行う (tkinter に依存しない)
+
+思考の結果はスレッドセーフなキューに入れ、GUI のメインループ側から
+poll() で受け取る。cancel() すると実行中の思考の結果は捨てられ、
+on_cancel (探索の打ち切りなど) を呼んでスレッドが終わるまで待つ。
+"""
+import queue
+import threading
+
+# 取り消したスレッドの終了を待つ間隔 (秒)
+CANCEL_POLL = 0.01
+
+
+class CpuWorker:
+    """思考用のスレッドを起動し、結果をキューで受け取る"""
+    def __init__(self, on_cancel=None):
+        self.results = queue.Queue()
+        # 思考を始めるたびに増やし、古い思考の結果を見分ける
+        self.generation = 0
+        self.busy = False
+        self.on_cancel = on_cancel
+        self._thread = None
+
+    def start(self, func, *args):
+        """func(*args) を別スレッドで実行する"""
+        self.generation += 1
+        self.busy = True
+        self._thread = threading.Thread(target=self._run, args=(self.generation, func, args), daemon=True)
+        self._thread.start()
+
+    def _run(self, generation, func, args):
+        try:
+            self.results.put((generation, func(*args), None))
+        except Exception as e:
+            self.results.put((generation, None, e))
+
+    def poll(self):
+        """思考が終わっていれば (True, 結果) を、まだなら (False, None) を返す
+
+        思考中に起きた例外はここで送出する。
+        """
+        while True:
+            try:
+                generation, result, error = self.results.get_nowait()
+            except queue.Empty:
+                return False, None
+            if generation != self.generation:
+                continue # 取り消された思考の結果
+            self.busy = False
+            if error is not None:
+                raise error
+            return True, result
+
+    def cancel(self):
+        """実行中の思考を取り消し、思考用のスレッドが終わるまで待つ
+
+        スレッドが探索を始める前に on_cancel を呼んでも、探索の開始で打ち切りが
+        取り消されてしまうので、スレッドが終わるまで繰り返し呼ぶ
+        (取り消した探索が次の対局の探索と並んで置換表などを使わないようにする)。
+        """
+        if not self.busy:
+            return
+        self.generation += 1
+        self.busy = False
+        thread, self._thread = self._thread, None
+        while thread is not None and thread.is_alive():
+            if self.on_cancel is not None:
+                self.on_cancel()
+            thread.join(CANCEL_POLL)